@@ -15,9 +15,13 @@ import sys
 import tempfile
 from pathlib import Path
 
-from docx import Document
-from docx.oxml.ns import qn
-from lxml import etree
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent / 'testcasegen-split-prd' / 'scripts'))
+from atomic_io import atomic_write  # noqa: E402
+
+# python-docx（连带 lxml）导入耗时明显，延迟到真正转换时加载，
+# --list、参数/路径校验等路径无需付出该开销
+Document = None
+qn = None
 
 
 # Word XML 命名空间
@@ -35,6 +39,15 @@ def _stdout_utf8():
 _stdout_utf8()
 
 
+def _load_docx() -> None:
+    """按需导入 python-docx，填充模块级 Document / qn"""
+    global Document, qn
+    if Document is None:
+        from docx import Document as _Document
+        from docx.oxml.ns import qn as _qn
+        Document, qn = _Document, _qn
+
+
 def has_non_ascii(path_str: str) -> bool:
     """检测路径是否包含非 ASCII 字符（如中文）"""
     try:
@@ -610,6 +623,7 @@ def convert_docx_to_markdown(docx_path, output_path, image_dir):
             image_dir = str(image_dir_obj)
 
         print(f"正在读取Word文档: {docx_path}")
+        _load_docx()
         doc = Document(str(Path(docx_path)))
 
         os.makedirs(image_dir, exist_ok=True)
@@ -637,7 +651,8 @@ def convert_docx_to_markdown(docx_path, output_path, image_dir):
                         break
 
         print(f"正在写入Markdown文件: {output_path}")
-        with open(output_path, "w", encoding="utf-8") as f:
+        # 图片已先行写出；Markdown 原子写入并带完成标记，标记存在即表示本次转换完整结束
+        with atomic_write(output_path, "w") as f:
             f.write("\n".join(markdown_content))
 
         print("✅ 转换完成！")
@@ -7,15 +7,45 @@ Excel转Markdown工具
 
 import argparse
 import json
-import pandas as pd
+import numbers
 import os
+import re
 import sys
+from datetime import datetime
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent / 'testcasegen-split-prd' / 'scripts'))
+from atomic_io import atomic_write, commit_temp, temp_path  # noqa: E402
+
+SIDECAR_INDEX_NAME = "_index.json"
+# Parquet sidecar 每个 row group 的行数：按键查询只解码命中行所在的 row group
+SIDECAR_ROW_GROUP_ROWS = 1000
+
+# pandas 导入约 0.5s，延迟到真正转换时加载；--preview、参数校验等路径无需付出该开销
+pd = None
+
+
+def _import_pandas():
+    """按需导入 pandas，填充模块级 pd"""
+    global pd
+    if pd is None:
+        import pandas
+        pd = pandas
+    return pd
+
+
+def _stdout_utf8():
+    """stdout/stderr 统一 UTF-8 输出，避免 Windows 控制台编码导致中文报错"""
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(encoding="utf-8")
+    if hasattr(sys.stderr, "reconfigure"):
+        sys.stderr.reconfigure(encoding="utf-8")
+
 
 def clean_cell_value(value):
     """清理单元格值，处理NaN和特殊字符"""
-    if pd.isna(value):
+    # pandas 未加载时（如 query_excel_sidecar.py 复用本函数）值只能是字符串，无需判空
+    if pd is not None and pd.isna(value):
         return ""
     # 转换为字符串
     value = str(value)
@@ -26,37 +56,206 @@ def clean_cell_value(value):
     return value.strip()
 
 
-def dataframe_to_markdown(df, sheet_name):
-    """将DataFrame转换为Markdown表格格式"""
+def _table_lines(columns, rows):
+    """生成 Markdown 表格行（表头 + 分隔行 + 数据行），不含换行符"""
+    lines = ["| " + " | ".join(columns) + " |"]
+    lines.append("| " + " | ".join(["---"] * len(columns)) + " |")
+    for row in rows:
+        cells = [clean_cell_value(cell) for cell in row]
+        lines.append("| " + " | ".join(cells) + " |")
+    return lines
+
+
+def dataframe_to_markdown(df, sheet_name, page_rows=0, base_line=1):
+    """将DataFrame转换为Markdown表格格式
+
+    参数:
+        page_rows: 分页行数，>0 且数据行数超过该值时按每 page_rows 行拆为多段，
+                   每段带 `### <sheet> (rows a–b)` 子标题并重复表头
+        base_line: 本 sheet 内容在输出文件中的起始行号（1-based），用于计算分段索引的文件行范围
+    """
+    _import_pandas()
     if df.empty:
         return f"## {sheet_name}\n\n*该sheet页为空*\n\n"
     
     # 清理列名
     columns = [clean_cell_value(col) for col in df.columns]
+
+    if page_rows and len(df) > page_rows:
+        return _paged_markdown(df, sheet_name, columns, page_rows, base_line)
     
     # 构建Markdown表格
     md_lines = []
     md_lines.append(f"## {sheet_name}\n")
-    
-    # 表头
-    header = "| " + " | ".join(columns) + " |"
-    md_lines.append(header)
-    
-    # 分隔行
-    separator = "| " + " | ".join(["---"] * len(columns)) + " |"
-    md_lines.append(separator)
-    
-    # 数据行
-    for _, row in df.iterrows():
-        cells = [clean_cell_value(cell) for cell in row]
-        row_line = "| " + " | ".join(cells) + " |"
-        md_lines.append(row_line)
-    
+    md_lines.extend(_table_lines(columns, df.itertuples(index=False, name=None)))
     md_lines.append("\n")  # 添加空行分隔不同sheet
     
     return "\n".join(md_lines)
 
 
+def _paged_markdown(df, sheet_name, columns, page_rows, base_line):
+    """超大 sheet 分页输出：分段索引 + 每段独立表格（重复表头）"""
+    total_rows = len(df)
+    spans = [(a, min(a + page_rows, total_rows)) for a in range(0, total_rows, page_rows)]
+
+    # 先生成各分段，记录分段在 sheet 块内的相对行号
+    chunk_blocks = []
+    for a, b in spans:
+        block = [f"### {sheet_name} (rows {a + 1}–{b})", ""]
+        block.extend(_table_lines(columns, df.iloc[a:b].itertuples(index=False, name=None)))
+        chunk_blocks.append(block)
+
+    head = [
+        f"## {sheet_name}",
+        "",
+        f"> 本 sheet 共 {total_rows} 行数据，按每 {page_rows} 行分为 {len(spans)} 段；"
+        "「文件行范围」为本文件内行号，可用 Read(offset=起行, limit=行数) 按段读取。",
+        "",
+        "| 分段 | 数据行 | 文件行范围 |",
+        "| --- | --- | --- |",
+    ]
+    # 索引行数固定（每段一行），可直接推算各分段的起止行
+    offset = len(head) + len(spans) + 1
+    index_rows = []
+    for i, ((a, b), block) in enumerate(zip(spans, chunk_blocks), 1):
+        start = base_line + offset
+        end = start + len(block) - 1
+        index_rows.append(f"| {i} | {a + 1}–{b} | {start}–{end} |")
+        offset += len(block) + 1
+
+    md_lines = head + index_rows + [""]
+    for block in chunk_blocks:
+        md_lines.extend(block)
+        md_lines.append("")
+    md_lines.append("")  # 与非分页输出一致：sheet 末尾保留一个空行
+
+    return "\n".join(md_lines)
+
+
+def compact_dataframe(df):
+    """紧凑化：规整空白、剔除全空行/列，并清空无意义的 `Unnamed: N` 列名
+
+    - 文本单元格内连续空白（空格/制表符/全角空格）折叠为一个空格，多余空行折叠为单个换行
+    - 仅含空白的单元格视为空值；全空的行、列（含末尾仅有格式的空白区域）一并剔除
+    - 有数据但表头为 `Unnamed: N` 的列保留，表头置空
+    """
+    _import_pandas()
+    df = df.copy()
+    for col in df.columns:
+        series = df[col]
+        if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+            continue
+        try:
+            cleaned = (
+                series.str.replace("[ \t\u3000]+", " ", regex=True)   # 非原始串：pyarrow 字符串列走 RE2，不认 \u 转义
+                      .str.replace(r"\s*\n\s*", "\n", regex=True)
+                      .str.strip()
+            )
+        except AttributeError:
+            # 混合类型且无字符串时 .str 不可用，保持原样
+            continue
+        # 非字符串单元格（数字、日期）在 .str 结果中为空值，回填原值
+        cleaned = cleaned.where(cleaned.notna(), series)
+        df[col] = cleaned.mask(cleaned == "")
+
+    df = df.dropna(how="all").dropna(axis=1, how="all")
+    df.columns = ["" if str(col).startswith("Unnamed:") else col for col in df.columns]
+    return df
+
+
+def estimate_table_chars(df):
+    """按单元格文本长度估算 Markdown 表格字符数（表头 + 分隔行 + 数据行，不含分页索引）
+
+    每行按 `| a | b |` 计：单元格文本 + 每列 3 个分隔字符 + 行尾 `|` 与换行；
+    逐列向量化计算，不逐格渲染，供紧凑模式对比压缩前后体积
+    """
+    _import_pandas()
+    rows, cols = df.shape
+    if not cols:
+        return 0
+    text_chars = sum(int(df[col].astype("string").str.len().fillna(0).sum()) for col in df.columns)
+    header_chars = sum(len(str(col)) for col in df.columns)
+    return text_chars + header_chars + 3 * cols + (rows + 2) * (3 * cols + 2)
+
+
+def _sidecar_format():
+    """sidecar 格式：安装了 pyarrow 时用 Parquet，否则退回 JSON-lines"""
+    try:
+        import pyarrow  # noqa: F401
+        return "parquet"
+    except ImportError:
+        return "jsonl"
+
+
+_INTEGRAL_TEXT_RE = re.compile(r"^([+-]?\d+)\.0*$")
+
+
+def normalize_key(value):
+    """
+    sidecar 键值规范化：建索引与查询时共用，保证两侧写法一致
+
+    数字列读出的整数值浮点（1001.0）及其文本形式（"1001.0"）统一为 "1001"，
+    其余值转字符串并去首尾空白；"007" 等带前导零的文本原样保留。
+    """
+    if isinstance(value, numbers.Real) and not isinstance(value, bool):
+        if isinstance(value, numbers.Integral) or float(value).is_integer():
+            return str(int(value))
+    text = str(value).strip()
+    m = _INTEGRAL_TEXT_RE.match(text)
+    return m.group(1) if m else text
+
+
+def write_sheet_sidecar(df, sheet_name, sidecar_dir, file_stem, fmt, key_columns=None):
+    """
+    写出单个 sheet 的结构化 sidecar，并返回该 sheet 的索引条目
+
+    所有单元格按字符串存储（空值为空串），列名统一为 c0..cN 以规避重名/空列名；
+    键列索引为 {键值: [行号, ...]}，键值经 normalize_key 规范化，未指定 key_columns 时以首列为键列。
+    jsonl 格式额外记录每行的字节偏移，查询时可直接 seek 到目标行。
+    """
+    columns = [str(col) for col in df.columns]
+    values = df.astype(object).where(df.notna(), "").astype(str)
+
+    key_names = [c for c in (key_columns or []) if c in columns] or columns[:1]
+    keys = {}
+    for name in key_names:
+        col_keys = {}
+        for row_no, raw in enumerate(df.iloc[:, columns.index(name)]):
+            key = "" if pd.isna(raw) else normalize_key(raw)
+            if key:
+                col_keys.setdefault(key, []).append(row_no)
+        keys[name] = col_keys
+
+    entry = {
+        "sheet": sheet_name,
+        "columns": columns,
+        "rows": len(values),
+        "keys": keys,
+    }
+    if fmt == "parquet":
+        data_path = sidecar_dir / f"{file_stem}.parquet"
+        values.columns = [f"c{i}" for i in range(len(columns))]
+        # pyarrow 直接写文件：先写同目录临时文件再原子替换，同样不单独写完成标记
+        tmp = temp_path(data_path)
+        try:
+            values.to_parquet(tmp, index=False, row_group_size=SIDECAR_ROW_GROUP_ROWS)
+            commit_temp(tmp, data_path, marker=False)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+    else:
+        data_path = sidecar_dir / f"{file_stem}.jsonl"
+        offsets = []
+        # 行数据文件不单独写完成标记：_index.json 最后写出，它的标记代表整个 sidecar 完整
+        with atomic_write(data_path, "wb", marker=False) as f:
+            for row in values.itertuples(index=False, name=None):
+                offsets.append(f.tell())
+                f.write(json.dumps(list(row), ensure_ascii=False).encode("utf-8") + b"\n")
+        entry["offsets"] = offsets
+    entry["file"] = data_path.name
+    return entry
+
+
 def _open_excel_file(excel_path):
     """优先用 pandas 默认引擎；遇 openpyxl 样式损坏等问题时回退 calamine。"""
     path = Path(excel_path)
@@ -72,7 +271,8 @@ def _open_excel_file(excel_path):
     raise RuntimeError(f"无法读取 Excel 文件: {last_err}") from last_err
 
 
-def convert_excel_to_markdown(excel_path, output_path=None, single_file=True):
+def convert_excel_to_markdown(excel_path, output_path=None, single_file=True, page_rows=0, compact=False,
+                              sidecar=False, key_columns=None):
     """
     将Excel文件转换为Markdown格式
     
@@ -80,6 +280,10 @@ def convert_excel_to_markdown(excel_path, output_path=None, single_file=True):
         excel_path: Excel文件路径
         output_path: 输出路径（文件或目录）
         single_file: 是否输出为单个文件，False则每个sheet输出一个文件
+        page_rows: 分页行数，超过该行数的sheet按段输出（0 表示不分页）
+        compact: 紧凑模式，剔除空列/空白区域并规整空白，输出每个sheet的体积缩减
+        sidecar: 是否额外写出结构化 sidecar（Parquet/JSON-lines）及键列索引
+        key_columns: sidecar 键列名列表，缺省时每个sheet以首列为键列
     """
     excel_path = Path(excel_path)
     
@@ -90,6 +294,7 @@ def convert_excel_to_markdown(excel_path, output_path=None, single_file=True):
     print(f"正在读取Excel文件: {excel_path}")
     
     try:
+        _import_pandas()
         # 读取所有sheet页（必要时自动回退 calamine，规避 openpyxl 样式解析错误）
         xlsx = _open_excel_file(excel_path)
         sheet_names = xlsx.sheet_names
@@ -107,9 +312,20 @@ def convert_excel_to_markdown(excel_path, output_path=None, single_file=True):
             anchor = sheet_name.replace(' ', '-').lower()
             all_markdown_content.append(f"{i}. [{sheet_name}](#{anchor})\n")
         all_markdown_content.append("\n---\n\n")
+
+        sidecar_dir = None
+        sidecar_entries = []
+        if sidecar:
+            if single_file:
+                md_file = Path(output_path) if output_path else excel_path.with_suffix('.md')
+                sidecar_dir = md_file.parent / f"{md_file.stem}.sidecar"
+            else:
+                sidecar_dir = (Path(output_path) if output_path else excel_path.parent) / f"{excel_path.stem}.sidecar"
+            sidecar_dir.mkdir(parents=True, exist_ok=True)
+            sidecar_fmt = _sidecar_format()
         
         # 处理每个sheet
-        for sheet_name in sheet_names:
+        for sheet_no, sheet_name in enumerate(sheet_names, 1):
             print(f"  正在处理sheet: {sheet_name}")
             
             try:
@@ -118,9 +334,30 @@ def convert_excel_to_markdown(excel_path, output_path=None, single_file=True):
                 
                 # 删除完全空白的行
                 df = df.dropna(how='all')
+
+                raw_df = None
+                if compact:
+                    raw_df = df
+                    df = compact_dataframe(df)
                 
-                # 转换为Markdown
-                md_content = dataframe_to_markdown(df, sheet_name)
+                # 转换为Markdown（分页索引需知道本 sheet 在输出文件中的起始行号）
+                if single_file:
+                    base_line = sum(part.count("\n") for part in all_markdown_content) + 1
+                else:
+                    base_line = 7  # 单 sheet 文件头部固定 6 行（标题、源文件、分隔线）
+                md_content = dataframe_to_markdown(df, sheet_name, page_rows, base_line)
+
+                if raw_df is not None:
+                    # 压缩前后用同一估算口径比较，避免为统计再渲染一遍原表
+                    raw_size, compact_size = estimate_table_chars(raw_df), estimate_table_chars(df)
+                    saved = 1 - compact_size / raw_size if raw_size else 0
+                    print(f"    紧凑模式: {raw_df.shape[0]}×{raw_df.shape[1]} → {df.shape[0]}×{df.shape[1]}，"
+                          f"约 {raw_size} → {compact_size} 字符（-{saved:.0%}）")
+
+                if sidecar_dir is not None and not df.empty:
+                    safe_sheet_name = "".join(c for c in sheet_name if c.isalnum() or c in (' ', '-', '_')).strip()
+                    sidecar_entries.append(write_sheet_sidecar(
+                        df, sheet_name, sidecar_dir, f"{sheet_no:02d}_{safe_sheet_name}", sidecar_fmt, key_columns))
                 
                 if single_file:
                     all_markdown_content.append(md_content)
@@ -137,7 +374,7 @@ def convert_excel_to_markdown(excel_path, output_path=None, single_file=True):
                     safe_sheet_name = "".join(c for c in sheet_name if c.isalnum() or c in (' ', '-', '_')).strip()
                     sheet_output_path = output_dir / f"{safe_sheet_name}.md"
                     
-                    with open(sheet_output_path, 'w', encoding='utf-8') as f:
+                    with atomic_write(sheet_output_path, 'w') as f:
                         f.write(f"# {sheet_name}\n\n")
                         f.write(f"*源文件: {excel_path.name}*\n\n")
                         f.write("---\n\n")
@@ -156,10 +393,21 @@ def convert_excel_to_markdown(excel_path, output_path=None, single_file=True):
             else:
                 output_file = excel_path.with_suffix('.md')
             
-            with open(output_file, 'w', encoding='utf-8') as f:
+            with atomic_write(output_file, 'w') as f:
                 f.write("".join(all_markdown_content))
             
             print(f"\n转换完成！输出文件: {output_file}")
+
+        if sidecar_dir is not None:
+            index = {
+                "source_file": excel_path.name,
+                "format": sidecar_fmt,
+                "created": datetime.now().strftime("%Y-%m-%d %H:%M"),
+                "sheets": sidecar_entries,
+            }
+            with atomic_write(sidecar_dir / SIDECAR_INDEX_NAME, 'w') as f:
+                json.dump(index, f, ensure_ascii=False)
+            print(f"结构化 sidecar（{sidecar_fmt}，{len(sidecar_entries)} 个sheet）: {sidecar_dir}")
         
         return True
         
@@ -170,6 +418,275 @@ def convert_excel_to_markdown(excel_path, output_path=None, single_file=True):
         return False
 
 
+def _preview_cell(value):
+    """预览用单元格清理（不依赖 pandas）：空值转空串，其余同 clean_cell_value"""
+    if value is None or value == "":
+        return ""
+    return str(value).replace('\n', '<br>').replace('|', '\\|').strip()
+
+
+_XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_XLSX_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+
+def _xlsx_col_index(cell_ref):
+    """单元格引用（如 "AB12"）→ 0-based 列号"""
+    idx = 0
+    for ch in cell_ref:
+        if not ch.isalpha():
+            break
+        idx = idx * 26 + ord(ch.upper()) - 64
+    return idx - 1
+
+
+def _xlsx_ref_row(cell_ref):
+    digits = "".join(ch for ch in cell_ref if ch.isdigit())
+    return int(digits) if digits else 0
+
+
+def _xlsx_sheet_paths(zf):
+    """读取 workbook.xml 及其 rels，返回 {sheet名: 工作表 XML 在包内的路径}"""
+    import xml.etree.ElementTree as ET
+
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target", "") for rel in rels}
+    paths = {}
+    for sheet in workbook.iter(f"{_XLSX_NS}sheet"):
+        target = targets.get(sheet.get(f"{_XLSX_REL_NS}id"), "")
+        paths[sheet.get("name")] = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+    return paths
+
+
+def _xlsx_shared_strings(zf, needed):
+    """流式读取 sharedStrings.xml，只解析到所需的最大下标为止"""
+    import xml.etree.ElementTree as ET
+
+    if not needed or "xl/sharedStrings.xml" not in zf.namelist():
+        return {}
+    last = max(needed)
+    strings = {}
+    idx = 0
+    with zf.open("xl/sharedStrings.xml") as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag != f"{_XLSX_NS}si":
+                continue
+            if idx in needed:
+                strings[idx] = "".join(t.text or "" for t in elem.iter(f"{_XLSX_NS}t"))
+            elem.clear()
+            idx += 1
+            if idx > last:
+                break
+    return strings
+
+
+def _probe_xlsx_sheet(zf, sheet_path, nrows):
+    """
+    从 xlsx 工作表 XML 中读取 <dimension>、第 1 行与其后前 nrows 个非空行，读到即停，不解析整张表。
+    返回 ([(行号, 自 A 列起的单元格值), ...], 末行行号, 自 A 列起的列数)；
+    缺少 dimension 时返回 None 以便回退 calamine。
+    """
+    import xml.etree.ElementTree as ET
+
+    if not sheet_path or sheet_path not in zf.namelist():
+        return None
+    dimension = None
+    raw_rows = []
+    data_rows = 0
+    row_no = 0
+    with zf.open(sheet_path) as f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                if elem.tag == f"{_XLSX_NS}dimension":
+                    dimension = elem.get("ref", "")
+                continue
+            if elem.tag != f"{_XLSX_NS}row":
+                continue
+            row_no = int(elem.get("r") or row_no + 1)
+            cells = []
+            col = -1
+            for c in elem.iter(f"{_XLSX_NS}c"):
+                col = _xlsx_col_index(c.get("r")) if c.get("r") else col + 1
+                ctype = c.get("t", "n")
+                if ctype == "inlineStr":
+                    value = "".join(t.text or "" for t in c.iter(f"{_XLSX_NS}t"))
+                else:
+                    v = c.find(f"{_XLSX_NS}v")
+                    value = v.text if v is not None else None
+                if value not in (None, ""):
+                    cells.append((col, ctype, value))
+            elem.clear()
+            if cells:
+                raw_rows.append((row_no, cells))
+                data_rows += row_no > 1
+                if data_rows >= nrows:
+                    break
+
+    if not dimension or ":" not in dimension:
+        return None
+    last_ref = dimension.split(":", 1)[1]
+    width = _xlsx_col_index(last_ref) + 1
+    if not raw_rows:
+        return [], 0, 0
+
+    shared = _xlsx_shared_strings(zf, {int(v) for _, cells in raw_rows for _, t, v in cells if t == "s"})
+    rows = []
+    for row_no, cells in raw_rows:
+        row = [""] * width
+        for col, ctype, value in cells:
+            if ctype == "s":
+                value = shared.get(int(value), "")
+            elif ctype == "b":
+                value = "TRUE" if value == "1" else "FALSE"
+            if 0 <= col < width:
+                row[col] = value
+        rows.append((row_no, row))
+    return rows, _xlsx_ref_row(last_ref), width
+
+
+def _converter_view(rows, height, nrows):
+    """
+    按转换时 pd.read_excel(header=0) + dropna(how='all') 的口径整理探测结果：
+    表头固定为工作表第 1 行（空单元格记为 Unnamed: N，重名追加 .1/.2），
+    数据行为其后的非空行。rows 为 [(行号, 自 A 列起的单元格值), ...]。
+    返回 (表头, 样例行, 数据行数, 首个非空单元格引用)
+    """
+    if not rows:
+        return [], [], 0, ""
+    width = len(rows[0][1])
+    first = rows[0][1] if rows[0][0] == 1 else [""] * width
+    header = []
+    seen = {}
+    for i, value in enumerate(first):
+        name = _preview_cell(value) or f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        header.append(name)
+
+    data = [(row_no, row) for row_no, row in rows if row_no > 1]
+    samples = [[_preview_cell(v) for v in row] for _, row in data[:nrows]]
+    if len(data) < nrows:
+        data_rows = len(data)
+    else:
+        # 已读到的空行不计入；最后一个样例行之后的空行未读取，按 dimension 估算
+        last = data[nrows - 1][0]
+        data_rows = len(data[:nrows]) + max(height - last, 0)
+
+    row_no, row = rows[0]
+    col = next(i for i, v in enumerate(row) if v not in (None, ""))
+    ref, n = "", col + 1
+    while n:
+        n, r = divmod(n - 1, 26)
+        ref = chr(65 + r) + ref
+    return header, samples, data_rows, f"{ref}{row_no}"
+
+
+def preview_excel(excel_path, preview_rows=5):
+    """
+    预览 Excel 结构：仅读取 sheet 元数据与每个 sheet 的前 K 行，
+    返回各 sheet 的行列数、表头行、样例行及全量转换后的 Markdown 体积预估。
+
+    sheet 列表与可见性来自 calamine 的元数据；calamine 取单个 sheet 时会解析整张表，
+    因此 xlsx 改为直接流式读取工作表 XML 的 <dimension> 与前 K 行，其他格式（xls/xlsb/ods）
+    或缺少 dimension 的 sheet 才回退 calamine 的 to_python(nrows=K)。
+    表头、列数与数据行数均按转换时的口径（见 _converter_view）给出，与实际生成的 md 一致。
+    """
+    try:
+        from python_calamine import CalamineWorkbook
+    except ImportError:
+        raise RuntimeError("预览模式需要 python-calamine：pip install python-calamine")
+    import zipfile
+
+    excel_path = Path(excel_path)
+    workbook = CalamineWorkbook.from_path(str(excel_path))
+    zf = zipfile.ZipFile(excel_path) if zipfile.is_zipfile(excel_path) else None
+    sheets = []
+    try:
+        sheet_paths = _xlsx_sheet_paths(zf) if zf and "xl/workbook.xml" in zf.namelist() else {}
+        for meta in workbook.sheets_metadata:
+            visible = str(meta.visible).rsplit(".", 1)[-1].lower()
+            probe = _probe_xlsx_sheet(zf, sheet_paths.get(meta.name), preview_rows) if sheet_paths else None
+            if probe is None:
+                sheet = workbook.get_sheet_by_name(meta.name)
+                # 与 pandas 的 calamine 引擎一致，从 A1 起读取（含左上方空白区域）
+                lead = sheet.start[0] if sheet.start else 0
+                head = sheet.to_python(skip_empty_area=False, nrows=lead + preview_rows + 1)
+                rows = [(i, row) for i, row in enumerate(head, 1) if any(v not in (None, "") for v in row)]
+                end = sheet.end or (-1, -1)
+                probe = (rows, end[0] + 1, end[1] + 1)
+            rows, height, width = probe
+            header, samples, data_rows, data_start = _converter_view(rows, height, preview_rows)
+
+            # 用样例行的平均长度外推全量 Markdown 体积（表头 + 分隔行 + 数据行）
+            header_bytes = sum(len(("| " + " | ".join(r) + " |\n").encode("utf-8"))
+                               for r in (header, ["---"] * len(header)))
+            if samples:
+                avg_row = sum(len(("| " + " | ".join(r) + " |\n").encode("utf-8")) for r in samples) / len(samples)
+            else:
+                avg_row = 0
+            sheets.append({
+                "name": meta.name,
+                "visible": visible,
+                "rows": data_rows,
+                "columns": width if header else 0,
+                "header_row": 1,
+                "data_start": data_start,
+                "header": header,
+                "samples": samples,
+                "est_md_lines": data_rows + 5 if data_rows else 3,
+                "est_md_bytes": int(header_bytes + avg_row * data_rows),
+            })
+    finally:
+        workbook.close()
+        if zf:
+            zf.close()
+
+    return {
+        "file": excel_path.name,
+        "file_bytes": excel_path.stat().st_size,
+        "sheet_count": len(sheets),
+        "est_md_bytes": sum(s["est_md_bytes"] for s in sheets),
+        "sheets": sheets,
+    }
+
+
+def format_preview_markdown(summary):
+    """将预览结果格式化为紧凑 Markdown"""
+    def kb(n):
+        return f"{n / 1024:.1f} KB"
+
+    lines = [f"# 预览: {summary['file']}", ""]
+    lines.append(f"> 文件 {kb(summary['file_bytes'])}，{summary['sheet_count']} 个 sheet，"
+                 f"预估全量 Markdown {kb(summary['est_md_bytes'])}")
+    lines.append("")
+    lines.append("| sheet | 可见性 | 数据行 | 列数 | 数据起点 | 预估 md 行数 | 预估 md 大小 |")
+    lines.append("| --- | --- | --- | --- | --- | --- | --- |")
+    for s in summary["sheets"]:
+        lines.append(f"| {_preview_cell(s['name'])} | {s['visible']} | {s['rows']} | {s['columns']} | "
+                     f"{s['data_start'] or '-'} | {s['est_md_lines']} | {kb(s['est_md_bytes'])} |")
+    for s in summary["sheets"]:
+        lines.append("")
+        lines.append(f"## {s['name']}")
+        lines.append("")
+        if not s["header"]:
+            lines.append("*该sheet页为空*")
+            continue
+        if s["data_start"] != "A1":
+            lines.append(f"> 表格不从 A1 开始（首个非空单元格 {s['data_start']}）：转换以第 1 行为表头，"
+                         f"空表头记为 `Unnamed: N`，下表即转换后的样子")
+            lines.append("")
+        lines.extend([
+            "| " + " | ".join(s["header"]) + " |",
+            "| " + " | ".join(["---"] * len(s["header"])) + " |",
+        ])
+        for row in s["samples"]:
+            lines.append("| " + " | ".join(row) + " |")
+    return "\n".join(lines) + "\n"
+
+
 def load_config(config_path):
     """从 JSON 配置文件加载参数（UTF-8），用于兼容中文路径"""
     path = Path(config_path)
@@ -181,11 +698,19 @@ def load_config(config_path):
 
 def main():
     """主函数：支持命令行参数或 --config 配置文件"""
+    _stdout_utf8()
     parser = argparse.ArgumentParser(description="Excel 转 Markdown")
-    parser.add_argument("--config", type=str, help="配置文件路径（JSON），含 excel、out、single_file")
+    parser.add_argument("--config", type=str, help="配置文件路径（JSON），含 excel、out、single_file、page_rows、compact、sidecar、key_columns、preview")
     parser.add_argument("--excel", type=str, help="Excel 文件路径")
     parser.add_argument("--out", type=str, default=None, help="输出文件或目录路径")
     parser.add_argument("--multi", action="store_true", help="每个 sheet 输出一个文件")
+    parser.add_argument("--page-rows", type=int, default=0, help="超过该行数的 sheet 按段分页输出（0 表示不分页）")
+    parser.add_argument("--compact", action="store_true", help="紧凑模式：剔除空列/Unnamed 列名与空白区域")
+    parser.add_argument("--sidecar", action="store_true", help="额外写出结构化 sidecar 与键列索引（供 query_excel_sidecar.py 查询）")
+    parser.add_argument("--key-column", action="append", default=None, help="sidecar 键列名，可多次指定（默认各 sheet 首列）")
+    parser.add_argument("--preview", action="store_true", help="仅预览结构（sheet、行列数、表头、样例行、预估体积），不转换")
+    parser.add_argument("--preview-rows", type=int, default=5, help="预览模式每个 sheet 的样例行数（默认 5）")
+    parser.add_argument("--preview-json", action="store_true", help="预览结果以 JSON 输出（默认 Markdown）")
     parser.add_argument("excel_positional", nargs="?", help="Excel 路径（位置参数）")
     parser.add_argument("out_positional", nargs="?", help="输出路径（位置参数）")
     args = parser.parse_args()
@@ -193,12 +718,26 @@ def main():
     excel_path = None
     output_path = None
     single_file = True
+    page_rows = args.page_rows
+    compact = args.compact
+    sidecar = args.sidecar
+    key_columns = args.key_column
+    preview = args.preview
+    preview_rows = args.preview_rows
+    preview_json = args.preview_json
 
     if args.config:
         cfg = load_config(args.config)
         excel_path = cfg.get("excel")
         output_path = cfg.get("out")
         single_file = cfg.get("single_file", True)
+        page_rows = int(cfg.get("page_rows", page_rows) or 0)
+        compact = bool(cfg.get("compact", compact))
+        sidecar = bool(cfg.get("sidecar", sidecar))
+        key_columns = cfg.get("key_columns", key_columns)
+        preview = bool(cfg.get("preview", preview))
+        preview_rows = int(cfg.get("preview_rows", preview_rows))
+        preview_json = cfg.get("preview_format", "json" if preview_json else "md") == "json"
         if not excel_path:
             print("错误：配置文件中缺少 excel 路径")
             sys.exit(1)
@@ -215,12 +754,28 @@ def main():
         if len(sys.argv) > 3 and sys.argv[3].lower() == "multi":
             single_file = False
 
+    if preview:
+        if not Path(excel_path).exists():
+            print(f"错误：文件不存在 - {excel_path}")
+            sys.exit(1)
+        try:
+            summary = preview_excel(excel_path, preview_rows)
+        except RuntimeError as e:
+            print(f"错误：{e}")
+            sys.exit(1)
+        if preview_json:
+            print(json.dumps(summary, ensure_ascii=False, default=str))
+        else:
+            print(format_preview_markdown(summary), end="")
+        return
+
     print("=" * 60)
     print("Excel 转 Markdown 工具")
     print("=" * 60)
     print()
 
-    success = convert_excel_to_markdown(excel_path, output_path, single_file)
+    success = convert_excel_to_markdown(excel_path, output_path, single_file, page_rows, compact,
+                                        sidecar, key_columns)
 
     if success:
         print("\n转换成功！")
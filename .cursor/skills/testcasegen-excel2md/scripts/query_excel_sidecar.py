@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Excel sidecar 查询工具
+按规则 ID / 字段名等键值，从 excel_to_markdown.py --sidecar 生成的结构化 sidecar 中
+直接取出匹配行并输出为 Markdown 表格，无需线性扫描整张大表。
+
+用法:
+  python query_excel_sidecar.py --sidecar <xxx.sidecar 目录> --key R001 [--key R002]
+  python query_excel_sidecar.py --sidecar <目录> --key 金额 --sheet 接口字段 --contains
+  python query_excel_sidecar.py --config <config.json>
+
+配置文件格式（JSON，UTF-8，用于中文路径）:
+  {
+    "sidecar": "<xxx.sidecar 目录绝对路径>",
+    "keys": ["R001", "R002"],
+    "sheet": "<可选，仅查询该 sheet>",
+    "column": "<可选，仅匹配该键列>",
+    "contains": false,
+    "out": "<可选，结果写入该 md 文件；不填则输出到 stdout>"
+  }
+
+退出码: 0 有命中；1 未找到匹配行或参数错误
+"""
+
+import argparse
+import bisect
+import json
+import sys
+from pathlib import Path
+
+# 与生成 sidecar 的 excel_to_markdown.py 共用单元格转义与索引名（该模块延迟导入 pandas，导入开销很小）
+from excel_to_markdown import SIDECAR_INDEX_NAME, _stdout_utf8, clean_cell_value, normalize_key
+
+
+def load_config(config_path):
+    """从 JSON 配置文件加载参数（UTF-8），用于兼容中文路径"""
+    path = Path(config_path)
+    if not path.exists():
+        raise FileNotFoundError(f"配置文件不存在: {config_path}")
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def match_rows(entry, keys, column=None, contains=False):
+    """在 sheet 的键列索引中查找键值，返回 [(键列名, 键值, 行号), ...]，按行号排序去重"""
+    hits = {}
+    for col_name, col_keys in entry["keys"].items():
+        if column and col_name != column:
+            continue
+        for key in keys:
+            if contains:
+                for k, rows in col_keys.items():
+                    if key in k:
+                        for r in rows:
+                            hits.setdefault(r, (col_name, k, r))
+            else:
+                for r in col_keys.get(key, []):
+                    hits.setdefault(r, (col_name, key, r))
+    return [hits[r] for r in sorted(hits)]
+
+
+def read_rows(sidecar_dir, entry, fmt, row_numbers):
+    """按行号读取 sidecar 中的行：jsonl 按字节偏移 seek，parquet 只解码命中行所在的 row group"""
+    path = sidecar_dir / entry["file"]
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(path)
+        # 各 row group 的起始行号取自文件尾部元数据，旧版单 row group 的 sidecar 同样适用
+        starts = []
+        total = 0
+        for i in range(pf.num_row_groups):
+            starts.append(total)
+            total += pf.metadata.row_group(i).num_rows
+        groups = sorted({bisect.bisect_right(starts, r) - 1 for r in row_numbers})
+        base = {}
+        read = 0
+        for g in groups:
+            base[g] = read
+            read += pf.metadata.row_group(g).num_rows
+        table = pf.read_row_groups(groups)
+        local = []
+        for r in row_numbers:
+            g = bisect.bisect_right(starts, r) - 1
+            local.append(base[g] + r - starts[g])
+        return [list(row.values()) for row in table.take(local).to_pylist()]
+
+    offsets = entry["offsets"]
+    rows = []
+    with open(path, "rb") as f:
+        for r in row_numbers:
+            f.seek(offsets[r])
+            rows.append(json.loads(f.readline()))
+    return rows
+
+
+def query_sidecar(sidecar_dir, keys, sheet=None, column=None, contains=False):
+    """查询 sidecar，返回 Markdown 文本及命中行数"""
+    sidecar_dir = Path(sidecar_dir)
+    with open(sidecar_dir / SIDECAR_INDEX_NAME, "r", encoding="utf-8") as f:
+        index = json.load(f)
+
+    md_parts = []
+    total_hits = 0
+    for entry in index["sheets"]:
+        if sheet and entry["sheet"] != sheet:
+            continue
+        hits = match_rows(entry, keys, column, contains)
+        if not hits:
+            continue
+        rows = read_rows(sidecar_dir, entry, index["format"], [r for _, _, r in hits])
+        total_hits += len(rows)
+
+        columns = [clean_cell_value(c) for c in entry["columns"]]
+        md_lines = [f"## {entry['sheet']}\n"]
+        md_lines.append("| 行号 | " + " | ".join(columns) + " |")
+        md_lines.append("| --- | " + " | ".join(["---"] * len(columns)) + " |")
+        for (_, _, r), row in zip(hits, rows):
+            cells = [clean_cell_value(str(v)) for v in row]
+            md_lines.append(f"| {r + 1} | " + " | ".join(cells) + " |")
+        md_lines.append("\n")
+        md_parts.append("\n".join(md_lines))
+
+    return "".join(md_parts), total_hits
+
+
+def main():
+    """主函数：支持命令行参数或 --config 配置文件"""
+    _stdout_utf8()
+    parser = argparse.ArgumentParser(description="按键值查询 Excel sidecar，输出匹配行的 Markdown 表格")
+    parser.add_argument("--config", type=str, help="配置文件路径（JSON），含 sidecar、keys、sheet、column、contains、out")
+    parser.add_argument("--sidecar", type=str, help="sidecar 目录（excel_to_markdown.py --sidecar 的产出）")
+    parser.add_argument("--key", action="append", default=[], help="查询的键值，可多次指定")
+    parser.add_argument("--sheet", type=str, default=None, help="仅查询指定 sheet")
+    parser.add_argument("--column", type=str, default=None, help="仅匹配指定键列")
+    parser.add_argument("--contains", action="store_true", help="子串匹配（默认精确匹配）")
+    parser.add_argument("--out", type=str, default=None, help="结果写入的 md 文件（默认输出到 stdout）")
+    args = parser.parse_args()
+
+    sidecar_dir = args.sidecar
+    keys = args.key
+    sheet, column, contains, out = args.sheet, args.column, args.contains, args.out
+    if args.config:
+        cfg = load_config(args.config)
+        sidecar_dir = cfg.get("sidecar", sidecar_dir)
+        keys = cfg.get("keys", keys)
+        sheet = cfg.get("sheet", sheet)
+        column = cfg.get("column", column)
+        contains = bool(cfg.get("contains", contains))
+        out = cfg.get("out", out)
+
+    if not sidecar_dir or not keys:
+        print("错误：需要提供 sidecar 目录和至少一个键值", file=sys.stderr)
+        sys.exit(1)
+    if not (Path(sidecar_dir) / SIDECAR_INDEX_NAME).exists():
+        print(f"错误：sidecar 索引不存在 - {Path(sidecar_dir) / SIDECAR_INDEX_NAME}", file=sys.stderr)
+        sys.exit(1)
+
+    # 与建索引时同样规范化，查询 1001 / 1001.0 均可命中数字键
+    md, total_hits = query_sidecar(sidecar_dir, [normalize_key(k) for k in keys], sheet, column, contains)
+    if not total_hits:
+        md = f"*未找到匹配行: {', '.join(keys)}*\n"
+
+    if out:
+        Path(out).parent.mkdir(parents=True, exist_ok=True)
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(md)
+        print(f"命中 {total_hits} 行，已写入: {out}")
+    else:
+        print(md, end="")
+    if not total_hits:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
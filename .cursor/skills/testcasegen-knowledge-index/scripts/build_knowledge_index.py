@@ -28,6 +28,10 @@ import sys
 from datetime import datetime
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent / "testcasegen-split-prd" / "scripts"))
+from atomic_io import atomic_write  # noqa: E402
+from md_structure import read_markdown_structure  # noqa: E402
+
 # ── 目录名 → 知识库类型映射 ───────────────────────────────────────────────
 # key: knowledge/ 下一级目录名（小写包含即匹配）
 DIR_TYPE_MAP = [
@@ -52,23 +56,14 @@ def detect_type(rel_path: str) -> str:
 
 def extract_headings(filepath: Path) -> tuple[int, list[tuple[int, int, str]]]:
     """
-    读取 md 文件，提取 H1/H2 标题及行号。
+    读取 md 文件，提取 H1/H2 标题及行号（代码块内的 # 行不计）。
     返回 (总行数, [(行号, 级别, 标题文本), ...])
     """
-    headings: list[tuple[int, int, str]] = []
     try:
-        with open(filepath, "r", encoding="utf-8", errors="replace") as f:
-            raw_lines = f.readlines()
-        total = len(raw_lines)
-        for i, line in enumerate(raw_lines, 1):
-            s = line.strip()
-            if s.startswith("#"):
-                level = len(s) - len(s.lstrip("#"))
-                if level <= 2:  # 只索引 H1/H2，保持索引简洁
-                    title = s.lstrip("#").strip()
-                    if title:
-                        headings.append((i, level, title))
-        return total, headings
+        doc = read_markdown_structure(filepath)
+        # 只索引 H1/H2，保持索引简洁
+        headings = [(h["line"] + 1, h["level"], h["title"]) for h in doc["headings"] if h["level"] <= 2]
+        return doc["total_lines"], headings
     except Exception as e:
         print(f"  ⚠ 读取失败: {filepath} — {e}", file=sys.stderr)
         return 0, []
@@ -245,8 +240,7 @@ def build_index(knowledge_dir: str, output_file: str, project_name: str) -> None
 
     # ── 写文件 ────────────────────────────────────────────────────────────
     out_path = Path(output_file)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(out_path, "w", encoding="utf-8") as f:
+    with atomic_write(out_path, "w") as f:
         f.write("\n".join(out))
 
     print(f"✅ 知识库索引已生成：{out_path}")
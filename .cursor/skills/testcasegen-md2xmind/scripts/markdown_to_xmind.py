@@ -28,8 +28,13 @@ XMind测试用例生成器
 import os
 import sys
 import re
+from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent / 'testcasegen-split-prd' / 'scripts'))
+from atomic_io import commit_temp, temp_path  # noqa: E402
+from md_structure import CaseHeadingScanner  # noqa: E402
+
 
 # ============================================================
 # 常量定义
@@ -77,7 +82,7 @@ def create_xmind_from_md(
         return
     
     if output_dir is None:
-        output_dir = _resolve_output_dir(md_file_path)
+        output_dir = default_xmind_dir(md_file_path)
     print("\n" + "=" * 60)
     print("解析 Markdown 测试用例文件")
     print("=" * 60)
@@ -94,73 +99,59 @@ def create_xmind_from_md(
     if not output_dir:
         output_dir = os.path.dirname(md_file_path) or "."
     
-    # 3. 从文件名提取产品名和版本号
-    filename = os.path.basename(md_file_path)
-    product_name, version = _extract_product_version_from_filename(filename)
+    # 3. 从文件名推断根节点标题（优先包含功能概述或版本号）与输出文件名
+    default_root, default_hint = default_xmind_names(
+        md_file_path, None if custom_path else _extract_root_title_from_md(md_file_path))
     
-    # 4. 生成 custom_path（根节点标题，优先包含功能概述或版本号）
-    if not custom_path:
-        if product_name and version:
-            custom_path = "{}{}".format(product_name, version)
-        elif product_name:
-            custom_path = product_name
-        else:
-            # 无版本号时：优先从 md 文件第一行 # 标题提取，否则用文件名（去掉 .md）
-            custom_path = _extract_root_title_from_md(md_file_path) or os.path.splitext(filename)[0]
-    
-    # 5. 统计信息
+    create_xmind_from_cases(
+        all_cases,
+        output_dir=output_dir,
+        custom_path=custom_path or default_root,
+        output_filename_hint=output_filename_hint or default_hint,
+    )
+
+
+def create_xmind_from_cases(all_cases, output_dir, custom_path, output_filename_hint=None):
+    """由已解析的用例列表生成 XMind 并打印统计（merge_modules.py 融合导出时直接调用）"""
     print("\n解析完成:")
     print("   用例数: {}".format(len(all_cases)))
     
     print("\n生成 XMind 文件...")
     
-    # 6. 一次性生成所有用例
-    hint = output_filename_hint
-    if hint is None:
-        if product_name and version:
-            hint = "{}{}测试用例.xmind".format(product_name, version)
-        elif filename:
-            hint = os.path.splitext(filename)[0] + ".xmind"
-
+    # 一次性生成所有用例
     create_xmind_file_v2(
         all_cases,
         output_dir=output_dir,
         custom_path=custom_path,
-        output_filename_hint=hint
+        output_filename_hint=output_filename_hint
     )
     
-    # 7. 打印统计
     _print_statistics_v2(all_cases)
 
 
-def parse_md_testcase_file_v2(md_file_path: str) -> List[Dict]:
+class _CaseCollector:
     """
-    解析 .md 格式的详细测试用例文件（支持4级目录层级）
-
-    目录结构：
-        ## 所属模块 > ### 功能名称 > #### 场景分类 > ##### 用例标题
-
-    返回：
-        list: 测试用例列表，每个用例包含完整层级路径
+    用例收集器：按文档顺序逐行接收原文，组装测试用例（4级目录层级）。
+    整文件解析（parse_md_testcase_file_v2）与流式解析（CaseStreamParser）共用。
     """
-    with open(md_file_path, 'r', encoding='utf-8') as f:
-        lines = f.read().split('\n')
 
-    all_cases = []
-    # 当前层级上下文
-    ctx = {'module': None, 'feature': None, 'category': None}
-    current_case = None
-    current_field = None
+    def __init__(self):
+        self.scanner = CaseHeadingScanner()
+        self.cases: List[Dict] = []
+        # 当前层级上下文
+        self.ctx = {'module': None, 'feature': None, 'category': None}
+        self.current_case = None
+        self.current_field = None
 
-    def save_case():
+    def save_case(self):
         """保存当前用例到列表"""
-        nonlocal current_case
-        if current_case:
-            all_cases.append(current_case)
-            current_case = None
+        if self.current_case:
+            self.cases.append(self.current_case)
+            self.current_case = None
 
-    def create_case(case_title: str) -> Dict:
+    def create_case(self, case_title: str) -> Dict:
         """创建新用例"""
+        ctx = self.ctx
         # 提取用例ID
         match = RE_CASE_ID.match(case_title)
         case_id = match.group(1) if match else ''
@@ -183,68 +174,145 @@ def parse_md_testcase_file_v2(md_file_path: str) -> List[Dict]:
             'expected_list': []
         }
 
-    for line in lines:
+    def feed(self, line: str):
+        """一行原文：## – ##### 标题按 CaseHeadingScanner 识别（不受缩进与代码块围栏影响），其余行解析字段"""
+        heading = self.scanner.feed(line)
         stripped = line.strip()
-
         # 跳过空行和分隔线
         if not stripped or stripped == '---':
-            continue
-
-        # 解析各级标题
-        if _is_heading(stripped, 2):
-            save_case()
-            ctx['module'] = _get_heading_content(stripped, 2)
+            return
+        if heading:
+            self.heading(*heading)
+        else:
+            self.line(stripped)
+
+    def heading(self, level: int, text: str):
+        """## – ##### 标题：更新层级上下文或开始新用例"""
+        self.save_case()
+        ctx = self.ctx
+        if level == 2:
+            ctx['module'] = text
             ctx['feature'] = ctx['category'] = None
-            current_field = None
-            continue
-
-        if _is_heading(stripped, 3):
-            save_case()
-            ctx['feature'] = _get_heading_content(stripped, 3)
+        elif level == 3:
+            ctx['feature'] = text
             ctx['category'] = None
-            current_field = None
-            continue
+        elif level == 4:
+            ctx['category'] = text
+        else:
+            self.current_case = self.create_case(text)
+        self.current_field = None
 
-        if _is_heading(stripped, 4):
-            save_case()
-            ctx['category'] = _get_heading_content(stripped, 4)
-            current_field = None
-            continue
+    def line(self, stripped: str):
+        """非标题行（已去除首尾空白）：解析用例字段"""
+        current_case = self.current_case
+        if not current_case:
+            return
+        if stripped.startswith('- 前置：') or stripped.startswith('- 前置:'):
+            current_case['precondition'] = _parse_field_value(stripped, '- 前置')
+            self.current_field = None
+        elif stripped.startswith('- 操作：') or stripped.startswith('- 操作:'):
+            self.current_field = 'steps'
+        elif stripped.startswith('- 预期：') or stripped.startswith('- 预期:'):
+            self.current_field = 'expected'
+        elif stripped.startswith('- 优先级：') or stripped.startswith('- 优先级:'):
+            current_case['priority'] = _parse_priority(
+                _parse_field_value(stripped, '- 优先级')
+            )
+            self.current_field = None
+        elif stripped.startswith('- ') and not stripped.startswith('-  '):
+            self.current_field = None
+        else:
+            # 解析编号列表内容
+            match = RE_STEP_NUMBER.match(stripped)
+            if match and self.current_field:
+                content = match.group(2).strip()
+                if self.current_field == 'steps':
+                    current_case['steps'].append(content)
+                elif self.current_field == 'expected':
+                    current_case['expected_list'].append(content)
 
-        if _is_heading(stripped, 5):
-            save_case()
-            current_case = create_case(_get_heading_content(stripped, 5))
-            current_field = None
-            continue
+    def close(self) -> List[Dict]:
+        self.save_case()
+        return self.cases
 
-        # 解析用例内容
-        if current_case:
-            if stripped.startswith('- 前置：') or stripped.startswith('- 前置:'):
-                current_case['precondition'] = _parse_field_value(stripped, '- 前置')
-                current_field = None
-            elif stripped.startswith('- 操作：') or stripped.startswith('- 操作:'):
-                current_field = 'steps'
-            elif stripped.startswith('- 预期：') or stripped.startswith('- 预期:'):
-                current_field = 'expected'
-            elif stripped.startswith('- 优先级：') or stripped.startswith('- 优先级:'):
-                current_case['priority'] = _parse_priority(
-                    _parse_field_value(stripped, '- 优先级')
-                )
-                current_field = None
-            elif stripped.startswith('- ') and not stripped.startswith('-  '):
-                current_field = None
-            else:
-                # 解析编号列表内容
-                match = RE_STEP_NUMBER.match(stripped)
-                if match and current_field:
-                    content = match.group(2).strip()
-                    if current_field == 'steps':
-                        current_case['steps'].append(content)
-                    elif current_field == 'expected':
-                        current_case['expected_list'].append(content)
 
-    save_case()
-    return all_cases
+def parse_md_testcase_file_v2(md_file_path: str) -> List[Dict]:
+    """
+    解析 .md 格式的详细测试用例文件（支持4级目录层级）
+
+    目录结构：
+        ## 所属模块 > ### 功能名称 > #### 场景分类 > ##### 用例标题
+
+    返回：
+        list: 测试用例列表，每个用例包含完整层级路径
+    """
+    with open(md_file_path, 'r', encoding='utf-8') as f:
+        lines = f.read().split('\n')
+
+    collector = _CaseCollector()
+    for line in lines:
+        collector.feed(line)
+    for warning in collector.scanner.warnings(os.path.basename(md_file_path)):
+        print("警告: {}".format(warning))
+
+    return collector.close()
+
+
+class CaseStreamParser:
+    """
+    流式解析测试用例：按任意大小的字节块 feed()，内部按行切分，最后 close() 取得用例列表。
+    结果与对拼接后的完整文件调用 parse_md_testcase_file_v2 相同，供 merge_modules.py
+    边合并模块产出边解析（融合导出 XMind），省去合并文件的整体写出、重读与再解析。
+    """
+
+    def __init__(self):
+        self._collector = _CaseCollector()
+        self._rest = b''
+
+    def feed(self, data: bytes):
+        lines = (self._rest + data).split(b'\n')
+        self._rest = lines.pop()
+        for raw in lines:
+            self._collector.feed(raw.decode('utf-8'))
+
+    def close(self) -> List[Dict]:
+        if self._rest:
+            self._collector.feed(self._rest.decode('utf-8'))
+            self._rest = b''
+        return self._collector.close()
+
+    def warnings(self, source: str) -> List[str]:
+        """围栏异常提示（行号为送入内容的行号，即合并文件的行号）"""
+        return self._collector.scanner.warnings(source)
+
+
+def default_xmind_names(md_file_path: str, root_title: Optional[str] = None) -> Tuple[str, str]:
+    """
+    由测试用例文件名推断 (根节点标题, 输出文件名)：文件名含产品名与版本号时取「产品名+版本号」，
+    否则根节点取 root_title（md 首行 # 标题），再否则取文件名（去掉 .md）。
+    """
+    filename = os.path.basename(md_file_path)
+    product_name, version = _extract_product_version_from_filename(filename)
+    if product_name and version:
+        return "{}{}".format(product_name, version), "{}{}测试用例.xmind".format(product_name, version)
+    stem = os.path.splitext(filename)[0]
+    return (product_name or root_title or stem), stem + ".xmind"
+
+
+def default_xmind_dir(md_file_path: str) -> str:
+    """
+    由测试用例文件路径推断默认输出目录：output/test_cases 下的文件输出到 output/xmind，
+    其他位置输出到 md 文件所在目录（merge_modules.py 融合导出时同样调用）。
+    """
+    md_dir = os.path.dirname(md_file_path)
+    if not md_dir:
+        return "."
+    normalized = md_dir.replace('\\', '/')
+    marker = '/output/test_cases'
+    if marker in normalized:
+        base = normalized.split(marker)[0].rstrip('/')
+        return os.path.join(base, 'output', 'xmind')
+    return md_dir
 
 
 def _extract_product_version_from_filename(filename: str) -> Tuple[Optional[str], Optional[str]]:
@@ -286,18 +354,6 @@ def _parse_field_value(line: str, prefix: str) -> str:
     return line[len(prefix):].strip()
 
 
-def _is_heading(line: str, level: int) -> bool:
-    """检查是否为指定级别的标题"""
-    prefix = '#' * level + ' '
-    next_prefix = '#' * (level + 1) + ' '
-    return line.startswith(prefix) and not line.startswith(next_prefix)
-
-
-def _get_heading_content(line: str, level: int) -> str:
-    """获取标题内容"""
-    return line[level + 1:].strip()
-
-
 def _print_statistics_v2(all_cases: List[Dict]):
     """打印统计信息"""
     print("\n" + "=" * 60)
@@ -343,19 +399,6 @@ def _print_statistics_v2(all_cases: List[Dict]):
             print("   P4 可选: {} 条 ({:.1f}%)".format(p4_count, p4_count/total*100))
 
 
-def _resolve_output_dir(md_file_path: str) -> str:
-    """解析默认输出目录：output/test_cases -> output/xmind"""
-    md_dir = os.path.dirname(md_file_path)
-    if not md_dir:
-        return "."
-    normalized = md_dir.replace('\\', '/')
-    marker = '/output/test_cases'
-    if marker in normalized:
-        base = normalized.split(marker)[0].rstrip('/')
-        return os.path.join(base, 'output', 'xmind')
-    return md_dir
-
-
 # ============================================================
 # XMind 生成：一次性生成所有用例，避免重复
 # ============================================================
@@ -460,10 +503,21 @@ def create_xmind_file_v2(test_cases, output_dir=None, custom_path=None, output_f
                 _set_topic_layout(expected_topic)
     
     # 6. 保存文件
-    xmind.save(workbook, output_file)
+    _save_workbook(xmind, workbook, output_file)
     print("XMind文件已生成: {}".format(output_file))
 
 
+def _save_workbook(xmind_module, workbook, output_file):
+    """先保存到同目录临时文件，再原子替换为 output_file 并写完成标记"""
+    tmp = temp_path(output_file)
+    try:
+        xmind_module.save(workbook, str(tmp))
+        commit_temp(tmp, output_file)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
 # ============================================================
 # 原有功能：保留兼容性
 # ============================================================
@@ -617,7 +671,7 @@ def create_xmind_file(test_cases, output_dir=None, custom_path=None,
     _set_logic_right_layout(sheet, root_topic)
     base_parent = _build_directory_structure(root_topic, custom_path, story_id)
     _generate_test_cases(base_parent, test_cases, xmind, MarkerId)
-    xmind.save(workbook, output_file)
+    _save_workbook(xmind, workbook, output_file)
     print("XMind文件已生成: {}".format(output_file))
 
 
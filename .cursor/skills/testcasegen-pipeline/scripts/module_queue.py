@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module_queue.py - 模块循环模式的工作队列：多个会话 / 多台机器并行处理同一步骤的不同模块。
+
+功能：
+- 以 _manifest.json 的模块顺序为队列：claim 领取第一个「该步骤未完成、前置步骤已完成、没有有效租约」的模块
+- 租约写在模块产出目录 output/modules/<迭代>/<NN>/.<step>.lease（owner、领取时间、到期时间），
+  到期未续租（会话崩溃、超出上下文后被关闭）的租约在下一次 claim 时自动回收
+- 队列操作在 output/modules/<迭代>/.queue.lock 锁内串行执行（O_CREAT | O_EXCL 创建锁文件，
+  本地磁盘与共享目录均可用；持锁进程异常退出留下的锁超过 30 秒后由等待方改名回收）
+- complete 校验产出已写出，补写完成标记（同 atomic_io.py mark）后释放租约；release 放弃租约；renew 续租
+- 「完成」的判定与 progress_snapshot.py 一致：产出存在、大小与完成标记一致、mtime 不早于模块的 content_updated_ns
+
+用法：
+  python module_queue.py claim    <项目目录> <迭代> --step <步骤> [--owner <名称>] [--lease 1800] [--module N]
+  python module_queue.py renew    <项目目录> <迭代> --step <步骤> --module N --lease-id <ID> [--lease 1800]
+  python module_queue.py complete <项目目录> <迭代> --step <步骤> --module N --lease-id <ID>
+  python module_queue.py release  <项目目录> <迭代> --step <步骤> --module N --lease-id <ID>
+  python module_queue.py status   <项目目录> <迭代> [--json]
+  （路径含中文时以 --config <config.json> 代替 <项目目录> <迭代>：{"project_dir": "...", "iteration": "..."}）
+
+步骤：prd_analysis（Step 3）/ test_outline（Step 4，前置 prd_analysis）/ test_cases（Step 5，前置 test_outline）
+
+输出均为一行 JSON。退出码：0 成功；1 错误（租约已失效、产出缺失等）；2 claim 时没有可领取的模块。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent / 'testcasegen-split-prd' / 'scripts'))
+from atomic_io import atomic_write, read_marker, write_marker  # noqa: E402
+from progress_snapshot import STEPS, manifest_summary  # noqa: E402
+
+PREREQ = {'prd_analysis': None, 'test_outline': 'prd_analysis', 'test_cases': 'test_outline'}
+DEFAULT_LEASE = 1800                     # 秒；一个模块的一个步骤通常在 30 分钟内完成
+LOCK_STALE = 30                          # 秒；队列操作本身只需毫秒，超过此时长的锁视为残留
+LOCK_TIMEOUT = 45                        # 秒；等待锁的上限，须长于 LOCK_STALE，等待方才能等到回收残留锁
+
+# 模块在某步骤上的状态
+DONE, LEASED, READY, WAITING = 'done', 'leased', 'ready', 'waiting'
+
+
+def setup_encoding() -> None:
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(encoding='utf-8')
+    if hasattr(sys.stderr, 'reconfigure'):
+        sys.stderr.reconfigure(encoding='utf-8')
+
+
+def load_config(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class QueueError(Exception):
+    pass
+
+
+def _reclaim_stale_lock(lock: Path) -> None:
+    """回收残留锁：先原子改名为唯一名称，再确认改名到手的确实是过期锁。
+
+    并发回收者中只有一个能改名成功；若改名前锁已被别人回收并重建（拿到的是新锁），原样放回。
+    """
+    grave = lock.with_name(f'{lock.name}.{uuid.uuid4().hex[:12]}.stale')
+    try:
+        os.rename(lock, grave)
+    except OSError:
+        return                                    # 已被释放或被其他进程回收
+    try:
+        if time.time() - os.stat(grave).st_mtime <= LOCK_STALE:
+            os.link(grave, lock)                  # 放回新锁；期间又有人建锁时 link 失败，以对方为准
+    except OSError:
+        pass
+    finally:
+        grave.unlink(missing_ok=True)
+
+
+@contextmanager
+def queue_lock(base: Path):
+    """base/.queue.lock 互斥锁：独占创建成功即持锁，退出时确认仍是自己的锁再删除。"""
+    base.mkdir(parents=True, exist_ok=True)
+    lock = base / '.queue.lock'
+    token = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:12]}'
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while True:
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(lock).st_mtime > LOCK_STALE:
+                    _reclaim_stale_lock(lock)         # 持锁进程已退出
+                    continue
+            except OSError:
+                continue                              # 锁恰好被释放，立即重试
+            if time.monotonic() > deadline:
+                raise QueueError(f'等待队列锁超时: {lock}（如无其他进程在操作队列，可删除该文件）')
+            time.sleep(0.05)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(token)
+        yield
+    finally:
+        try:
+            with open(lock, 'r', encoding='utf-8') as f:
+                mine = f.read() == token
+        except OSError:
+            mine = False
+        if mine:
+            lock.unlink(missing_ok=True)
+
+
+class ModuleQueue:
+    def __init__(self, project: Path, iteration: str):
+        self.project = project
+        self.iteration = iteration
+        self.prd_modules = project / 'output' / 'prd' / iteration / 'modules'
+        self.base = project / 'output' / 'modules' / iteration
+        manifest_file = self.prd_modules / '_manifest.json'
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            raise QueueError(f'清单不存在或无法解析: {manifest_file}（非模块循环模式无需队列）')
+        summary = manifest_summary(manifest)
+        self.modules = [
+            {'index': m['index'], 'filename': m.get('filename', ''), 'chapters': m.get('chapters', []),
+             'updated_ns': s['updated_ns']}
+            for m, s in zip(manifest.get('modules', []), summary['modules'])
+        ]
+        self.by_index = {m['index']: m for m in self.modules}
+
+    def rel(self, path: Path) -> str:
+        return path.relative_to(self.project).as_posix()
+
+    def module_dir(self, index: int) -> Path:
+        return self.base / f'{index:02d}'
+
+    def output(self, index: int, step: str) -> Path:
+        return self.module_dir(index) / f'{step}.md'
+
+    def lease_file(self, index: int, step: str) -> Path:
+        return self.module_dir(index) / f'.{step}.lease'
+
+    def module(self, index: int) -> dict:
+        if index not in self.by_index:
+            raise QueueError(f'清单中没有模块 {index}')
+        return self.by_index[index]
+
+    def is_done(self, index: int, step: str) -> bool:
+        """产出存在、与完成标记一致，且 mtime 不早于模块改写时间（content_updated_ns，纳秒精度）。"""
+        path = self.output(index, step)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        marker = read_marker(path)
+        if marker is not None and marker.get('bytes') != st.st_size:
+            return False
+        return st.st_mtime_ns >= self.module(index)['updated_ns']
+
+    def read_lease(self, index: int, step: str) -> dict | None:
+        try:
+            with open(self.lease_file(index, step), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_lease(self, index: int, step: str, lease: dict) -> None:
+        # 租约不是产出，不写完成标记；原子替换保证读方不会读到写了一半的 JSON
+        with atomic_write(self.lease_file(index, step), 'w', marker=False) as f:
+            json.dump(lease, f, ensure_ascii=False)
+
+    def state(self, index: int, step: str, now: float) -> tuple[str, dict | None]:
+        if self.is_done(index, step):
+            return DONE, None
+        lease = self.read_lease(index, step)
+        if lease and lease.get('expires', 0) > now:
+            return LEASED, lease
+        prereq = PREREQ[step]
+        if prereq and not self.is_done(index, prereq):
+            return WAITING, lease
+        return READY, lease
+
+    def own_lease(self, index: int, step: str, lease_id: str) -> dict:
+        lease = self.read_lease(index, step)
+        if lease is None or lease.get('lease_id') != lease_id:
+            raise QueueError(f'模块 {index} 的 {step} 租约已失效（超时后被回收或已释放），请重新 claim')
+        return lease
+
+    # ---- 命令 ----
+
+    def claim(self, step: str, owner: str, seconds: int, only: int | None = None) -> dict:
+        with queue_lock(self.base):
+            now = time.time()
+            reclaimed, leased, waiting, chosen = [], [], [], None
+            for m in self.modules if only is None else [self.module(only)]:
+                st, lease = self.state(m['index'], step, now)
+                if st == LEASED:
+                    leased.append({'module': m['index'], 'owner': lease.get('owner'), 'expires': fmt(lease['expires'])})
+                elif st == WAITING:
+                    waiting.append(m['index'])
+                elif st == READY and chosen is None:
+                    chosen = m
+                    if lease:              # 已过期的租约：由本次领取覆盖回收
+                        reclaimed.append({'module': m['index'], 'owner': lease.get('owner')})
+            if chosen is None:
+                reason = 'all_done' if not leased and not waiting else ('all_leased' if not waiting else 'waiting')
+                return {'module': None, 'step': step, 'reason': reason, 'leased': leased, 'waiting': waiting,
+                        'reclaimed': reclaimed}
+            index = chosen['index']
+            lease = {'lease_id': uuid.uuid4().hex[:12], 'owner': owner, 'step': step, 'module': index,
+                     'claimed': now, 'expires': now + seconds}
+            self.write_lease(index, step, lease)
+        prereq = PREREQ[step]
+        return {
+            'module':      index,
+            'step':        step,
+            'lease_id':    lease['lease_id'],
+            'owner':       owner,
+            'expires':     fmt(lease['expires']),
+            'chapters':    chosen['chapters'],
+            'module_file': self.rel(self.prd_modules / chosen['filename']),
+            'output':      self.rel(self.output(index, step)),
+            'inputs':      [self.rel(self.output(index, prereq))] if prereq else [],
+            'reclaimed':   reclaimed,
+        }
+
+    def renew(self, step: str, index: int, lease_id: str, seconds: int) -> dict:
+        with queue_lock(self.base):
+            lease = self.own_lease(index, step, lease_id)
+            lease['expires'] = time.time() + seconds
+            self.write_lease(index, step, lease)
+        return {'module': index, 'step': step, 'lease_id': lease_id, 'expires': fmt(lease['expires'])}
+
+    def complete(self, step: str, index: int, lease_id: str) -> dict:
+        with queue_lock(self.base):
+            self.own_lease(index, step, lease_id)
+            path = self.output(index, step)
+            if not path.is_file() or path.stat().st_size == 0:
+                raise QueueError(f'产出不存在或为空: {self.rel(path)}，写出后再 complete（或 release 放弃）')
+            marker = read_marker(path)
+            if marker is None or marker.get('bytes') != path.stat().st_size:
+                write_marker(path)
+            self.lease_file(index, step).unlink(missing_ok=True)
+        remaining = sum(1 for m in self.modules if not self.is_done(m['index'], step))
+        return {'module': index, 'step': step, 'output': self.rel(path), 'remaining': remaining}
+
+    def release(self, step: str, index: int, lease_id: str) -> dict:
+        with queue_lock(self.base):
+            self.own_lease(index, step, lease_id)
+            self.lease_file(index, step).unlink(missing_ok=True)
+        return {'module': index, 'step': step, 'released': True}
+
+    def status(self) -> dict:
+        now = time.time()
+        rows = []
+        for m in self.modules:
+            row = {'module': m['index']}
+            for step in STEPS:
+                st, lease = self.state(m['index'], step, now)
+                row[step] = {'state': st}
+                if st == LEASED:
+                    row[step].update(owner=lease.get('owner'), expires=fmt(lease['expires']),
+                                     remaining_s=int(lease['expires'] - now))
+                elif lease:
+                    row[step]['expired_lease'] = lease.get('owner')
+            rows.append(row)
+        counts = {step: {s: sum(1 for r in rows if r[step]['state'] == s) for s in (DONE, LEASED, READY, WAITING)}
+                  for step in STEPS}
+        return {'iteration': self.iteration, 'total': len(rows), 'counts': counts, 'modules': rows}
+
+
+def fmt(ts: float) -> str:
+    return datetime.fromtimestamp(ts).isoformat(timespec='seconds')
+
+
+STATE_TEXT = {DONE: '完成', LEASED: '处理中', READY: '可领取', WAITING: '待前置'}
+
+
+def print_status(result: dict) -> None:
+    print(f'{"模块":<6}' + ''.join(f'{step:<28}' for step in STEPS))
+    for row in result['modules']:
+        cells = []
+        for step in STEPS:
+            cell = row[step]
+            text = STATE_TEXT[cell['state']]
+            if cell['state'] == LEASED:
+                text += f'（{cell["owner"]}，剩 {cell["remaining_s"] // 60} 分）'
+            elif cell.get('expired_lease'):
+                text += '（租约已过期）'
+            cells.append(f'{text:<28}')
+        print(f'{row["module"]:<6}' + ''.join(cells))
+    for step in STEPS:
+        c = result['counts'][step]
+        print(f'[{step}] 完成 {c[DONE]} / 处理中 {c[LEASED]} / 可领取 {c[READY]} / 待前置 {c[WAITING]}，共 {result["total"]}')
+
+
+def main() -> int:
+    setup_encoding()
+
+    ap = argparse.ArgumentParser(description='模块循环模式的工作队列（claim / renew / complete / release / status）')
+    sub = ap.add_subparsers(dest='command', required=True)
+    parsers = {name: sub.add_parser(name) for name in ('claim', 'renew', 'complete', 'release', 'status')}
+    for name, p in parsers.items():
+        p.add_argument('project_dir', nargs='?', help='项目目录')
+        p.add_argument('iteration', nargs='?', help='迭代标识')
+        p.add_argument('--config', help='JSON 配置文件路径（路径含中文时使用）')
+        if name == 'status':
+            p.add_argument('--json', action='store_true', help='以 JSON 输出')
+            continue
+        p.add_argument('--step', required=True, choices=STEPS)
+        p.add_argument('--module', type=int, required=name != 'claim', help='模块编号（claim 时可指定只领取该模块）')
+        if name == 'claim':
+            p.add_argument('--owner', default=f'{socket.gethostname()}:{os.getpid()}', help='领取者名称（建议每个会话唯一）')
+        else:
+            p.add_argument('--lease-id', required=True, help='claim 返回的 lease_id')
+        if name in ('claim', 'renew'):
+            p.add_argument('--lease', type=int, default=DEFAULT_LEASE, help=f'租约秒数（默认 {DEFAULT_LEASE}）')
+    args = ap.parse_args()
+
+    cfg = load_config(args.config) if args.config else {}
+    project_dir = cfg.get('project_dir') or args.project_dir
+    iteration = cfg.get('iteration') or args.iteration
+    if not project_dir or not iteration:
+        print('错误: 需要项目目录与迭代标识（位置参数或 --config）', file=sys.stderr)
+        return 1
+
+    try:
+        queue = ModuleQueue(Path(project_dir).resolve(), iteration)
+        if args.command == 'claim':
+            result = queue.claim(args.step, args.owner, args.lease, args.module)
+        elif args.command == 'renew':
+            result = queue.renew(args.step, args.module, args.lease_id, args.lease)
+        elif args.command == 'complete':
+            result = queue.complete(args.step, args.module, args.lease_id)
+        elif args.command == 'release':
+            result = queue.release(args.step, args.module, args.lease_id)
+        else:
+            result = queue.status()
+            if not args.json:
+                print_status(result)
+                return 0
+    except QueueError as e:
+        print(json.dumps({'error': str(e)}, ensure_ascii=False))
+        return 1
+    print(json.dumps(result, ensure_ascii=False))
+    return 2 if args.command == 'claim' and result['module'] is None else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
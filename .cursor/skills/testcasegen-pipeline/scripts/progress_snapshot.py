@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+progress_snapshot.py - 一次扫描得到迭代的进度快照与下一步（testcasegen.md「进度判断」的 scan_iter_outputs）。
+
+功能：
+- 用 os.scandir 扫描 output/ 下与当前迭代相关的目录，计算：
+  模式（module_loop / normal）、合并产出是否存在、各步骤模块产出覆盖度（none / partial / all）、
+  各步骤第一个未完成的模块、普通模式的 prd_md_exists，并按 testcasegen.md 的伪代码给出下一步
+- 产出带完成标记（atomic_io.py）时要求大小与标记一致，不一致视为不存在并列入 invalid
+- 读取 _manifest.json 的 dirty_modules 与各模块 content_updated_ns：模块产出早于该时间戳
+  （增量重拆后未重新生成）视为过期，按未完成处理并列入 stale
+- 目录缓存：记录每个目录的 mtime 与扫描结果（含标记校验结果）、清单的摘要，目录 mtime 未变时
+  不再 scandir；文件增删与原子替换都会改变目录 mtime。重复调用只需对少量目录做 stat
+- 输出紧凑 JSON（一行），供 Agent 一次读取
+
+用法：
+  python progress_snapshot.py <项目目录> <迭代> [--no-cache] [--pretty]
+  python progress_snapshot.py --config <config.json> [--no-cache] [--pretty]
+
+配置文件格式：
+{
+  "project_dir": "<项目目录的绝对路径（含 input/ output/）>",
+  "iteration":   "<迭代标识>"
+}
+
+缓存文件：output/.progress_cache_<迭代>.json（隐藏文件，可随时删除）。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent / 'testcasegen-split-prd' / 'scripts'))
+from atomic_io import MARKER_SUFFIX  # noqa: E402
+
+STEPS = ('prd_analysis', 'test_outline', 'test_cases')
+STEP_NO = {'prd_analysis': '3', 'test_outline': '4', 'test_cases': '5'}
+
+CACHE_VERSION = 2
+# 目录 mtime 距扫描时刻不足该值时不信任缓存（同一时钟刻度内的后续修改可能不改变 mtime）
+RACY_NS = 2_000_000_000
+
+
+def setup_encoding() -> None:
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(encoding='utf-8')
+    if hasattr(sys.stderr, 'reconfigure'):
+        sys.stderr.reconfigure(encoding='utf-8')
+
+
+def load_config(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class DirScanner:
+    """带缓存的目录扫描：目录 mtime 未变时直接返回上次的结果。"""
+
+    def __init__(self, root: Path, cache_file: Path | None):
+        self.root = root
+        self.cache_file = cache_file
+        self.cache: dict = {}
+        if cache_file is not None:
+            try:
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    self.cache = json.load(f)
+            except (OSError, ValueError):
+                pass
+        if self.cache.get('version') != CACHE_VERSION:
+            self.cache = {'version': CACHE_VERSION, 'dirs': {}, 'files': {}}
+        self.dirty = False
+        self.hits = self.misses = 0
+
+    def listing(self, directory: Path) -> dict[str, dict] | None:
+        """
+        目录内容：{名称: {'dir': True} 或 {'size', 'mtime_ns', 'valid'}}，隐藏文件不列出；
+        valid 为 False 表示有完成标记但大小与标记不符。目录不存在时返回 None。
+        """
+        key = directory.relative_to(self.root).as_posix()
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            if self.cache['dirs'].pop(key, None) is not None:
+                self.dirty = True
+            return None
+        cached = self.cache['dirs'].get(key)
+        if cached and cached['mtime_ns'] == mtime_ns and cached['scanned_ns'] - mtime_ns > RACY_NS:
+            self.hits += 1
+            return cached['entries']
+
+        self.misses += 1
+        entries: dict[str, dict] = {}
+        markers: set[str] = set()
+        with os.scandir(directory) as it:
+            for entry in it:
+                name = entry.name
+                if name.startswith('.'):
+                    if name.endswith(MARKER_SUFFIX):
+                        markers.add(name[1:-len(MARKER_SUFFIX)])
+                    continue
+                if entry.is_dir():
+                    entries[name] = {'dir': True}
+                else:
+                    st = entry.stat()
+                    entries[name] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'valid': True}
+        for name in markers & entries.keys():
+            info = entries[name]
+            if info.get('dir'):
+                continue
+            try:
+                with open(directory / f'.{name}{MARKER_SUFFIX}', 'r', encoding='utf-8') as f:
+                    info['valid'] = json.load(f).get('bytes') == info['size']
+            except (OSError, ValueError):
+                pass
+        self.cache['dirs'][key] = {'mtime_ns': mtime_ns, 'scanned_ns': time.time_ns(), 'entries': entries}
+        self.dirty = True
+        return entries
+
+    def json_file(self, path: Path, extract) -> dict | None:
+        """按 (mtime, 大小) 缓存 JSON 文件经 extract 提取后的摘要，避免重复解析大清单。"""
+        key = path.relative_to(self.root).as_posix()
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        cached = self.cache['files'].get(key)
+        if cached and cached['mtime_ns'] == st.st_mtime_ns and cached['size'] == st.st_size:
+            return cached['data']
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = extract(json.load(f))
+        except (OSError, ValueError):
+            return None
+        self.cache['files'][key] = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'data': data}
+        self.dirty = True
+        return data
+
+    def save(self) -> None:
+        if self.cache_file is None or not self.dirty:
+            return
+        tmp = self.cache_file.with_name(self.cache_file.name + f'.{os.getpid()}')
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.cache, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp, self.cache_file)
+        except OSError:
+            tmp.unlink(missing_ok=True)     # 缓存写不了不影响结果
+
+
+def manifest_summary(manifest: dict) -> dict:
+    """清单中进度判断需要的部分：模块顺序、改写时间（纳秒时间戳）、dirty / removed。
+
+    优先取 content_updated_ns；旧版清单只有精确到分钟的 content_updated 时取该分钟的末尾，
+    同一分钟内生成的产出宁可按过期重做，也不把重拆前的旧产出误判为完成。
+    """
+    modules = []
+    for m in manifest.get('modules', []):
+        updated_ns = m.get('content_updated_ns')
+        if not isinstance(updated_ns, int):
+            updated = m.get('content_updated') or manifest.get('resplit_time') or manifest.get('split_time')
+            try:
+                updated_ns = (int(datetime.strptime(updated, '%Y-%m-%d %H:%M').timestamp()) + 60) * 1_000_000_000 - 1
+            except (TypeError, ValueError):
+                updated_ns = 0
+        modules.append({'index': m['index'], 'updated_ns': updated_ns})
+    return {
+        'modules':         modules,
+        'dirty_modules':   manifest.get('dirty_modules', []),
+        'removed_modules': manifest.get('removed_modules', []),
+    }
+
+
+def coverage(done: int, total: int) -> str:
+    if done == 0:
+        return 'none'
+    return 'all' if done >= total else 'partial'
+
+
+def snapshot(project_dir: Path, iteration: str, use_cache: bool = True) -> dict:
+    started = time.perf_counter()
+    output = project_dir / 'output'
+    scanner = DirScanner(project_dir, output / f'.progress_cache_{iteration}.json'
+                         if use_cache and output.is_dir() else None)
+    invalid: list[str] = []
+
+    def present(directory: Path, entries: dict | None, name: str) -> dict | None:
+        info = entries.get(name) if entries else None
+        if not info or info.get('dir'):
+            return None
+        if not info['valid']:
+            invalid.append((directory / name).relative_to(project_dir).as_posix())
+            return None
+        return info
+
+    prd_dir = output / 'prd' / iteration
+    prd_entries = scanner.listing(prd_dir) or {}
+    prd_md_exists = any(n.endswith('.md') and not v.get('dir') and v['valid'] for n, v in prd_entries.items())
+
+    manifest = None
+    modules_dir_entries = scanner.listing(prd_dir / 'modules') if 'modules' in prd_entries else None
+    if present(prd_dir / 'modules', modules_dir_entries, '_manifest.json'):
+        manifest = scanner.json_file(prd_dir / 'modules' / '_manifest.json', manifest_summary)
+    mode = 'module_loop' if manifest is not None else 'normal'
+
+    # 合并 / 总产出：output/<step>/<迭代>_*.md，XMind：output/xmind/<迭代>_*.xmind
+    merged: dict[str, bool] = {}
+    for step in STEPS:
+        entries = scanner.listing(output / step)
+        merged[step] = any(n.startswith(f'{iteration}_') and n.endswith('.md')
+                           and present(output / step, entries, n) for n in (entries or {}))
+    xm_entries = scanner.listing(output / 'xmind')
+    xmind = any(n.startswith(f'{iteration}_') and n.endswith('.xmind')
+                and present(output / 'xmind', xm_entries, n) for n in (xm_entries or {}))
+
+    result: dict = {
+        'project':       str(project_dir),
+        'iteration':     iteration,
+        'mode':          mode,
+        'prd_md_exists': prd_md_exists,
+        'merged':        merged,
+        'xmind':         xmind,
+    }
+
+    if manifest is not None:
+        base = output / 'modules' / iteration
+        base_entries = scanner.listing(base) or {}
+        done = {step: 0 for step in STEPS}
+        next_module: dict[str, int | None] = {step: None for step in STEPS}
+        stale: list[int] = []
+        for m in manifest['modules']:
+            name = f'{m["index"]:02d}'
+            entries = scanner.listing(base / name) if base_entries.get(name, {}).get('dir') else None
+            is_stale = False
+            for step in STEPS:
+                info = present(base / name, entries, f'{step}.md')
+                if info and info['mtime_ns'] < m['updated_ns']:
+                    # 缓存的 mtime 可能早于原位重写，过期判定以当前 stat 为准
+                    try:
+                        fresh = os.stat(base / name / f'{step}.md').st_mtime_ns >= m['updated_ns']
+                    except OSError:
+                        fresh = False
+                    if not fresh:
+                        info, is_stale = None, True
+                if info:
+                    done[step] += 1
+                elif next_module[step] is None:
+                    next_module[step] = m['index']
+            if is_stale:
+                stale.append(m['index'])
+        total = len(manifest['modules'])
+        result['modules'] = {
+            'total':           total,
+            **{step: coverage(done[step], total) for step in STEPS},
+            'done':            done,
+            'next_module':     next_module,
+            'stale':           stale,
+            'dirty_modules':   manifest['dirty_modules'],
+            'removed_modules': manifest['removed_modules'],
+        }
+    result['invalid'] = invalid
+    result['next'] = next_step(result)
+
+    scanner.save()
+    result['cache'] = None if scanner.cache_file is None else {'hit': scanner.hits, 'miss': scanner.misses}
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+def next_step(snap: dict) -> dict:
+    """testcasegen.md「进度判断」伪代码，自上而下首条命中即返回。"""
+    merged = snap['merged']
+    if snap['mode'] == 'module_loop':
+        mods = snap['modules']
+        if merged['test_cases'] or mods['test_cases'] == 'all':
+            return {'step': '6'}
+        # 已有下一步骤的部分产出时接力该步骤；否则进入「上一步骤已全部完成」的下一步骤
+        for step, prev in (('test_cases', 'test_outline'), ('test_outline', 'prd_analysis')):
+            if mods[step] == 'partial' or mods[prev] == 'all':
+                return {'step': STEP_NO[step], 'module': mods['next_module'][step]}
+        return {'step': '3', 'module': mods['next_module']['prd_analysis']}
+    if merged['test_cases']:
+        return {'step': 'ask', 'options': ['5', '6']}
+    if merged['test_outline']:
+        return {'step': '5'}
+    if merged['prd_analysis']:
+        return {'step': '4'}
+    if snap['prd_md_exists']:
+        return {'step': '3'}
+    return {'step': '1'}
+
+
+def main() -> int:
+    setup_encoding()
+
+    ap = argparse.ArgumentParser(description='计算迭代进度快照与下一步（JSON）')
+    ap.add_argument('project_dir', nargs='?', help='项目目录')
+    ap.add_argument('iteration', nargs='?', help='迭代标识')
+    ap.add_argument('--config', help='JSON 配置文件路径（路径含中文时使用）')
+    ap.add_argument('--no-cache', action='store_true', help='不读写目录缓存')
+    ap.add_argument('--pretty', action='store_true', help='缩进输出')
+    args = ap.parse_args()
+
+    if args.config:
+        cfg = load_config(args.config)
+        project_dir, iteration = cfg.get('project_dir'), cfg.get('iteration')
+    else:
+        project_dir, iteration = args.project_dir, args.iteration
+    if not project_dir or not iteration:
+        print('错误: 需要项目目录与迭代标识（位置参数或 --config）', file=sys.stderr)
+        return 1
+    project = Path(project_dir).resolve()
+    if not project.is_dir():
+        print(f'错误: 项目目录不存在: {project}', file=sys.stderr)
+        return 1
+
+    snap = snapshot(project, iteration, use_cache=not args.no_cache)
+    print(json.dumps(snap, ensure_ascii=False, indent=2 if args.pretty else None,
+                     separators=None if args.pretty else (',', ':')))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
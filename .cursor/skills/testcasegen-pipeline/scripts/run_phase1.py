@@ -0,0 +1,552 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+run_phase1.py - 以依赖图执行 Phase 1（Step 1 初始化 / 2 文档转换 / 2.5 知识库索引 / 2.7 文档拆分）。
+
+功能：
+- 把 Phase 1 建模为依赖图：init → convert:<文件>（每个 docx/xlsx 一个节点）→ split:<迭代>，
+  index（知识库索引）只依赖 init，与文档转换互不依赖
+- 每个节点记录输入 / 产出文件的签名（大小、mtime、MD5）与参数 hash，类似 make：大小和 mtime
+  未变时直接复用上次的 MD5（不读内容），变了才重算 MD5 比对；输入内容、参数都未变且产出完好的节点跳过
+- 就绪的节点并发执行（线程池 + 子进程调用各技能脚本），如知识库索引与文档转换同时进行；
+  失败节点的下游节点标记为阻塞，其余分支照常执行
+- 文档转换沿用 Step 2 约定：对应 md 已存在且不早于源文件时直接采纳，不重复转换
+- 转换后的 md 被手工修改而源文件与参数未变时保留修改（重新签名后判为最新），只有源文件 / 参数变化或 --force 才重新转换
+- 文档拆分沿用 Step 2.7 约定：迭代 md 合计不超过 hard_max（默认 800）行且尚无清单时跳过；
+  拆分方案（split_prd.py 的输出）在执行后原样打印，供 Agent 展示给用户确认
+- 结束时打印各节点的状态与耗时表；无变化的重复执行只做 stat，远低于 1 秒
+
+用法：
+  python run_phase1.py <项目目录> <迭代> [--jobs 4] [--force <节点>] [--dry-run] [--json]
+  python run_phase1.py --config <config.json> [--jobs 4] [--force <节点>] [--dry-run] [--json]
+
+配置文件格式：
+{
+  "project_dir": "<项目目录的绝对路径>",
+  "iteration":   "<迭代标识>",
+  "jobs":        4,                      // 可选，并发数
+  "doc_type":    "prd",                  // 可选，docx2md 的 doc_type
+  "excel":       {"compact": true},      // 可选，传给 excel_to_markdown.py 的额外配置
+  "split":       {"target_lines": 600}   // 可选，传给 split_prd.py 的额外配置（md_file / output_dir 由本脚本填写）
+}
+
+退出码：0 成功；1 有节点失败；2 迭代需求目录 input/prd/<迭代>/ 为空（Step 1.5 需暂停引导用户放入文档）。
+状态文件：output/.phase1_state.json（隐藏文件，删除后所有节点按首次执行处理）。
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+SKILLS_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(SKILLS_DIR / 'testcasegen-split-prd' / 'scripts'))
+from atomic_io import atomic_write  # noqa: E402
+
+DOCX2MD     = SKILLS_DIR / 'testcasegen-docx2md' / 'scripts' / 'docx2md.py'
+EXCEL2MD    = SKILLS_DIR / 'testcasegen-excel2md' / 'scripts' / 'excel_to_markdown.py'
+INDEXER     = SKILLS_DIR / 'testcasegen-knowledge-index' / 'scripts' / 'build_knowledge_index.py'
+SPLIT_PRD   = SKILLS_DIR / 'testcasegen-split-prd' / 'scripts' / 'split_prd.py'
+INIT_SCRIPT = SKILLS_DIR / 'testcasegen-init' / 'scripts' / 'init_testgen.py'
+
+DOCX_EXTS  = ('.docx', '.doc')
+EXCEL_EXTS = ('.xlsx', '.xls')
+SPLIT_HARD_MAX = 800                      # testcasegen.md § 配置常量 SPLIT_HARD_MAX
+STATE_FILE = '.phase1_state.json'
+STATE_VERSION = 1
+
+# 节点状态
+UP_TO_DATE, RAN, ADOPTED, SKIPPED, FAILED, BLOCKED, PENDING = \
+    'up_to_date', 'ran', 'adopted', 'skipped', 'failed', 'blocked', 'pending'
+STATUS_TEXT = {
+    UP_TO_DATE: '最新',
+    RAN:        '已执行',
+    ADOPTED:    '采纳',
+    SKIPPED:    '跳过',
+    FAILED:     '失败',
+    BLOCKED:    '阻塞',
+    PENDING:    '待执行',
+}
+
+
+def setup_encoding() -> None:
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(encoding='utf-8')
+    if hasattr(sys.stderr, 'reconfigure'):
+        sys.stderr.reconfigure(encoding='utf-8')
+
+
+def load_config(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def params_hash(params: dict) -> str:
+    return hashlib.md5(json.dumps(params, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def file_sig(path: Path, prev: dict | None = None) -> dict | None:
+    """
+    文件签名 {size, mtime_ns, md5, lines}；大小与 mtime 都与 prev 相同时直接沿用 prev（不读内容）。
+    文件不存在时返回 None。
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if prev and prev.get('size') == st.st_size and prev.get('mtime_ns') == st.st_mtime_ns:
+        return prev
+    h = hashlib.md5()
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+            lines += chunk.count(b'\n')
+            last = chunk[-1:]
+    if last != b'\n':
+        lines += 1
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'md5': h.hexdigest(), 'lines': lines}
+
+
+def run_script(script: Path, cfg: dict) -> tuple[bool, str]:
+    """以 --config 方式调用技能脚本（配置写入临时目录，兼容中文路径），返回 (成功, 合并后的输出)。"""
+    with tempfile.TemporaryDirectory(prefix='testcasegen_') as tmp:
+        cfg_path = Path(tmp) / 'config.json'
+        with open(cfg_path, 'w', encoding='utf-8') as f:
+            json.dump(cfg, f, ensure_ascii=False, indent=2)
+        proc = subprocess.run(
+            [sys.executable, '-X', 'utf8', str(script), '--config', str(cfg_path)],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, encoding='utf-8', errors='replace',
+        )
+    return proc.returncode == 0, proc.stdout
+
+
+class Node:
+    """依赖图节点：inputs() / outputs() / params() 描述签名，execute() 执行实际工作。"""
+
+    adoptable = False                      # 没有记录但产出已存在且不早于输入时，直接采纳
+    keep_edits = False                     # 产出被改动而输入、参数未变时保留改动并重新签名，不重新执行
+
+    def __init__(self, name: str, project: Path, deps: list[str]):
+        self.name = name
+        self.project = project
+        self.deps = deps
+
+    def inputs(self) -> list[Path]:
+        return []
+
+    def outputs(self) -> list[Path]:
+        return []
+
+    def params(self) -> dict:
+        return {}
+
+    def skip_reason(self, inputs: list[Path], sigs: dict[str, dict]) -> str | None:
+        """返回非空说明时不执行（记录签名，输入不变则下次直接判为最新）。"""
+        return None
+
+    def execute(self) -> tuple[bool, str, str]:
+        """返回 (成功, 说明, 需要原样打印的输出)。"""
+        raise NotImplementedError
+
+    def key(self, path: Path) -> str:
+        try:
+            return path.relative_to(self.project).as_posix()
+        except ValueError:
+            return str(path)
+
+    def process(self, rec: dict | None, force: bool, dry_run: bool) -> dict:
+        """检查是否最新，需要时执行；返回 {'status', 'detail', 'record', 'log'}。"""
+        inputs = self.inputs()
+        if not inputs:
+            return {'status': SKIPPED, 'detail': self.empty_detail, 'record': None}
+        prev_in = (rec or {}).get('inputs', {})
+        sigs = {self.key(p): file_sig(p, prev_in.get(self.key(p))) for p in inputs}
+        sigs = {k: v for k, v in sigs.items() if v is not None}
+        phash = params_hash(self.params())
+
+        reason = None if not force else '强制执行'
+        if reason is None and rec is None:
+            reason = '首次执行'
+            if self.adoptable and self.adopt(inputs):
+                record = {'params': phash, 'inputs': sigs, 'detail': '已有产出',
+                          'outputs': {self.key(p): file_sig(p) for p in self.outputs()}}
+                return {'status': ADOPTED, 'detail': '已有产出，不重复执行', 'record': record}
+        if reason is None:
+            reason = self.stale_reason(rec, phash, sigs)
+        if reason is None:
+            record = dict(rec, inputs=sigs)
+            record['outputs'] = {k: file_sig(self.project / k, v) for k, v in rec['outputs'].items()}
+            edited = [Path(k).name for k, v in record['outputs'].items() if v['md5'] != rec['outputs'][k].get('md5')]
+            detail = rec.get('detail', '')
+            if edited:
+                detail = f'{detail}；保留对 {", ".join(edited)} 的修改' if detail else f'保留对 {", ".join(edited)} 的修改'
+            return {'status': UP_TO_DATE, 'detail': detail, 'record': record}
+
+        skip = self.skip_reason(inputs, sigs)
+        if skip:
+            return {'status': SKIPPED, 'detail': skip,
+                    'record': {'params': phash, 'inputs': sigs, 'outputs': {}, 'detail': skip}}
+        if dry_run:
+            return {'status': PENDING, 'detail': reason, 'record': None}
+
+        ok, detail, log = self.execute()
+        if ok:
+            missing = [self.key(p) for p in self.outputs() if not p.exists()]
+            if missing:
+                ok, detail = False, f'未生成 {", ".join(missing)}'
+        if not ok:
+            return {'status': FAILED, 'detail': detail, 'record': None, 'log': log}
+        record = {'params': phash, 'inputs': sigs, 'detail': detail,
+                  'outputs': {self.key(p): file_sig(p) for p in self.outputs()}}
+        return {'status': RAN, 'detail': f'{reason}；{detail}' if detail else reason, 'record': record, 'log': log}
+
+    empty_detail = '无输入'
+
+    def stale_reason(self, rec: dict, phash: str, sigs: dict[str, dict]) -> str | None:
+        if rec.get('params') != phash:
+            return '参数变化'
+        old = rec.get('inputs', {})
+        if sigs.keys() != old.keys():
+            added, removed = sigs.keys() - old.keys(), old.keys() - sigs.keys()
+            return '输入' + '；'.join(filter(None, [
+                f'新增 {", ".join(sorted(Path(k).name for k in added))}' if added else '',
+                f'移除 {", ".join(sorted(Path(k).name for k in removed))}' if removed else '']))
+        for k, sig in sigs.items():
+            if sig['md5'] != old[k].get('md5'):
+                return f'{Path(k).name} 内容变化'
+        for k, sig in rec.get('outputs', {}).items():
+            cur = file_sig(self.project / k, sig)
+            if cur is None:
+                return f'产出 {Path(k).name} 缺失'
+            if cur['md5'] != sig.get('md5') and not self.keep_edits:
+                return f'产出 {Path(k).name} 被改动'
+        return None
+
+    def adopt(self, inputs: list[Path]) -> bool:
+        try:
+            newest_in = max(os.stat(p).st_mtime_ns for p in inputs)
+            return all(os.stat(p).st_mtime_ns >= newest_in for p in self.outputs())
+        except OSError:
+            return False
+
+
+class InitNode(Node):
+    """Step 1：项目目录结构与迭代子目录。只检查目录是否存在，不记录签名。"""
+
+    def __init__(self, project: Path, iteration: str):
+        super().__init__('init', project, [])
+        self.iteration = iteration
+
+    def layout(self) -> list[Path]:
+        p = self.project
+        return [p / 'input' / 'prd' / self.iteration, p / 'output' / 'prd' / self.iteration,
+                *(p / 'input' / 'knowledge' / d for d in ('baseline_cases', 'business', 'codedesign', 'prd')),
+                *(p / 'output' / d for d in ('prd_analysis', 'test_outline', 'test_cases', 'xmind'))]
+
+    def process(self, rec: dict | None, force: bool, dry_run: bool) -> dict:
+        missing = [d for d in self.layout() if not d.is_dir()]
+        if not missing and not force:
+            return {'status': UP_TO_DATE, 'detail': '', 'record': None}
+        if dry_run:
+            return {'status': PENDING, 'detail': f'缺少 {len(missing)} 个目录', 'record': None}
+        sys.path.append(str(INIT_SCRIPT.parent))
+        from init_testgen import ensure_layout
+        ensure_layout(self.project)
+        for d in missing:
+            d.mkdir(parents=True, exist_ok=True)
+        return {'status': RAN, 'detail': f'创建 {len(missing)} 个目录', 'record': None}
+
+
+class ConvertNode(Node):
+    """Step 2：单个 docx / xlsx → md（输出到 output 下与 input 同名的子目录）。"""
+
+    adoptable = True
+    keep_edits = True                      # 转换后的 md 允许手工校正；只有源文件、参数变化或 --force 才重新转换
+
+    def __init__(self, name: str, project: Path, src: Path, out_dir: Path, cfg: dict):
+        super().__init__(name, project, ['init'])
+        self.src = src
+        self.out = out_dir / f'{src.stem}.md'
+        self.is_excel = src.suffix.lower() in EXCEL_EXTS
+        self.script = EXCEL2MD if self.is_excel else DOCX2MD
+        self.cfg = cfg
+
+    def inputs(self) -> list[Path]:
+        return [self.src, self.script]
+
+    def outputs(self) -> list[Path]:
+        return [self.out]
+
+    def params(self) -> dict:
+        if self.is_excel:
+            return {'out': self.key(self.out), 'excel': self.cfg.get('excel', {})}
+        return {'out': self.key(self.out), 'doc_type': self.cfg.get('doc_type', 'prd')}
+
+    def adopt(self, inputs: list[Path]) -> bool:
+        return super().adopt([self.src])   # 采纳只比较源文件，不因转换脚本更新而判为过期
+
+    def execute(self) -> tuple[bool, str, str]:
+        if self.is_excel:
+            cfg = {**self.cfg.get('excel', {}), 'excel': str(self.src), 'out': str(self.out), 'single_file': True}
+        else:
+            cfg = {'docx': str(self.src), 'out': str(self.out), 'doc_type': self.cfg.get('doc_type', 'prd'),
+                   'images': str(self.out.parent / f'{self.src.stem}_images')}
+        self.out.parent.mkdir(parents=True, exist_ok=True)
+        ok, log = run_script(self.script, cfg)
+        return ok, (f'→ {self.key(self.out)}' if ok else last_lines(log)), log
+
+
+class IndexNode(Node):
+    """Step 2.5：input/knowledge/ 下全部 md → knowledge_index.md。"""
+
+    empty_detail = '知识库无 md 文件'
+
+    def __init__(self, project: Path):
+        super().__init__('index', project, ['init'])
+        self.kb = project / 'input' / 'knowledge'
+        self.out = self.kb / 'knowledge_index.md'
+
+    def inputs(self) -> list[Path]:
+        found: list[Path] = []
+        for root, dirs, files in os.walk(self.kb):
+            dirs.sort()
+            found.extend(Path(root) / f for f in sorted(files)
+                         if f.endswith('.md') and f != 'knowledge_index.md' and not f.startswith('.'))
+        return found + [INDEXER] if found else []
+
+    def outputs(self) -> list[Path]:
+        return [self.out]
+
+    def execute(self) -> tuple[bool, str, str]:
+        ok, log = run_script(INDEXER, {'knowledge_dir': str(self.kb)})
+        return ok, (f'→ {self.key(self.out)}' if ok else last_lines(log)), log
+
+
+class SplitNode(Node):
+    """Step 2.7：output/prd/<迭代>/ 下的 md 超过 hard_max 行时联合拆分（split_prd.py 自身增量）。"""
+
+    empty_detail = '迭代目录无 md 文件'
+
+    def __init__(self, project: Path, iteration: str, deps: list[str], cfg: dict):
+        super().__init__(f'split:{iteration}', project, ['init', *deps])
+        self.prd_dir = project / 'output' / 'prd' / iteration
+        self.manifest = self.prd_dir / 'modules' / '_manifest.json'
+        self.cfg = cfg.get('split', {})
+
+    def inputs(self) -> list[Path]:
+        try:
+            found = sorted(Path(e.path) for e in os.scandir(self.prd_dir) if e.is_file() and e.name.endswith('.md'))
+        except OSError:
+            return []
+        return found + [SPLIT_PRD] if found else []
+
+    def outputs(self) -> list[Path]:
+        return [self.manifest]
+
+    def params(self) -> dict:
+        return self.cfg
+
+    def skip_reason(self, inputs: list[Path], sigs: dict[str, dict]) -> str | None:
+        if self.manifest.exists():
+            return None
+        hard_max = self.cfg.get('hard_max', SPLIT_HARD_MAX)
+        total = sum(sigs[self.key(p)]['lines'] for p in inputs if p != SPLIT_PRD)
+        return f'共 {total} 行，未超过 {hard_max} 行，无需拆分' if total <= hard_max else None
+
+    def execute(self) -> tuple[bool, str, str]:
+        cfg = {**self.cfg, 'md_file': str(self.prd_dir), 'output_dir': str(self.manifest.parent)}
+        ok, log = run_script(SPLIT_PRD, cfg)
+        if not ok:
+            return False, last_lines(log), log
+        try:
+            with open(self.manifest, 'r', encoding='utf-8') as f:
+                n = len(json.load(f).get('modules', []))
+        except (OSError, ValueError):
+            n = 0
+        return True, f'{n} 个模块', log
+
+
+def last_lines(log: str, n: int = 3) -> str:
+    return ' | '.join(line.strip() for line in log.strip().splitlines()[-n:])
+
+
+def source_files(directory: Path) -> list[Path]:
+    """目录下直接包含的 docx / xlsx（跳过 Office 锁文件 ~$ 与隐藏文件）。"""
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return []
+    return sorted(Path(e.path) for e in entries
+                  if e.is_file() and e.name.lower().endswith(DOCX_EXTS + EXCEL_EXTS)
+                  and not e.name.startswith(('~$', '.')))
+
+
+def build_graph(project: Path, iteration: str, cfg: dict) -> dict[str, Node]:
+    """按当前 input/ 内容构建依赖图（节点按拓扑序排列）。"""
+    nodes: dict[str, Node] = {'init': InitNode(project, iteration)}
+    iter_converts: list[str] = []
+    in_prd, out_prd = project / 'input' / 'prd', project / 'output' / 'prd'
+    for src in source_files(in_prd / iteration):
+        name = f'convert:{iteration}/{src.name}'
+        nodes[name] = ConvertNode(name, project, src, out_prd / iteration, cfg)
+        iter_converts.append(name)
+    for src in source_files(in_prd):       # 根级共享文档 → output/prd/
+        name = f'convert:{src.name}'
+        nodes[name] = ConvertNode(name, project, src, out_prd, cfg)
+    nodes['index'] = IndexNode(project)
+    split = SplitNode(project, iteration, iter_converts, cfg)
+    nodes[split.name] = split
+    return nodes
+
+
+class Runner:
+    """读写状态文件，按依赖并发执行节点。"""
+
+    def __init__(self, project: Path):
+        self.project = project
+        self.state_file = project / 'output' / STATE_FILE
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {}
+        if self.state.get('version') != STATE_VERSION:
+            self.state = {'version': STATE_VERSION, 'nodes': {}}
+
+    def run(self, nodes: dict[str, Node], jobs: int = 4, force: set[str] = frozenset(),
+            dry_run: bool = False) -> dict[str, dict]:
+        results: dict[str, dict] = {}
+        waiting = dict(nodes)
+        running: dict = {}
+
+        def submit(pool, node: Node) -> None:
+            rec = self.state['nodes'].get(node.name)
+
+            def task() -> dict:
+                started = time.perf_counter()
+                result = node.process(rec, node.name in force or 'all' in force, dry_run)
+                result['ms'] = (time.perf_counter() - started) * 1000
+                return result
+            running[pool.submit(task)] = node.name
+
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+            while waiting or running:
+                for name, node in list(waiting.items()):
+                    if any(d in waiting or d in running.values() for d in node.deps):
+                        continue
+                    del waiting[name]
+                    failed = [d for d in node.deps if results.get(d, {}).get('status') in (FAILED, BLOCKED)]
+                    if failed:
+                        results[name] = {'status': BLOCKED, 'detail': f'依赖 {", ".join(failed)} 未完成',
+                                         'record': None, 'ms': 0.0}
+                        continue
+                    submit(pool, node)
+                if not running:
+                    continue
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name = running.pop(fut)
+                    try:
+                        results[name] = fut.result()
+                    except Exception as e:     # 节点内部异常不影响其他分支
+                        results[name] = {'status': FAILED, 'detail': f'{type(e).__name__}: {e}', 'record': None,
+                                         'ms': 0.0}
+        return {name: results[name] for name in nodes}
+
+    def save(self, nodes: dict[str, Node], results: dict[str, dict], iteration: str) -> None:
+        """合并各节点的新记录；本迭代与根级已不存在的转换节点记录一并删除。只在有变化时写盘。"""
+        old = json.dumps(self.state, sort_keys=True)
+        records = self.state['nodes']
+        for name, result in results.items():
+            if result.get('record') is not None:
+                records[name] = result['record']
+            elif result['status'] == SKIPPED:
+                records.pop(name, None)
+        for name in list(records):
+            scope = name[len('convert:'):] if name.startswith('convert:') else None
+            if scope is not None and name not in nodes and ('/' not in scope or scope.startswith(f'{iteration}/')):
+                del records[name]
+        if json.dumps(self.state, sort_keys=True) != old and self.state_file.parent.is_dir():
+            with atomic_write(self.state_file, 'w', marker=False) as f:
+                f.write(json.dumps(self.state, ensure_ascii=False, separators=(',', ':')))
+
+
+def print_table(results: dict[str, dict], total_ms: float) -> None:
+    width = max([len(n) for n in results] + [4]) + 2
+    print(f'{"节点":<{width}} {"状态":<6} {"耗时(ms)":>10}  说明')
+    for name, r in results.items():
+        print(f'{name:<{width}} {STATUS_TEXT[r["status"]]:<6} {r["ms"]:>10.1f}  {r["detail"]}')
+    counts: dict[str, int] = {}
+    for r in results.values():
+        counts[r['status']] = counts.get(r['status'], 0) + 1
+    summary = '，'.join(f'{STATUS_TEXT[s]} {n}' for s, n in counts.items())
+    print(f'{"合计":<{width}} {"":<6} {total_ms:>10.1f}  {summary}')
+
+
+def main() -> int:
+    setup_encoding()
+
+    ap = argparse.ArgumentParser(description='以依赖图执行 Phase 1（初始化 / 转换 / 索引 / 拆分）')
+    ap.add_argument('project_dir', nargs='?', help='项目目录')
+    ap.add_argument('iteration', nargs='?', help='迭代标识')
+    ap.add_argument('--config', help='JSON 配置文件路径（路径含中文时使用）')
+    ap.add_argument('--jobs', type=int, default=None, help='并发执行的节点数（默认 4）')
+    ap.add_argument('--force', action='append', default=[], help='强制执行的节点名（可多次指定，all 表示全部）')
+    ap.add_argument('--dry-run', action='store_true', help='只检查并列出待执行节点，不执行')
+    ap.add_argument('--json', action='store_true', help='以 JSON 输出各节点结果')
+    args = ap.parse_args()
+
+    cfg = load_config(args.config) if args.config else {}
+    project_dir = cfg.get('project_dir') or args.project_dir
+    iteration = cfg.get('iteration') or args.iteration
+    if not project_dir or not iteration:
+        print('错误: 需要项目目录与迭代标识（位置参数或 --config）', file=sys.stderr)
+        return 1
+    project = Path(project_dir).resolve()
+    jobs = args.jobs or cfg.get('jobs', 4)
+
+    started = time.perf_counter()
+    nodes = build_graph(project, iteration, cfg)
+    runner = Runner(project)
+    results = runner.run(nodes, jobs, set(args.force), args.dry_run)
+    if not args.dry_run:
+        runner.save(nodes, results, iteration)
+    total_ms = (time.perf_counter() - started) * 1000
+
+    failed = [n for n, r in results.items() if r['status'] in (FAILED, BLOCKED)]
+    iter_empty = not source_files(project / 'input' / 'prd' / iteration)
+    if args.json:
+        print(json.dumps({
+            'project': str(project), 'iteration': iteration, 'elapsed_ms': round(total_ms, 1),
+            'prd_input_empty': iter_empty,
+            'nodes': {n: {'status': r['status'], 'detail': r['detail'], 'ms': round(r['ms'], 1)}
+                      for n, r in results.items()},
+        }, ensure_ascii=False))
+    else:
+        for name, r in results.items():
+            if r['status'] == FAILED and r.get('log'):
+                print(f'[警告] {name} 执行失败，输出末尾：\n{r["log"].strip()[-2000:]}\n')
+        split = results.get(f'split:{iteration}', {})
+        if split.get('status') == RAN and split.get('log'):
+            print(f'[拆分方案]\n{split["log"].rstrip()}\n')
+        print_table(results, total_ms)
+        if iter_empty:
+            print(f'\n[备注] 迭代目录 input/prd/{iteration}/ 当前为空，请放入本迭代的需求文档（docx/xlsx）后重新执行')
+    if failed:
+        return 1
+    return 2 if iter_empty else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+watch_inputs.py - 监视输入目录，变更后自动刷新 Phase 1 产出（文档转换 / 知识库索引 / 文档拆分）。
+
+功能：
+- 轮询（os.scandir + stat，不读内容）input/prd/<迭代>/、input/prd/ 根级共享文档、input/knowledge/ 下的 md，
+  以及 output/prd/<迭代>/ 下的 md（用户直接放入的、手工修订过的转换产出）；只比较大小与 mtime
+- 检测到变更后去抖：直到连续 debounce 秒没有新变化（大文件复制、Office 保存完成）才处理
+- 处理时执行 run_phase1.py 的依赖图：只有受影响的转换、索引刷新与重拆会真正执行，其余节点按内容 hash 判为最新
+- 每轮结束写状态文件 output/phase1_status_<迭代>.json，记录各节点是否最新、待处理的变更、拆分方案等，
+  下次会话读取即可知道 Phase 1 产出已就绪，无需重新检查
+- 脚本自身产出不会自我触发：knowledge_index.md、modules/、隐藏的标记与临时文件不计入监视；
+  转换写出的 md 按状态文件记录的产出签名识别，与签名不同（被手工修改）才视为变更
+
+用法：
+  python watch_inputs.py <项目目录> <迭代> [--interval 1] [--debounce 2] [--jobs 4] [--once]
+  python watch_inputs.py --config <config.json> [...]
+
+配置文件格式：同 run_phase1.py（project_dir / iteration / jobs / doc_type / excel / split），另可含
+  "interval": 1.0,    // 轮询间隔（秒）
+  "debounce": 2.0     // 去抖时长（秒）
+
+Ctrl+C（或 SIGTERM）退出；退出时状态文件的 watching 置为 false。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent / 'testcasegen-split-prd' / 'scripts'))
+from atomic_io import atomic_write  # noqa: E402
+from run_phase1 import (BLOCKED, FAILED, RAN, Runner, build_graph, load_config, print_table,  # noqa: E402
+                        setup_encoding, source_files)
+
+HEARTBEAT_SECONDS = 60
+
+
+def status_path(project: Path, iteration: str) -> Path:
+    return project / 'output' / f'phase1_status_{iteration}.json'
+
+
+def _stat_entries(directory: Path, accept) -> dict[str, tuple[int, int]]:
+    found: dict[str, tuple[int, int]] = {}
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith(('.', '~$')) and accept(entry.name):
+                    st = entry.stat()
+                    found[entry.path] = (st.st_size, st.st_mtime_ns)
+    except OSError:
+        pass
+    return found
+
+
+def snapshot(project: Path, iteration: str) -> dict[str, tuple[int, int]]:
+    """监视范围内文件的 (大小, mtime)；转换产出、索引文件与隐藏文件不在其中。"""
+    in_prd, kb = project / 'input' / 'prd', project / 'input' / 'knowledge'
+    sources = lambda name: name.lower().endswith(('.docx', '.doc', '.xlsx', '.xls'))   # noqa: E731
+    found = _stat_entries(in_prd / iteration, sources)
+    found.update(_stat_entries(in_prd, sources))
+    for root, dirs, _ in os.walk(kb):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        found.update(_stat_entries(Path(root), lambda n: n.endswith('.md') and n != 'knowledge_index.md'))
+    found.update(_stat_entries(project / 'output' / 'prd' / iteration, lambda n: n.endswith('.md')))
+    return found
+
+
+def converted_outputs(runner: Runner, project: Path, iteration: str) -> dict[str, tuple[int, int]]:
+    """转换节点记录的本迭代产出 (大小, mtime)；与之相同的 md 由转换写出，不算用户修改。"""
+    prd_dir = project / 'output' / 'prd' / iteration
+    found: dict[str, tuple[int, int]] = {}
+    for name, rec in runner.state['nodes'].items():
+        if not name.startswith(f'convert:{iteration}/'):
+            continue
+        for key, sig in rec.get('outputs', {}).items():
+            path = project / key
+            if sig and path.parent == prd_dir:
+                found[str(path)] = (sig['size'], sig['mtime_ns'])
+    return found
+
+
+def diff(old: dict, new: dict, project: Path) -> list[str]:
+    rel = lambda p: Path(p).relative_to(project).as_posix()   # noqa: E731
+    changes = [f'+ {rel(p)}' for p in new.keys() - old.keys()]
+    changes += [f'- {rel(p)}' for p in old.keys() - new.keys()]
+    changes += [f'~ {rel(p)}' for p in new.keys() & old.keys() if new[p] != old[p]]
+    return sorted(changes, key=lambda c: c[2:])
+
+
+class StatusFile:
+    """output/phase1_status_<迭代>.json：watch 的当前状态，供下次会话读取。"""
+
+    def __init__(self, project: Path, iteration: str):
+        self.path = status_path(project, iteration)
+        self.data = {
+            'project':   str(project),
+            'iteration': iteration,
+            'watching':  True,
+            'pid':       os.getpid(),
+            'started':   now(),
+            'heartbeat': now(),
+            'fresh':     False,
+            'pending':   [],
+            'nodes':     {},
+            'last_run':  None,
+            'last_split': None,
+        }
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.data['last_split'] = json.load(f).get('last_split')   # 最近一次拆分跨进程保留
+        except (OSError, ValueError):
+            pass
+
+    def write(self, **updates) -> None:
+        self.data.update(updates, heartbeat=now())
+        if self.path.parent.is_dir():
+            with atomic_write(self.path, 'w') as f:
+                f.write(json.dumps(self.data, ensure_ascii=False, indent=2))
+
+
+def now() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def run_cycle(project: Path, iteration: str, cfg: dict, jobs: int, status: StatusFile,
+              changes: list[str]) -> dict[str, tuple[int, int]]:
+    """执行一轮依赖图并更新状态文件；返回本轮转换写出的 md 签名，供并入监视基线。"""
+    started = time.perf_counter()
+    status.write(fresh=False, pending=changes)
+    nodes = build_graph(project, iteration, cfg)
+    runner = Runner(project)
+    results = runner.run(nodes, jobs)
+    runner.save(nodes, results, iteration)
+    total_ms = (time.perf_counter() - started) * 1000
+
+    split = results.get(f'split:{iteration}', {})
+    last_split = status.data['last_split']
+    if split.get('status') == RAN:
+        last_split = {'time': now(), 'detail': split['detail'], 'plan': split.get('log', '').rstrip()}
+    failed = [n for n, r in results.items() if r['status'] in (FAILED, BLOCKED)]
+    status.write(
+        fresh=not failed,
+        pending=[],
+        nodes={n: {'status': r['status'], 'detail': r['detail'], 'ms': round(r['ms'], 1)} for n, r in results.items()},
+        last_run={'time': now(), 'elapsed_ms': round(total_ms, 1), 'changes': changes},
+        last_split=last_split,
+        prd_input_empty=not source_files(project / 'input' / 'prd' / iteration),
+    )
+    print(f'\n[{now()}] ' + ('初次检查' if not changes else f'{len(changes)} 处变更：' + '；'.join(changes[:10])),
+          flush=True)
+    if split.get('status') == RAN:
+        print(f'[拆分方案]\n{last_split["plan"]}\n', flush=True)
+    for name in failed:
+        if results[name].get('log'):
+            print(f'[警告] {name} 执行失败，输出末尾：\n{results[name]["log"].strip()[-2000:]}\n', flush=True)
+    print_table(results, total_ms)
+    sys.stdout.flush()
+    return converted_outputs(runner, project, iteration)
+
+
+def watch(project: Path, iteration: str, cfg: dict, jobs: int, interval: float, debounce: float,
+          once: bool) -> int:
+    status = StatusFile(project, iteration)
+    baseline = snapshot(project, iteration)
+    baseline.update(run_cycle(project, iteration, cfg, jobs, status, []))
+    if once:
+        status.write(watching=False)
+        return 0 if status.data['fresh'] else 1
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))   # 被 kill 时同样走 finally 更新状态文件
+    print(f'\n[监视] {project}（迭代 {iteration}），轮询间隔 {interval}s，去抖 {debounce}s，Ctrl+C 退出', flush=True)
+    last_beat = time.monotonic()
+    try:
+        while True:
+            time.sleep(interval)
+            current = snapshot(project, iteration)
+            if current == baseline:
+                if time.monotonic() - last_beat >= HEARTBEAT_SECONDS:
+                    status.write()
+                    last_beat = time.monotonic()
+                continue
+            # 去抖：直到连续 debounce 秒内快照不再变化
+            status.write(fresh=False, pending=diff(baseline, current, project))
+            settled_at = time.monotonic()
+            while time.monotonic() - settled_at < debounce:
+                time.sleep(min(interval, debounce))
+                latest = snapshot(project, iteration)
+                if latest != current:
+                    current, settled_at = latest, time.monotonic()
+            changes = diff(baseline, current, project)
+            baseline = current             # 运行期间发生的新变更在下一轮与该快照比较时检出
+            if changes:
+                baseline.update(run_cycle(project, iteration, cfg, jobs, status, changes))
+            last_beat = time.monotonic()
+    except KeyboardInterrupt:
+        print('\n[完成] 已停止监视', flush=True)
+    finally:
+        status.write(watching=False)
+    return 0
+
+
+def main() -> int:
+    setup_encoding()
+
+    ap = argparse.ArgumentParser(description='监视输入目录，自动刷新 Phase 1 产出')
+    ap.add_argument('project_dir', nargs='?', help='项目目录')
+    ap.add_argument('iteration', nargs='?', help='迭代标识')
+    ap.add_argument('--config', help='JSON 配置文件路径（路径含中文时使用）')
+    ap.add_argument('--interval', type=float, default=None, help='轮询间隔秒数（默认 1）')
+    ap.add_argument('--debounce', type=float, default=None, help='去抖秒数（默认 2）')
+    ap.add_argument('--jobs', type=int, default=None, help='并发执行的节点数（默认 4）')
+    ap.add_argument('--once', action='store_true', help='只检查并刷新一次后退出')
+    args = ap.parse_args()
+
+    cfg = load_config(args.config) if args.config else {}
+    project_dir = cfg.get('project_dir') or args.project_dir
+    iteration = cfg.get('iteration') or args.iteration
+    if not project_dir or not iteration:
+        print('错误: 需要项目目录与迭代标识（位置参数或 --config）', file=sys.stderr)
+        return 1
+    project = Path(project_dir).resolve()
+    if not (project / 'input').is_dir():
+        print(f'错误: {project} 下没有 input/ 目录，请先初始化项目', file=sys.stderr)
+        return 1
+
+    return watch(project, iteration, cfg,
+                 jobs=args.jobs or cfg.get('jobs', 4),
+                 interval=args.interval or cfg.get('interval', 1.0),
+                 debounce=args.debounce if args.debounce is not None else cfg.get('debounce', 2.0),
+                 once=args.once)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+atomic_io.py - 原子写入与完成标记，供 testcasegen 各脚本共用。
+
+功能：
+- atomic_write()：先写同目录的隐藏临时文件，写完 flush + fsync 后 os.replace 到目标路径；
+  出错时删除临时文件。读取方只会看到旧文件或完整的新文件，不会读到写了一半的内容
+- 每个产出写完后在同目录写入完成标记 .<文件名>.done（JSON：bytes / md5 / mtime_ns / time），
+  标记本身也原子写入。顺序是先产出、后标记，所以有标记就说明产出已完整写完
+- verify_outputs()：按标记逐个 stat 校验（每个文件一次 stat，不读内容）。检出截断或被改写的产出、
+  没有对应产出的标记，以及崩溃残留的临时文件；--deep 时再比对 MD5。缺少标记的产出
+  （旧版本脚本或 Agent 直接写出）只计数，--strict 时才算作问题
+
+使用方：docx2md.py / excel_to_markdown.py / split_prd.py / merge_modules.py /
+       build_knowledge_index.py / markdown_to_xmind.py
+
+用法（代码调用）：
+  from atomic_io import atomic_write, commit_temp, temp_path, write_marker, remove_marker
+  with atomic_write(path, 'w') as f:          # 'w' 文本（UTF-8，换行同 open 文本模式）/ 'wb' 二进制
+      f.write(text)                          # 正常退出时替换目标文件并写标记
+
+  xmind.save(workbook, temp_path(path)); commit_temp(temp_path(path), path)   # 由其他库写出的文件
+  remove_marker(path)                         # 原位修改前先撤销标记，改完再 write_marker
+
+用法（命令行）：
+  python atomic_io.py verify <目录> [--deep] [--strict] [--json]   # 校验目录树下的产出，有问题时返回 1
+  python atomic_io.py mark <文件> [<文件> ...]          # 为 Agent 用 Write 工具写出的产出补写标记
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+MARKER_SUFFIX = '.done'
+TEMP_TAG = '.tmp'
+TEMP_RE = re.compile(r'\.\d+\.tmp(?:\.[^.]*)?$')   # temp_path 生成的名字：.<名>.<pid>.tmp[.<扩展名>]
+
+# 校验结果
+OK, MODIFIED, TRUNCATED, UNMARKED, ORPHAN, STALE_TEMP = \
+    'ok', 'modified', 'truncated', 'unmarked', 'orphan_marker', 'stale_temp'
+
+
+def marker_path(path: str | Path) -> Path:
+    path = Path(path)
+    return path.with_name(f'.{path.name}{MARKER_SUFFIX}')
+
+
+def temp_path(path: str | Path) -> Path:
+    """同目录隐藏临时文件，保留扩展名（xmind 等库按扩展名校验路径）。"""
+    path = Path(path)
+    return path.with_name(f'.{path.stem}.{os.getpid()}{TEMP_TAG}{path.suffix}')
+
+
+def _fsync_dir(directory: Path) -> None:
+    """rename 之后同步目录项（POSIX）；Windows 不支持打开目录，忽略。"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class _HashingWriter:
+    """包装二进制文件：写入时累计 MD5 与字节数；文本模式下按 encoding 编码并做换行转换。"""
+
+    def __init__(self, raw, text: bool, encoding: str):
+        self.raw = raw
+        self.text = text
+        self.encoding = encoding
+        self.md5 = hashlib.md5()
+        self.bytes = 0
+
+    def write(self, data) -> int:
+        if self.text:
+            if os.linesep != '\n':
+                data = data.replace('\n', os.linesep)
+            data = data.encode(self.encoding)
+        self.raw.write(data)
+        self.md5.update(data)
+        self.bytes += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.bytes
+
+
+def _replace(tmp: Path, path: Path) -> None:
+    os.replace(tmp, path)
+    _fsync_dir(path.parent)
+
+
+@contextmanager
+def atomic_write(path: str | Path, mode: str = 'w', encoding: str = 'utf-8', marker: bool = True):
+    """
+    原子写入 path；mode 为 'w'（文本）或 'wb'（二进制）。with 块正常结束后才替换目标文件，
+    marker 为 True 时随后写入完成标记；with 块抛出异常时目标文件与旧标记保持不变。
+    """
+    if mode not in ('w', 'wb'):
+        raise ValueError(f'atomic_write 只支持 w / wb，当前为 {mode}')
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = temp_path(path)
+    try:
+        with open(tmp, 'wb') as raw:
+            writer = _HashingWriter(raw, mode == 'w', encoding)
+            yield writer
+            raw.flush()
+            os.fsync(raw.fileno())
+        if marker:
+            remove_marker(path)          # 替换与写标记之间崩溃时，不留下描述旧内容的标记
+        _replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    if marker:
+        write_marker(path, writer.md5.hexdigest())
+
+
+def commit_temp(tmp: str | Path, path: str | Path, marker: bool = True) -> None:
+    """
+    供由其他库直接写文件的场景（如 xmind.save）：调用方先写 temp_path(path)，
+    本函数将其 fsync 后原子替换为 path，并写完成标记。
+    """
+    tmp, path = Path(tmp), Path(path)
+    with open(tmp, 'rb+') as f:
+        os.fsync(f.fileno())
+    if marker:
+        remove_marker(path)
+    _replace(tmp, path)
+    if marker:
+        write_marker(path)
+
+
+def file_md5(path: str | Path) -> str:
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def write_marker(path: str | Path, md5: str | None = None, hash_content: bool = True) -> dict:
+    """
+    为已写完的 path 写完成标记；md5 缺省时读文件计算。原位增量修改的大文件可传
+    hash_content=False 不读内容，标记只记录大小与 mtime（--deep 校验时跳过 MD5 比对）。
+    """
+    path = Path(path)
+    st = path.stat()
+    record = {
+        'file':     path.name,
+        'bytes':    st.st_size,
+        'md5':      md5 or (file_md5(path) if hash_content else None),
+        'mtime_ns': st.st_mtime_ns,
+        'time':     datetime.now().isoformat(timespec='seconds'),
+    }
+    mp = marker_path(path)
+    tmp = temp_path(mp)
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(record, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    _replace(tmp, mp)
+    return record
+
+
+def remove_marker(path: str | Path) -> None:
+    marker_path(path).unlink(missing_ok=True)
+
+
+def read_marker(path: str | Path) -> dict | None:
+    try:
+        with open(marker_path(path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def check_output(path: str | Path, deep: bool = False) -> str:
+    """
+    单个产出的状态：ok / modified（大小相同但 mtime 变了；deep 时改为比对 MD5）/
+    truncated（大小与标记不符）/ unmarked（没有标记：写入未完成，或由未接入本模块的方式写出）。
+    """
+    record = read_marker(path)
+    if record is None:
+        return UNMARKED
+    st = Path(path).stat()
+    if st.st_size != record.get('bytes'):
+        return TRUNCATED
+    if deep and record.get('md5'):
+        return OK if file_md5(path) == record['md5'] else MODIFIED
+    return OK if st.st_mtime_ns == record.get('mtime_ns') else MODIFIED
+
+
+def verify_outputs(root: str | Path, deep: bool = False, suffixes: tuple[str, ...] = ('.md', '.json', '.xmind')
+                   ) -> list[dict]:
+    """
+    遍历 root（os.scandir），按标记校验所有产出（只看 suffixes 中的扩展名，隐藏文件除外）。
+    返回 [{'path', 'status'}]，只包含状态不是 ok 的条目（含 unmarked）。
+    """
+    problems: list[dict] = []
+    stack = [Path(root)]
+    while stack:
+        directory = stack.pop()
+        files: set[str] = set()
+        markers: list[str] = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                elif entry.name.startswith('.'):
+                    if TEMP_RE.search(entry.name):
+                        problems.append({'path': entry.path, 'status': STALE_TEMP})
+                    elif entry.name.endswith(MARKER_SUFFIX):
+                        markers.append(entry.name[1:-len(MARKER_SUFFIX)])
+                elif entry.name.endswith(suffixes):
+                    files.add(entry.name)
+        for name in sorted(files):
+            status = check_output(directory / name, deep)
+            if status != OK:
+                problems.append({'path': str(directory / name), 'status': status})
+        for name in markers:
+            if name not in files and not (directory / name).exists():
+                problems.append({'path': str(directory / name), 'status': ORPHAN})
+    return problems
+
+
+STATUS_TEXT = {
+    MODIFIED:   '标记后被改写（大小未变）',
+    TRUNCATED:  '大小与完成标记不符（截断或被改写）',
+    UNMARKED:   '缺少完成标记（写入未完成或非脚本写出）',
+    ORPHAN:     '有完成标记但产出不存在',
+    STALE_TEMP: '残留的临时文件（写入中断）',
+}
+
+
+def main() -> int:
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    ap = argparse.ArgumentParser(description='原子写入产出的完成标记：校验 / 补写')
+    sub = ap.add_subparsers(dest='command', required=True)
+    v = sub.add_parser('verify', help='校验目录树下的产出')
+    v.add_argument('root')
+    v.add_argument('--deep', action='store_true', help='同时比对 MD5（读取全部内容）')
+    v.add_argument('--strict', action='store_true', help='缺少完成标记的产出也算作问题')
+    v.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    mk = sub.add_parser('mark', help='为已写完的文件补写完成标记')
+    mk.add_argument('files', nargs='+')
+    args = ap.parse_args()
+
+    if args.command == 'mark':
+        for f in args.files:
+            record = write_marker(f)
+            print(f'[完成] {f}（{record["bytes"]} 字节，md5 {record["md5"]}）')
+        return 0
+
+    found = verify_outputs(args.root, args.deep)
+    problems = [p for p in found if args.strict or p['status'] != UNMARKED]
+    unmarked = [p['path'] for p in found if p['status'] == UNMARKED]
+    if args.json:
+        print(json.dumps({'root': str(args.root), 'ok': not problems, 'problems': problems,
+                          'unmarked': unmarked}, ensure_ascii=False))
+        return 1 if problems else 0
+    for p in problems:
+        print(f'[警告] {p["path"]}：{STATUS_TEXT[p["status"]]}')
+    if not problems:
+        print(f'[完成] {args.root} 下带完成标记的产出均与标记一致')
+    if unmarked and not args.strict:
+        print(f'[备注] {len(unmarked)} 个产出没有完成标记（旧版本脚本或 Agent 直接写出），未校验')
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
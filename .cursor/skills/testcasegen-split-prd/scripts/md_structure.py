@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+md_structure.py - 单遍扫描 Markdown 结构（标题树 / 代码块 / 表格），供多个 testcasegen 脚本共用。
+
+功能：
+- 一个预编译正则在整个文件字节串上 finditer，只命中围栏行、标题行与整块表格，其余行不进入 Python 循环
+- 识别 ``` / ~~~ 围栏代码块（结束围栏须同字符且不短于起始围栏），块内的 # 行和 | 行不视为标题或表格
+- 标题给出级别、文本、行号（0-based）、字节偏移，以及所辖章节的结束行 / 结束字节
+  （下一个同级或更高级标题之前），并按层级组装为标题树
+- 输出代码块与表格的行范围（左闭右开），供拆分时避开
+- 行 → 字节偏移索引与按需解码的行视图（MappedLines），可直接作用于 mmap，大文件无需整体读入内存；
+  ConcatLines 把多个文档拼接为行号连续的单一视图
+- HeadingScanner：逐行识别标题的流式版本（规则与 scan_markdown 相同），供拿不到全文的调用方使用
+- CaseHeadingScanner：测试用例文档的 ## – ##### 标题识别（去首尾空白后按前缀匹配，不受缩进与围栏影响），
+  围栏只用于诊断：落在代码块内的标题、到文件末尾仍未闭合的围栏
+
+使用方：
+- split_prd.py：H1/H2 章节边界、超大章节递归拆分（子标题、代码块、表格）
+- build_knowledge_index.py：H1/H2 章节索引
+- markdown_to_xmind.py / merge_modules.py：测试用例文件 ## – ##### 层级解析与用例块切分（CaseHeadingScanner）
+
+用法（代码调用）：
+  from md_structure import read_markdown_structure, scan_markdown, split_lines
+  doc = read_markdown_structure(path)        # 或 scan_markdown(data)，data 为 bytes / str
+  for h in doc['headings']:
+      print(h['level'], h['title'], h['line'], h['end_line'])
+
+  mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+  starts = line_index(mm)                    # starts[i] 为第 i 行起始字节，末尾为文件长度
+  doc = scan_markdown(mm, starts)
+  lines = MappedLines(mm, starts)            # lines[i] / lines[a:b] 按需解码
+  lines = ConcatLines([lines_a, lines_b])    # 多个文档按全局行号拼接
+
+  python md_structure.py <md文件>             # 打印标题树，便于排查
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+
+# 行首至多 3 个空格后：围栏 | 1–6 个 # 加空白 | 连续的表格行（整块一次命中）
+TOKEN_RE = re.compile(
+    rb'^[ ]{0,3}(?:'
+    rb'(?P<fence>`{3,}|~{3,})'
+    rb'|(?P<hashes>#{1,6})[ \t]+(?P<title>[^\r\n]*)'
+    rb'|(?P<table>\|[^\n]*(?:\n[ ]{0,3}\|[^\n]*)*)'
+    rb')',
+    re.M,
+)
+
+# 单行版本（HeadingScanner 用）：表格行不可能是围栏或标题，无需单独识别
+LINE_TOKEN_RE = re.compile(r'^[ ]{0,3}(?:(?P<fence>`{3,}|~{3,})|(?P<hashes>#{1,6})[ \t]+(?P<title>[^\r\n]*))')
+
+# 测试用例文档的层级标题（CaseHeadingScanner 用）：去掉首尾空白后以 2–5 个 # 加一个空格开头
+CASE_HEADING_RE = re.compile(r'^(#{2,5}) ')
+
+
+def line_index(buf) -> array:
+    """
+    构建行起始字节偏移索引（array('q')，每行 8 字节）：starts[i] 为第 i 行起始位置，
+    末尾追加文件长度作为哨兵，行数 = len(starts) - 1。buf 可为 bytes 或 mmap。
+    """
+    starts = array('q', [0])
+    pos = buf.find(b'\n')
+    while pos != -1:
+        starts.append(pos + 1)
+        pos = buf.find(b'\n', pos + 1)
+    if starts[-1] != len(buf):
+        starts.append(len(buf))
+    return starts
+
+
+class MappedLines:
+    """基于字节缓冲（通常为 mmap）与行索引的只读行序列，访问时才解码，不复制全文。"""
+
+    def __init__(self, buf, starts: array):
+        self.buf = buf
+        self.starts = starts
+
+    def __len__(self) -> int:
+        return len(self.starts) - 1
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        return self.buf[self.starts[key]:self.starts[key + 1]].decode('utf-8', errors='replace')
+
+    def __iter__(self):
+        # 按行块解码后再切分，避免逐行切片解码；块边界总在行首，除块尾外每段都以 \n 结尾
+        n = len(self)
+        for s in range(0, n, 4096):
+            parts = self.text(s, min(s + 4096, n)).split('\n')
+            last = parts.pop()
+            for p in parts:
+                yield p + '\n'
+            if last:
+                yield last
+
+    def span(self, start: int, end: int) -> tuple[int, int]:
+        """行范围 [start, end) 对应的字节范围。"""
+        return self.starts[start], self.starts[end]
+
+    def text(self, start: int, end: int) -> str:
+        """行范围 [start, end) 的文本（一次解码）。"""
+        a, b = self.span(start, end)
+        return self.buf[a:b].decode('utf-8', errors='replace')
+
+    def iter_bytes(self, start: int, end: int, chunk: int = 1 << 20):
+        """按块产出行范围 [start, end) 的原始字节。"""
+        a, b = self.span(start, end)
+        for pos in range(a, b, chunk):
+            yield self.buf[pos:min(pos + chunk, b)]
+
+
+class ConcatLines:
+    """
+    多个 MappedLines 首尾相接的只读行序列：行号全局连续（第 k 个文档从 offsets[k] 开始），
+    接口与 MappedLines 相同；跨文档的行范围按文档切开后分别访问。
+    """
+
+    def __init__(self, parts: list[MappedLines]):
+        self.parts = parts
+        self.offsets = array('q', [0])
+        for p in parts:
+            self.offsets.append(self.offsets[-1] + len(p))
+
+    def __len__(self) -> int:
+        return self.offsets[-1]
+
+    def locate(self, line: int) -> tuple[int, int]:
+        """全局行号 → (文档序号, 文档内行号)。"""
+        k = min(bisect_right(self.offsets, line) - 1, len(self.parts) - 1)
+        return k, line - self.offsets[k]
+
+    def _pieces(self, start: int, end: int):
+        while start < end:
+            k, local = self.locate(start)
+            stop = min(end, self.offsets[k + 1])
+            yield self.parts[k], local, local + stop - start
+            start = stop
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            out: list[str] = []
+            for p, a, b in self._pieces(start, stop):
+                out.extend(p[a:b])
+            return out
+        if key < 0:
+            key += len(self)
+        k, local = self.locate(key)
+        return self.parts[k][local]
+
+    def __iter__(self):
+        for p in self.parts:
+            yield from p
+
+    def text(self, start: int, end: int) -> str:
+        out: list[str] = []
+        for p, a, b in self._pieces(start, end):
+            if out and not out[-1].endswith('\n'):
+                out.append('\n')         # 前一文档末行没有换行符，拼接处补一个
+            out.append(p.text(a, b))
+        return ''.join(out)
+
+    def iter_bytes(self, start: int, end: int, chunk: int = 1 << 20):
+        need_break = False
+        for p, a, b in self._pieces(start, end):
+            if need_break:
+                yield b'\n'
+            yield from p.iter_bytes(a, b, chunk)
+            need_break = b == len(p) and p.buf[-1:] != b'\n'
+
+
+class HeadingScanner:
+    """
+    逐行喂入文本（不含或含行尾换行均可），返回该行的 (级别, 标题) 或 None。
+    围栏代码块的判定与 scan_markdown 一致：结束围栏须同字符、不短于起始围栏且其后无其他内容。
+    """
+
+    def __init__(self):
+        self.fence = ''
+
+    def feed(self, line: str) -> tuple[int, str] | None:
+        m = LINE_TOKEN_RE.match(line)
+        if not m:
+            return None
+        marker = m.group('fence')
+        if self.fence:
+            if marker and marker[0] == self.fence[0] and len(marker) >= len(self.fence) \
+                    and not line[m.end():].strip():
+                self.fence = ''
+            return None
+        if marker:
+            self.fence = marker
+            return None
+        if m.group('hashes'):
+            title = m.group('title').strip()
+            if title:
+                return len(m.group('hashes')), title
+        return None
+
+
+class CaseHeadingScanner:
+    """
+    逐行识别测试用例文档的 ## – ##### 标题，返回 (级别, 标题) 或 None。
+
+    规则与 markdown_to_xmind 历来的解析一致：去掉首尾空白后以 2–5 个 # 加空格开头即为标题，
+    缩进的标题同样识别，代码块也不会遮住标题——生成的用例文档里多出的一行 ``` 不应让其后的
+    用例全部丢失。围栏按 HeadingScanner 的规则另行跟踪，仅用于 warnings() 诊断。
+    """
+
+    def __init__(self):
+        self._fences = HeadingScanner()
+        self.line_no = 0
+        self.fence_line = 0                       # 当前未闭合围栏的起始行（1-based），0 表示不在围栏内
+        self.fenced_headings: list[int] = []      # 落在围栏内、仍按标题处理的行号
+
+    def feed(self, line: str) -> tuple[int, str] | None:
+        self.line_no += 1
+        in_fence = bool(self._fences.fence)
+        self._fences.feed(line)
+        if in_fence != bool(self._fences.fence):
+            self.fence_line = 0 if in_fence else self.line_no
+        stripped = line.strip()
+        m = CASE_HEADING_RE.match(stripped)
+        if not m:
+            return None
+        if in_fence:
+            self.fenced_headings.append(self.line_no)
+        level = len(m.group(1))
+        return level, stripped[level + 1:].strip()
+
+    def warnings(self, source: str) -> list[str]:
+        """围栏异常的提示（读完全部行后调用）；source 为提示中的文件名。"""
+        found = []
+        if self.fenced_headings:
+            rows = '、'.join(map(str, self.fenced_headings[:5])) + (' 等' if len(self.fenced_headings) > 5 else '')
+            found.append(f'{source} 第 {rows} 行的标题位于代码块围栏内（共 {len(self.fenced_headings)} 处），'
+                         f'已按标题解析，请检查是否有未闭合或多余的 ``` / ~~~ 行')
+        if self.fence_line:
+            found.append(f'{source} 第 {self.fence_line} 行的代码块围栏到文件末尾仍未闭合')
+        return found
+
+
+def scan_markdown(data: bytes | str, starts: array | None = None) -> dict:
+    """
+    单遍扫描 Markdown，返回结构字典：
+    {
+      'total_lines': 行数（与 readlines 一致）, 'total_bytes': 字节数,
+      'headings': [{'level', 'title', 'line', 'byte', 'end_line', 'end_byte', 'children'}, ...]（文档顺序）,
+      'tree':     顶层标题列表（children 嵌套下级标题）,
+      'fences':   [(起始围栏行, 结束围栏行 + 1), ...],
+      'tables':   [(首行, 末行 + 1), ...],
+    }
+    str 输入按 UTF-8 编码后扫描，字节偏移以 UTF-8 为准。data 也可以是 mmap，此时需传入
+    line_index 构建的 starts，行号通过二分查找得到（mmap 不支持 count）。
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    total_bytes = len(data)
+    if starts is not None:
+        total_lines = len(starts) - 1
+    else:
+        total_lines = data.count(b'\n') + (1 if data and not data.endswith(b'\n') else 0)
+
+    headings: list[dict] = []
+    fences: list[tuple[int, int]] = []
+    tables: list[tuple[int, int]] = []
+
+    line = 0
+    pos = 0
+    fence = b''
+    fence_start = 0
+    for m in TOKEN_RE.finditer(data):
+        start = m.start()
+        if starts is not None:
+            line = bisect_right(starts, start) - 1
+        else:
+            line += data.count(b'\n', pos, start)
+            pos = start
+
+        marker = m.group('fence')
+        if fence:
+            if marker and marker[:1] == fence[:1] and len(marker) >= len(fence):
+                eol = data.find(b'\n', m.end())
+                if not data[m.end():eol if eol >= 0 else total_bytes].strip():
+                    fences.append((fence_start, line + 1))
+                    fence = b''
+            continue
+        if marker:
+            fence, fence_start = marker, line
+        elif m.group('hashes'):
+            title = m.group('title').decode('utf-8', errors='replace').strip()
+            if title:
+                headings.append({'level': len(m.group('hashes')), 'title': title,
+                                 'line': line, 'byte': start, 'children': []})
+        else:
+            tables.append((line, line + 1 + m.group('table').count(b'\n')))
+    if fence:
+        fences.append((fence_start, total_lines))
+
+    # 章节结束位置与标题树：栈中保存尚未闭合的祖先标题
+    tree: list[dict] = []
+    stack: list[dict] = []
+    for h in headings:
+        while stack and stack[-1]['level'] >= h['level']:
+            closed = stack.pop()
+            closed['end_line'], closed['end_byte'] = h['line'], h['byte']
+        (stack[-1]['children'] if stack else tree).append(h)
+        stack.append(h)
+    for h in stack:
+        h['end_line'], h['end_byte'] = total_lines, total_bytes
+
+    return {
+        'total_lines': total_lines,
+        'total_bytes': total_bytes,
+        'headings':    headings,
+        'tree':        tree,
+        'fences':      fences,
+        'tables':      tables,
+    }
+
+
+def read_markdown_structure(path: str | Path) -> dict:
+    """读取文件（一次）并扫描结构。"""
+    with open(path, 'rb') as f:
+        return scan_markdown(f.read())
+
+
+def split_lines(data: bytes | str) -> list[str]:
+    """
+    按 \\n 切分为保留换行符的行列表（CRLF 归一为 LF），行号与 scan_markdown 一致。
+    不使用 str.splitlines，避免 \\x0b、\\u2028 等字符被当作换行导致行号错位。
+    """
+    text = data.decode('utf-8') if isinstance(data, bytes) else data
+    lines = [ln + '\n' for ln in text.replace('\r\n', '\n').split('\n')]
+    if lines[-1] == '\n':
+        lines.pop()
+    else:
+        lines[-1] = lines[-1][:-1]
+    return lines
+
+
+def main() -> int:
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(encoding='utf-8')
+    if len(sys.argv) < 2:
+        print('用法: python md_structure.py <md文件>')
+        return 1
+
+    doc = read_markdown_structure(sys.argv[1])
+
+    def show(nodes: list[dict], depth: int) -> None:
+        for h in nodes:
+            print(f'{"  " * depth}{"#" * h["level"]} {h["title"]}  '
+                  f'(行 {h["line"] + 1}–{h["end_line"]}，字节 {h["byte"]}–{h["end_byte"]})')
+            show(h['children'], depth + 1)
+
+    show(doc['tree'], 0)
+    print(f'\n共 {doc["total_lines"]} 行，{len(doc["headings"])} 个标题，'
+          f'{len(doc["fences"])} 个代码块，{len(doc["tables"])} 个表格')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
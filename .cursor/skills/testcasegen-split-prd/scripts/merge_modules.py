@@ -4,36 +4,83 @@
 merge_modules.py - 将各模块的步骤产出按清单顺序合并为最终文件。
 
 功能：
-- 读取 _manifest.json 获取模块顺序
-- 从 output/modules/<迭代>/<n>/ 读取对应步骤的产出文件
-- 按模块顺序合并，写入最终输出文件
-- 缺少任意模块产出时报错，不生成不完整的合并文件
+- 读取 _manifest.json 获取模块顺序（清单中的模块列表即文档顺序）
+- 一次调用可合并 prd_analysis / test_outline / test_cases 中的任意几个步骤
+- 从 output/modules/<迭代>/<n>/ 按块流式复制对应步骤的产出文件，模块分隔注释边写边插入，
+  内存占用与产出大小无关，每个产出文件只读一遍
+- 缺少任意模块产出时报错，不生成不完整的合并文件（先检查全部请求的步骤，再开始写入）；
+  --partial 模式下改为合并已有的模块，缺失模块写入占位章节
+- 每次合并后写入 JSON 覆盖率报告（各步骤已合并 / 缺失的模块及覆盖率）
+- test_cases 合并时按 ##### 用例块去重：标题（去掉用例编号）、操作步骤、预期结果归一化后取指纹，
+  与前面模块完全相同的用例不再写入，并输出去重报告（被移除用例及其所在 / 保留模块）
+- 融合导出 XMind（配置 xmind）：test_cases 各模块产出边合并边送入 markdown_to_xmind 的流式用例解析器，
+  合并结束即生成 XMind，不再写出合并文件后重读、重解析；合并后的 test_cases md 可选是否写出
+- 合并文件与报告经 atomic_io.py 写入并带完成标记：全量合并写临时文件后原子替换；
+  增量原位修改前先撤销标记，改完 fsync 后再补写，中途崩溃的合并文件不会被当作已完成
+- 增量合并：合并文件末尾嵌入各模块指纹表（大小 / mtime / hash / 在合并文件中的字节范围）；
+  再次合并时先按大小 + mtime 判断，未变化直接跳过，只有长度不变的模块原位覆盖，
+  长度变化时从第一个变化的模块起截断重写，之前的内容不动
 
 用法：
-  python merge_modules.py --config <config.json>
+  python merge_modules.py --config <config.json> [--partial]
+
+  --partial  部分合并：缺少产出的模块以占位章节代替，用于在全部模块完成前预览 / 导出 XMind
 
 配置文件格式：
 {
   "manifest_file": "<output/prd/<迭代>/modules/_manifest.json 的绝对路径>",
   "modules_base_dir": "<output/modules/<迭代>/ 的绝对路径>",
-  "step": "prd_analysis | test_outline | test_cases",
-  "output_file": "<合并后输出文件的绝对路径>"
+  "outputs": {
+    "prd_analysis": "<合并后输出文件的绝对路径>",
+    "test_outline": "<...>",
+    "test_cases":   "<...>"
+  }
 }
+outputs 中可只列部分步骤；兼容旧格式 "step" + "output_file"（单个步骤）。
+coverage_file 可选，覆盖率报告路径，缺省为 modules_base_dir 下的 _merge_coverage.json。
+dedupe_cases 可选（默认 true），为 false 时 test_cases 不做跨模块去重；
+dedupe_file 可选，去重报告路径，缺省为 modules_base_dir 下的 _merge_dedupe.json。
+xmind 可选，融合导出 XMind（需安装 xmind 库，依赖 testcasegen-md2xmind 的 markdown_to_xmind.py）：
+  "xmind": {"output_dir": "<可选，缺省为 output/xmind>", "custom_path": "<可选，根节点标题>",
+            "output_filename": "<可选，输出文件名.xmind>"}
+  outputs 中列出 test_cases 时同时写出合并文件；未列出时只导出 XMind，不写合并 md。
 """
 
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
+import os
+import re
 import sys
+from contextlib import nullcontext
+from datetime import datetime
 from pathlib import Path
 
+from atomic_io import atomic_write, remove_marker, write_marker
+from md_structure import CaseHeadingScanner
+
 STEP_FILENAME: dict[str, str] = {
     'prd_analysis': 'prd_analysis.md',
     'test_outline': 'test_outline.md',
     'test_cases':   'test_cases.md',
 }
 
+COPY_CHUNK = 1 << 20
+
+# 做跨模块用例去重的步骤
+DEDUPE_STEPS = {'test_cases'}
+
+# 用例块：##### 标题起，到下一个 ## – ##### 标题止；标题由 md_structure.CaseHeadingScanner 识别，
+# 与 markdown_to_xmind 导出时的用例边界一致
+CASE_ID_RE      = re.compile(r'^[A-Z]\d+-[A-Z]\d+\s+')
+STEP_NUMBER_RE  = re.compile(r'^\s*\d+\.\s*(.+)$')
+
+# 合并文件末行的指纹表（HTML 注释，不影响 Markdown 渲染与 XMind 导出）
+FINGERPRINT_MARKER = b'\n\n<!-- merge-fingerprints: '
+FINGERPRINT_END    = b' -->\n'
+
 
 def setup_encoding() -> None:
     if hasattr(sys.stdout, 'reconfigure'):
@@ -47,22 +94,334 @@ def load_config(path: str) -> dict:
         return json.load(f)
 
 
+def module_header(m: dict, first: bool) -> bytes:
+    """模块分隔注释（首个模块前不留空行）。"""
+    ch_desc = ' / '.join(m['chapters'][:3])
+    separator = f'<!-- ===== 模块 {m["index"]:02d}: {ch_desc} ===== -->\n\n'
+    return (separator if first else '\n\n' + separator).encode('utf-8')
+
+
+def read_fingerprints(path: Path) -> dict | None:
+    """
+    从合并文件末尾读取指纹表（只读文件尾部，按需向前扩大读取范围）。
+    指纹表缺失、格式不对，或正文长度与记录不符（合并文件被手工修改过）时返回 None。
+    """
+    if not path.exists():
+        return None
+    size = path.stat().st_size
+    tail_len = min(size, 1 << 16)
+    with open(path, 'rb') as f:
+        while True:
+            f.seek(size - tail_len)
+            tail = f.read(tail_len)
+            pos = tail.rfind(FINGERPRINT_MARKER)
+            if pos >= 0 or tail_len == size:
+                break
+            tail_len = min(size, tail_len * 4)
+    if pos < 0 or not tail.endswith(FINGERPRINT_END):
+        return None
+    try:
+        table = json.loads(tail[pos + len(FINGERPRINT_MARKER):-len(FINGERPRINT_END)])
+    except ValueError:
+        return None
+    if table.get('body_bytes') != size - tail_len + pos:
+        return None
+    return table
+
+
+def placeholder(m: dict, step: str) -> bytes:
+    """缺失模块的占位章节（引用块，XMind 导出时不产生用例节点）。"""
+    ch_desc = ' / '.join(m['chapters'][:3])
+    return f'> [待生成] 模块 {m["index"]:02d}（{ch_desc}）的 {step} 产出尚未生成，本文件为部分合并结果。\n'.encode('utf-8')
+
+
+def write_body(item: dict, dst) -> tuple[str, int]:
+    """按块把模块产出（或占位章节）写入已定位的输出文件，同时计算 hash；返回 (hash, 字节数)。"""
+    if item['path'] is None:
+        dst.write(item['body'])
+        return hashlib.md5(item['body']).hexdigest(), len(item['body'])
+    h = hashlib.md5()
+    n = 0
+    with open(item['path'], 'rb') as src:
+        for chunk in iter(lambda: src.read(COPY_CHUNK), b''):
+            h.update(chunk)
+            dst.write(chunk)
+            n += len(chunk)
+    return h.hexdigest(), n
+
+
+class _Tee:
+    """写入合并文件的同时把同样的字节交给 sink（融合导出时的流式解析器）；out 为 None 时只转交不落盘。"""
+
+    def __init__(self, out, sink):
+        self.out = out
+        self.sink = sink
+
+    def write(self, data: bytes) -> None:
+        if self.out is not None:
+            self.out.write(data)
+        self.sink(data)
+
+
+def load_md2xmind():
+    """按需导入 markdown_to_xmind（优先脚本同目录，其次 testcasegen-md2xmind 技能目录）。"""
+    sys.path.append(str(Path(__file__).resolve().parent.parent.parent / 'testcasegen-md2xmind' / 'scripts'))
+    import markdown_to_xmind
+    return markdown_to_xmind
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.split()).rstrip('。.；;').lower()
+
+
+def case_fingerprint(title: str, block: list[bytes]) -> tuple[str, str] | None:
+    """
+    用例块 → (指纹, 标题)。指纹取归一化后的标题（去掉用例编号）、操作步骤与预期结果；
+    前置条件与优先级不参与。没有操作也没有预期的块不参与去重，返回 None。
+    block 首行为 ##### 标题行，title 为扫描器识别出的标题文本。
+    """
+    title = CASE_ID_RE.sub('', title)
+    fields: dict[str, list[str]] = {'steps': [], 'expected': []}
+    current = None
+    for raw in block[1:]:
+        line = raw.decode('utf-8', errors='replace').strip()
+        if line.startswith(('- 操作', '- 预期')):
+            current = 'steps' if line.startswith('- 操作') else 'expected'
+            inline = re.split('[：:]', line, maxsplit=1)[1:]
+            if inline and inline[0].strip():
+                fields[current].append(_normalize(inline[0]))
+        elif line.startswith('- '):
+            current = None
+        elif current:
+            m = STEP_NUMBER_RE.match(line)
+            if m:
+                fields[current].append(_normalize(m.group(1)))
+    if not fields['steps'] and not fields['expected']:
+        return None
+    key = '\x1f'.join([_normalize(title), '\x1e'.join(fields['steps']), '\x1e'.join(fields['expected'])])
+    return hashlib.md5(key.encode('utf-8')).hexdigest()[:16], title
+
+
+def filter_cases(item: dict, dst, seen: dict[str, int]) -> tuple[str, int, list[str], list[dict]]:
+    """
+    逐行流式复制模块的 test_cases 产出，跳过与前面模块（seen：指纹 → 首次出现的模块序号）重复的
+    用例块；同一模块内的重复不处理。返回 (源文件 hash, 写入字节数, 保留用例的指纹, 被移除的用例)。
+    """
+    h = hashlib.md5()
+    written = 0
+    kept: list[str] = []
+    dropped: list[dict] = []
+    block: list[bytes] | None = None
+    title = ''
+    scanner = CaseHeadingScanner()
+
+    def flush() -> int:
+        fp = case_fingerprint(title, block)
+        if fp and fp[0] in seen:
+            dropped.append({'module': item['module']['index'], 'title': fp[1], 'duplicate_of': seen[fp[0]]})
+            return 0
+        if fp:
+            kept.append(fp[0])
+        data = b''.join(block)
+        dst.write(data)
+        return len(data)
+
+    with open(item['path'], 'rb') as src:
+        for line in src:
+            h.update(line)
+            heading = scanner.feed(line.decode('utf-8', errors='replace'))
+            if heading:
+                if block is not None:
+                    written += flush()
+                    block = None
+                if heading[0] == 5:
+                    block = [line]
+                    title = heading[1]
+                    continue
+            if block is not None:
+                block.append(line)
+            else:
+                dst.write(line)
+                written += len(line)
+    if block is not None:
+        written += flush()
+    for w in scanner.warnings(f'模块 {item["module"]["index"]:02d} 的 {STEP_FILENAME["test_cases"]}'):
+        print(f'[警告] {w}')
+    return h.hexdigest(), written, kept, dropped
+
+
+def merge_step(step: str, modules: list[dict], modules_base: Path, output_file: Path | None,
+               dedupe: bool = False, sink=None) -> tuple[str, list[dict], list[dict]]:
+    """
+    增量合并一个步骤的产出，返回 (结果摘要, 缺失模块列表, 去重移除的用例)。缺少产出的模块写入
+    占位章节（调用方只在 --partial 模式下允许缺失）。
+
+    逐模块比对指纹表：分隔注释与位置相同、大小与 mtime 都没变的模块视为未变化（不读内容）；
+    大小不变但 mtime 变了的模块原位覆盖（同时重算 hash）；第一个长度变化、增删或换位的模块
+    及其之后的部分截断后重写。没有可用指纹表时全量重写。
+    dedupe 时按用例块去重：任一模块变化都可能改变后续模块的去重结果，因此不做原位覆盖，
+    从第一个变化的模块起重写；之前模块保留的用例指纹取自指纹表，无需重新读取。
+    sink 不为空时（融合导出）所有模块都要送入解析器，因此不做增量，分隔注释与模块正文依次交给
+    sink；output_file 为 None 时只交给 sink，不写合并文件。
+    """
+    old = read_fingerprints(output_file) if output_file is not None and sink is None else None
+    if old and bool(old.get('dedupe')) != dedupe:
+        old = None
+    old_entries = old['modules'] if old else []
+
+    plan: list[dict] = []
+    for k, m in enumerate(modules):
+        src_path = modules_base / f'{m["index"]:02d}' / STEP_FILENAME[step]
+        header = module_header(m, k == 0)
+        item = {'module': m, 'path': src_path, 'header': header,
+                'header_md5': hashlib.md5(header).hexdigest()}
+        if src_path.exists():
+            st = src_path.stat()
+            item.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+        else:
+            # 占位章节的 mtime 记为 0：产出生成后大小或 mtime 必然变化，会被重新合并
+            body = placeholder(m, step)
+            item.update(path=None, body=body, size=len(body), mtime_ns=0)
+        plan.append(item)
+    missing = [{'index': p['module']['index'], 'chapters': p['module']['chapters'],
+                'file': str(modules_base / f'{p["module"]["index"]:02d}' / STEP_FILENAME[step])}
+               for p in plan if p['path'] is None]
+
+    # 第一个需要移动后续内容的位置：之前的模块布局（位置与长度）与上次完全一致
+    rewrite_from = 0
+    while (rewrite_from < min(len(plan), len(old_entries))
+           and old_entries[rewrite_from]['index'] == plan[rewrite_from]['module']['index']
+           and old_entries[rewrite_from]['header'] == plan[rewrite_from]['header_md5']
+           and old_entries[rewrite_from]['size'] == plan[rewrite_from]['size']):
+        rewrite_from += 1
+    in_place = [k for k in range(rewrite_from) if old_entries[k]['mtime_ns'] != plan[k]['mtime_ns']]
+    if dedupe and in_place:
+        rewrite_from, in_place = in_place[0], []
+
+    if old and rewrite_from == len(plan) == len(old_entries) and not in_place:
+        dropped = [d for e in old_entries for d in e.get('dropped', [])]
+        return f'[跳过] [{step}] {len(plan)} 个模块产出均未变化 → {output_file}', missing, dropped
+
+    entries: list[dict] = []
+    if output_file is None:
+        target = nullcontext()
+    elif old:
+        remove_marker(output_file)        # 原位修改期间没有完成标记，崩溃后不会被误认为已合并
+        target = open(output_file, 'r+b')
+    else:
+        target = atomic_write(output_file, 'wb')
+    with target as out:
+        dst = out if sink is None else _Tee(out, sink)
+        for k in range(rewrite_from):
+            entry = dict(old_entries[k])
+            if k in in_place:
+                dst.seek(entry['offset'] + len(plan[k]['header']))
+                entry['hash'], _ = write_body(plan[k], dst)
+                entry['mtime_ns'] = plan[k]['mtime_ns']
+            entries.append(entry)
+
+        seen: dict[str, int] = {}
+        for entry in entries:
+            for fp in entry.get('cases', []):
+                seen.setdefault(fp, entry['index'])
+
+        offset = old_entries[rewrite_from - 1]['offset'] + old_entries[rewrite_from - 1]['length'] \
+            if rewrite_from else 0
+        if old:
+            out.seek(offset)
+            out.truncate()
+        for p in plan[rewrite_from:]:
+            dst.write(p['header'])
+            entry = {'index': p['module']['index'], 'header': p['header_md5'], 'size': p['size'],
+                     'mtime_ns': p['mtime_ns']}
+            if dedupe and p['path'] is not None:
+                entry['hash'], n, entry['cases'], entry['dropped'] = filter_cases(p, dst, seen)
+                for fp in entry['cases']:
+                    seen.setdefault(fp, p['module']['index'])
+            else:
+                entry['hash'], n = write_body(p, dst)
+            entry.update(offset=offset, length=len(p['header']) + n)
+            entries.append(entry)
+            offset += len(p['header']) + n
+
+        if out is not None:
+            table = {'version': 1, 'step': step, 'dedupe': dedupe, 'body_bytes': offset, 'modules': entries}
+            out.write(FINGERPRINT_MARKER
+                      + json.dumps(table, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                      + FINGERPRINT_END)
+            size_kb = out.tell() / 1024
+            if old:
+                out.flush()
+                os.fsync(out.fileno())
+    if old:
+        # 增量合并不读未变化的模块，标记不重算整个文件的 MD5
+        write_marker(output_file, hash_content=False)
+
+    dropped = [d for e in entries for d in e.get('dropped', [])]
+    held = f'（{len(missing)} 个模块为占位章节）' if missing else ''
+    if dropped:
+        held += f'（跨模块去重移除 {len(dropped)} 条用例）'
+    if output_file is None:
+        return (f'[完成] 读取 {len(plan) - len(missing)} 个模块的 [{step}] 产出{held}，'
+                f'直接送入 XMind 导出（未写合并文件）'), missing, dropped
+    if not old:
+        return (f'[完成] 合并 {len(plan) - len(missing)} 个模块的 [{step}] 产出{held} → '
+                f'{output_file}（{size_kb:.1f} KB）'), missing, dropped
+    rewritten = ', '.join(f'{p["module"]["index"]:02d}' for p in plan[rewrite_from:]) or '无'
+    updated = ', '.join(f'{plan[k]["module"]["index"]:02d}' for k in in_place) or '无'
+    return (f'[增量] [{step}] 原位更新: {updated}；重写: {rewritten}；'
+            f'其余 {rewrite_from - len(in_place)} 个模块未变化{held} → {output_file}（{size_kb:.1f} KB）'), \
+        missing, dropped
+
+
+def write_coverage(path: Path, modules: list[dict], results: dict[str, tuple[Path, list[dict]]]) -> None:
+    """写入覆盖率报告；同一报告中其他步骤的既有记录保留（分多次合并不同步骤时累积）。"""
+    report: dict = {}
+    if path.exists():
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                report = json.load(f)
+        except ValueError:
+            report = {}
+    steps = report.get('steps', {})
+    now = datetime.now().isoformat(timespec='seconds')
+    for step, (output_file, missing) in results.items():
+        steps[step] = {
+            'output_file':    str(output_file) if output_file else None,
+            'merged_time':    now,
+            'total_modules':  len(modules),
+            'merged_modules': len(modules) - len(missing),
+            'coverage':       round((len(modules) - len(missing)) / len(modules), 4) if modules else 1.0,
+            'missing':        missing,
+        }
+    report.update({'module_count': len(modules), 'updated_time': now, 'steps': steps})
+    with atomic_write(path, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
 def main() -> int:
     setup_encoding()
 
     ap = argparse.ArgumentParser(description='合并各模块步骤产出为最终文件')
     ap.add_argument('--config', required=True, help='JSON 配置文件路径')
+    ap.add_argument('--partial', action='store_true', help='部分合并：缺失模块以占位章节代替')
     args = ap.parse_args()
 
     cfg = load_config(args.config)
     manifest_file   = Path(cfg['manifest_file'])
     modules_base    = Path(cfg['modules_base_dir'])
-    step            = cfg['step']
-    output_file     = Path(cfg['output_file'])
+    outputs         = cfg.get('outputs') or ({cfg['step']: cfg['output_file']} if 'step' in cfg else {})
+    xmind_cfg       = cfg.get('xmind')
+    if xmind_cfg is not None and 'test_cases' not in outputs:
+        outputs = {**outputs, 'test_cases': None}     # 只导出 XMind，不写合并 md
+    if not outputs:
+        print('错误: 配置中缺少 outputs（或 step + output_file / xmind）', file=sys.stderr)
+        return 1
 
     # 校验 step 参数
-    if step not in STEP_FILENAME:
-        print(f'错误: step 必须是 {list(STEP_FILENAME.keys())} 之一，当前值: {step}',
+    invalid = [step for step in outputs if step not in STEP_FILENAME]
+    if invalid:
+        print(f'错误: step 必须是 {list(STEP_FILENAME.keys())} 之一，当前值: {", ".join(invalid)}',
               file=sys.stderr)
         return 1
 
@@ -74,44 +433,75 @@ def main() -> int:
     with open(manifest_file, 'r', encoding='utf-8') as f:
         manifest = json.load(f)
 
-    modules    = sorted(manifest['modules'], key=lambda m: m['index'])
-    step_fn    = STEP_FILENAME[step]
+    # 按清单顺序（即文档顺序）合并；增量重拆后新增模块的序号可能不连续
+    modules = manifest['modules']
 
-    # 检查每个模块的产出文件是否存在
-    missing: list[str] = []
-    found:   list[tuple[dict, Path]] = []
-
-    for m in modules:
-        mod_dir   = modules_base / f'{m["index"]:02d}'
-        step_file = mod_dir / step_fn
-        if step_file.exists():
-            found.append((m, step_file))
-        else:
-            ch_desc = ' + '.join(m['chapters'][:2])
-            missing.append(f'模块 {m["index"]:02d}（{ch_desc}）：{step_file}')
+    # 检查每个步骤、每个模块的产出文件是否存在（只 stat，不读内容）
+    missing: dict[str, list[str]] = {}
+    for step in outputs:
+        for m in modules:
+            step_file = modules_base / f'{m["index"]:02d}' / STEP_FILENAME[step]
+            if not step_file.exists():
+                ch_desc = ' + '.join(m['chapters'][:2])
+                missing.setdefault(step, []).append(f'模块 {m["index"]:02d}（{ch_desc}）：{step_file}')
 
-    if missing:
-        print(f'错误：以下模块的 [{step}] 产出尚未生成，无法合并：', file=sys.stderr)
-        for item in missing:
-            print(f'  - {item}', file=sys.stderr)
+    if missing and not args.partial:
+        for step, items in missing.items():
+            print(f'错误：以下模块的 [{step}] 产出尚未生成，无法合并：', file=sys.stderr)
+            for item in items:
+                print(f'  - {item}', file=sys.stderr)
+        print('  如需先预览已完成的模块，可加 --partial 部分合并。', file=sys.stderr)
         return 1
+    for step, items in missing.items():
+        print(f'[警告] 部分合并：[{step}] 缺少 {len(items)}/{len(modules)} 个模块产出，以占位章节代替')
 
-    # 合并
-    output_file.parent.mkdir(parents=True, exist_ok=True)
+    # 融合导出：test_cases 合并时把字节流同时交给用例解析器
+    md2xmind = parser = None
+    if xmind_cfg is not None:
+        try:
+            md2xmind = load_md2xmind()
+        except ImportError as e:
+            print(f'错误: 无法加载 markdown_to_xmind.py（融合导出 XMind 需要）：{e}', file=sys.stderr)
+            return 1
+        parser = md2xmind.CaseStreamParser()
 
-    parts: list[str] = []
-    for m, fp in found:
-        ch_desc = ' / '.join(m['chapters'][:3])
-        separator = f'\n\n<!-- ===== 模块 {m["index"]:02d}: {ch_desc} ===== -->\n\n'
-        with open(fp, 'r', encoding='utf-8') as f:
-            content = f.read()
-        parts.append(separator + content)
+    # 合并：逐个模块按块复制到输出文件，分隔注释即时写入；已有指纹表时只处理变化的模块
+    results: dict[str, tuple[Path | None, list[dict]]] = {}
+    dedupe_cases = cfg.get('dedupe_cases', True)
+    for step, out in outputs.items():
+        out = Path(out) if out else None
+        dedupe = dedupe_cases and step in DEDUPE_STEPS
+        sink = parser.feed if parser is not None and step == 'test_cases' else None
+        summary, step_missing, dropped = merge_step(step, modules, modules_base, out, dedupe, sink)
+        results[step] = (out, step_missing)
+        print(summary)
+        if dedupe:
+            dedupe_file = Path(cfg.get('dedupe_file') or modules_base / '_merge_dedupe.json')
+            with atomic_write(dedupe_file, 'w') as f:
+                json.dump({'step': step, 'output_file': str(out) if out else None, 'removed_count': len(dropped),
+                           'removed': dropped}, f, ensure_ascii=False, indent=2)
+            if dropped:
+                print(f'[去重] [{step}] 移除 {len(dropped)} 条与前面模块重复的用例，明细 → {dedupe_file}')
 
-    merged = ''.join(parts).lstrip('\n')
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(merged)
+    if parser is not None:
+        cases = parser.close()
+        if not cases:
+            print('错误: 未找到有效的测试用例，未生成 XMind', file=sys.stderr)
+            return 1
+        # 输出位置与命名沿用 markdown_to_xmind：output/test_cases → output/xmind，文件名取合并文件名；
+        # 不写合并文件时按 output/modules/<迭代>/ 推断 output/xmind 与 <迭代>_测试用例
+        md_name = outputs['test_cases'] or str(modules_base.parent.parent / 'test_cases' / f'{modules_base.name}_测试用例.md')
+        default_root, default_hint = md2xmind.default_xmind_names(md_name)
+        md2xmind.create_xmind_from_cases(
+            cases,
+            output_dir=xmind_cfg.get('output_dir') or md2xmind.default_xmind_dir(md_name),
+            custom_path=xmind_cfg.get('custom_path') or default_root,
+            output_filename_hint=xmind_cfg.get('output_filename') or default_hint,
+        )
 
-    print(f'[完成] 合并 {len(parts)} 个模块的 [{step}] 产出 → {output_file}')
+    coverage_file = Path(cfg.get('coverage_file') or modules_base / '_merge_coverage.json')
+    write_coverage(coverage_file, modules, results)
+    print(f'覆盖率报告 → {coverage_file}')
     return 0
 
 
@@ -5,24 +5,57 @@ split_prd.py - 将超过阈值的需求 Markdown 文档拆分为模块子文档
 
 功能：
 - 识别"共享前置章节"（术语/概述/参考文档等），追加到每个子文档开头保证上下文完整
-- 按 H1/H2 标题边界将功能章节贪心分组，每组约 target_lines 行
-- 超过 hard_max 的 H2 章节自动按 H3 二次拆分
-- 行数过少的模块自动合并到相邻模块
-- 写入模块子文档和 _manifest.json 清单
-- 幂等：_manifest.json 已存在时直接输出摘要并退出
+- 支持多个源文档联合拆分（md_file 为文件列表或目录）：各文档章节统一分组到同一清单，
+  各文档重复的共享章节只保留一份，源文档 hash 并行计算
+- 标题 / 代码块 / 表格由共享的 md_structure.py 单遍扫描得到，代码块内的 # 行不视为标题
+- 按 H1/H2 标题边界对功能章节做最优分组（动态规划：不超过 hard_max、尽量不低于 min_lines、
+  与 target_lines 的偏差平方和最小）
+- 超过 hard_max 的章节递归拆分：H3–H6 子标题 → 编号段落 → 空行 / 表格安全的行边界，
+  片段开头补充所属章节路径，保证模块不超过 hard_max（代码块不切分，单个代码块超长时除外）
+- 清单中记录贪心分组与最优分组的均衡度对比
+- 可选按引用裁剪共享前置：术语表类章节只保留本模块正文（及已选条目释义）中提及的术语条目，
+  清单记录各模块前置的行数 / token 节省
+- 按章节标题 / 子标题术语的相互提及构建章节引用图，分组时尽量不把强关联章节切到不同模块，
+  并在清单中列出每个模块的跨模块引用
+- 可按估算 token 数（而非行数）驱动分组、超大章节拆分与小模块合并，并记录各模块 token 数
+- 源文件以只读 mmap 访问，仅常驻行 → 字节偏移索引与 token 前缀和；模块子文档按块复制源文件
+  字节范围写出（保留源文件换行风格），超大文档的内存占用与全文大小无关
+- 写入模块子文档和 _manifest.json 清单；清单为每个模块记录文件 hash / 字节数 / 字符数 / token 数、
+  共享前置 hash，以及各章节在源文件中的行 / 字节范围，下游无需打开模块文件即可校验新鲜度、定位章节
+- 模块子文档、共享前置与清单均经 atomic_io.py 原子写入（临时文件 + fsync + rename）并带完成标记，
+  清单最后写出，中途崩溃不会留下半截文件或看似完整的清单
+- 幂等：_manifest.json 已存在且源文件未变更时直接输出摘要并退出
+- 增量重拆：源文件变更时按章节内容 hash 对齐旧模块，未变化的模块保留序号与文件不重写，
+  仅重写受影响的模块，并在清单中标记 dirty_modules 供后续步骤只重新生成这些模块
 
 用法：
   python split_prd.py --config <config.json>
 
 配置文件格式：
 {
-  "md_file": "<需求md文件绝对路径>",
+  "md_file": "<需求md文件绝对路径，或文件路径列表，或目录>",
   "output_dir": "<模块子文档输出目录绝对路径>",
   "target_lines": 600,
   "hard_max": 800,
   "min_lines": 80,
-  "shared_keywords": []
+  "shared_keywords": [],
+  "target_tokens": 12000,
+  "hard_max_tokens": 16000,
+  "min_tokens": 1600,
+  "tokenizer_file": "",
+  "incremental": true,
+  "reference_weight": 1.0,
+  "filter_shared_prefix": false
 }
+target_tokens 存在时切换为 token 模式（hard_max_tokens 缺省为 target_tokens 的 4/3，
+min_tokens 缺省按 min_lines/target_lines 比例换算）；tokenizer_file 可选，指向本地
+tokenizer.json（需安装 tokenizers 包），否则使用离线估算器。
+reference_weight 为跨模块引用的惩罚系数（每处被切断的引用约等于偏离目标 1/10 的代价），
+设为 0 时只按大小分组，清单仍记录跨模块引用。
+md_file 为目录时取其下直接包含的 *.md（按文件名排序，不含子目录）；章节不跨文档，
+无 H1/H2 标题的文档整篇作为一个章节。
+filter_shared_prefix 为 true 时，术语 / 定义类共享章节按模块裁剪（其余共享章节仍整段保留），
+_shared_prefix.md 始终保存完整共享前置。
 """
 
 from __future__ import annotations
@@ -30,11 +63,46 @@ from __future__ import annotations
 import argparse
 import hashlib
 import json
+import mmap
+import os
 import re
 import sys
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
 from pathlib import Path
 
+from atomic_io import atomic_write, remove_marker
+from md_structure import LINE_TOKEN_RE, ConcatLines, MappedLines, line_index, scan_markdown
+
+# 离线 token 估算：CJK 字符（含全角标点）按每字 CJK_TOKEN_WEIGHT 计，
+# 其余非空白字符按每 ASCII_CHARS_PER_TOKEN 个字符 1 token 计
+CJK_RE = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+CJK_TOKEN_WEIGHT = 0.8
+ASCII_CHARS_PER_TOKEN = 4
+TOKENIZER_BATCH_LINES = 10000
+
+# 写模块文件时按块复制源文件字节范围
+COPY_CHUNK = 1 << 20
+# 非续字节（0x00–0x7F、0xC0–0xFF），统计 UTF-8 字符数时删除这些字节后剩下的即续字节
+UTF8_LEAD_BYTES = bytes(range(0x80)) + bytes(range(0xC0, 0x100))
+
+# 章节引用图：锚点（章节标题 / 子标题）最短长度；被过多章节提及的锚点视为通用词忽略
+MIN_ANCHOR_LEN = 3
+ANCHOR_PREFIX_RE = re.compile(r'^(?:\d+(?:\.\d+)*[.、]?|[一二三四五六七八九十]+[、.]|[（(]\d+[)）])\s*')
+
+# 共享前置裁剪：标题命中这些关键词的共享章节视为术语表，按条目过滤
+GLOSSARY_KEYWORDS = ['术语', '定义', '缩略', '名词', '词汇', '释义']
+# 术语表列表条目：「- **术语** ...」或「- 术语：释义」
+LIST_TERM_RE = re.compile(r'^\s*[-*+]\s+(?:\*\*(.+?)\*\*|([^：:]{1,40})[：:])')
+LIST_ITEM_RE = re.compile(r'^\s*[-*+]\s+')
+TERM_SPLIT_RE = re.compile(r'[（()）/、,，]')
+
+# 编号段落：1. / 1、 / 1.2 / 1.2.3. 等，后接正文
+NUMBERED_RE = re.compile(r'^(\d+(?:\.\d+)*)(?:[.、)）]\s*|\s+)\S')
+
 DEFAULT_SHARED_KEYWORDS = [
     '术语', '定义', '缩略', '概述', '总体', '参考文档', '引用',
     '背景', '目的', '范围', '适用', '前言', '说明', '修订',
@@ -59,23 +127,162 @@ def load_config(path: str) -> dict:
 def file_md5(path: Path) -> str:
     h = hashlib.md5()
     with open(path, 'rb') as f:
-        for chunk in iter(lambda: f.read(8192), b''):
+        for chunk in iter(lambda: f.read(COPY_CHUNK), b''):
             h.update(chunk)
     return h.hexdigest()
 
 
-def parse_headers(lines: list[str], min_level: int = 1, max_level: int = 2) -> list[dict]:
-    """解析指定层级范围的标题行及其位置（0-based）。"""
-    headers = []
-    for i, raw in enumerate(lines):
-        line = raw.rstrip('\n')
-        for level in range(min_level, max_level + 1):
-            prefix = '#' * level + ' '
-            deeper = '#' * (level + 1) + ' '
-            if line.startswith(prefix) and not line.startswith(deeper):
-                headers.append({'line': i, 'level': level, 'title': line[len(prefix):].strip()})
-                break
-    return headers
+def resolve_sources(spec: str | list[str]) -> list[Path]:
+    """md_file 配置 → 源文档列表：单个文件、文件列表，或目录（其下直接包含的 *.md，按文件名排序）。"""
+    files: list[Path] = []
+    for item in spec if isinstance(spec, list) else [spec]:
+        p = Path(item)
+        files.extend(sorted(f for f in p.glob('*.md') if f.is_file()) if p.is_dir() else [p])
+    return list(dict.fromkeys(files))
+
+
+def hash_sources(files: list[Path]) -> tuple[str, list[str]]:
+    """
+    并行计算各源文档的 MD5（hashlib 处理大块数据时释放 GIL），返回 (整体 hash, 各文件 hash)。
+    单文档时整体 hash 即文件 hash，与旧清单兼容；多文档时为各文件 hash 按顺序拼接后的 MD5。
+    """
+    if len(files) == 1:
+        digests = [file_md5(files[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(files), os.cpu_count() or 1)) as pool:
+            digests = list(pool.map(file_md5, files))
+    combined = digests[0] if len(digests) == 1 else text_md5(''.join(digests))
+    return combined, digests
+
+
+def estimate_tokens(text: str) -> float:
+    """按 CJK 加权的字符数估算 token 数（不依赖任何分词器）。"""
+    cjk = len(CJK_RE.findall(text))
+    other = len(text) - cjk - text.count(' ') - text.count('\t') - text.count('\n')
+    return cjk * CJK_TOKEN_WEIGHT + other / ASCII_CHARS_PER_TOKEN
+
+
+def line_token_prefix(lines: ConcatLines, tokenizer_file: str = '') -> tuple[array, str]:
+    """
+    逐行流式计算 token 数，返回 (token 前缀和 array('d')，长度为行数 + 1, 计数方式)。
+    配置了 tokenizer_file 且可导入 tokenizers 时用本地分词器（按批编码），否则回退离线估算。
+    """
+    if tokenizer_file:
+        try:
+            from tokenizers import Tokenizer
+            tok = Tokenizer.from_file(tokenizer_file)
+            prefix = array('d', [0.0])
+            for b in range(0, len(lines), TOKENIZER_BATCH_LINES):
+                for e in tok.encode_batch(lines[b:b + TOKENIZER_BATCH_LINES], add_special_tokens=False):
+                    prefix.append(prefix[-1] + len(e.ids))
+            return prefix, 'tokenizer'
+        except ImportError:
+            print('[提示] 未安装 tokenizers，忽略 tokenizer_file，改用离线估算')
+        except Exception as e:
+            print(f'[提示] 加载分词器失败（{e}），改用离线估算')
+    prefix = array('d', [0.0])
+    total = 0.0
+    for line in lines:
+        total += estimate_tokens(line)
+        prefix.append(total)
+    return prefix, 'estimate'
+
+
+def text_md5(text: str) -> str:
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+def iter_ranges(lines: ConcatLines, ranges: list[tuple[int, int]]):
+    """按块（COPY_CHUNK）产出若干行范围的源字节。"""
+    for s, e in ranges:
+        yield from lines.iter_bytes(s, e, COPY_CHUNK)
+
+
+def range_md5(lines: ConcatLines, ranges: list[tuple[int, int]], head: str = '') -> str:
+    """若干行范围的源字节（前置 head 文本）的 MD5，与对应文本的 text_md5 一致（LF 文件）。"""
+    h = hashlib.md5(head.encode('utf-8'))
+    for chunk in iter_ranges(lines, ranges):
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def utf8_chars(data: bytes) -> int:
+    """UTF-8 字节串的字符数（不计续字节），可按任意块边界分段累加。"""
+    return len(data) - len(data.translate(None, UTF8_LEAD_BYTES))
+
+
+def range_chars(lines: ConcatLines, ranges: list[tuple[int, int]]) -> int:
+    return sum(utf8_chars(chunk) for chunk in iter_ranges(lines, ranges))
+
+
+def section_entry(chapter: dict, lines: ConcatLines) -> dict:
+    """清单中的章节定位信息：所在源文档序号、文档内行 / 字节范围（左闭右开，行号 0-based）与大小。"""
+    s, e = chapter['start'], chapter['end']
+    k, local = lines.locate(s)
+    entry = {
+        'title':  chapter['title'],
+        'hash':   chapter['hash'],
+        'source': k,
+        'lines':  [local, local + e - s],
+        'bytes':  list(lines.parts[k].span(local, local + e - s)),
+        'chars':  range_chars(lines, [(s, e)]),
+        'tokens': chapter['tokens'],
+    }
+    if chapter.get('breadcrumb'):
+        entry['breadcrumb'] = chapter['breadcrumb']
+    return entry
+
+
+def line_runs(indices: list[int]) -> list[tuple[int, int]]:
+    """有序行号列表 → 连续行范围 [(start, end), ...]。"""
+    runs: list[tuple[int, int]] = []
+    for i in indices:
+        if runs and runs[-1][1] == i:
+            runs[-1] = (runs[-1][0], i + 1)
+        else:
+            runs.append((i, i + 1))
+    return runs
+
+
+def load_documents(files: list[Path]) -> tuple[ConcatLines, dict]:
+    """
+    以只读 mmap 打开各源文档并扫描结构，返回 (拼接后的行视图, 合并后的结构)。
+    合并结构中标题 / 代码块 / 表格的行号已加上所在文档的起始偏移（全局行号），
+    字节偏移仍相对各自文档。只常驻行偏移索引，正文按需解码；映射随进程结束释放（CLI 单次运行）。
+    """
+    parts: list[MappedLines] = []
+    scans: list[dict] = []
+    for path in files:
+        with open(path, 'rb') as src:
+            buf = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) if path.stat().st_size else b''
+        starts = line_index(buf)
+        scans.append(scan_markdown(buf, starts))
+        parts.append(MappedLines(buf, starts))
+    lines = ConcatLines(parts)
+
+    doc: dict = {'total_lines': len(lines), 'total_bytes': sum(d['total_bytes'] for d in scans),
+                 'headings': [], 'tree': [], 'fences': [], 'tables': []}
+    for off, d in zip(lines.offsets, scans):
+        for h in d['headings']:
+            h['line'] += off
+            h['end_line'] += off
+        doc['headings'].extend(d['headings'])
+        doc['tree'].extend(d['tree'])
+        doc['fences'].extend((s + off, e + off) for s, e in d['fences'])
+        doc['tables'].extend((s + off, e + off) for s, e in d['tables'])
+    return lines, doc
+
+
+def shared_key(chapter: dict, lines: ConcatLines) -> str:
+    """共享章节去重键：去掉编号的标题 + 正文（忽略行尾空白与空行），不同文档中的相同章节键相同。"""
+    body = lines.text(chapter['start'] + 1, chapter['end']).splitlines()
+    return text_md5(_anchor(chapter['title']) + '\n' + '\n'.join(ln.rstrip() for ln in body if ln.strip()))
+
+
+def parse_headers(doc: dict, min_level: int = 1, max_level: int = 2) -> list[dict]:
+    """从 md_structure 扫描结果中取指定层级范围的标题及其位置（0-based，已跳过代码块）。"""
+    return [{'line': h['line'], 'level': h['level'], 'title': h['title']}
+            for h in doc['headings'] if min_level <= h['level'] <= max_level]
 
 
 def is_shared(title: str, keywords: list[str]) -> bool:
@@ -87,70 +294,174 @@ def sanitize(name: str) -> str:
     return name.strip('_')[:40]
 
 
-def split_large_chapter(chapter: dict, lines: list[str], target: int) -> list[dict]:
-    """对超过 hard_max 的章节按 H3 子标题二次拆分。"""
-    start, end = chapter['start'], chapter['end']
-    sub_headers = []
-    for i in range(start, end):
-        raw = lines[i].rstrip('\n')
-        if raw.startswith('### ') and not raw.startswith('#### '):
-            sub_headers.append({'line': i, 'title': raw[4:].strip()})
-
-    if len(sub_headers) < 2:
-        return [chapter]
-
-    sub_chapters: list[dict] = []
-    header_line = start
-    header_end = sub_headers[0]['line']
-    if header_end > start:
-        sub_chapters.append({
-            'title': chapter['title'],
-            'level': chapter['level'],
-            'start': start,
-            'end': header_end,
-            'lines': header_end - start,
-            'shared': False,
-            'parent_title': chapter['title'],
-        })
+def _numbered_depth(line: str) -> int:
+    """编号段落（1. / 1.2 / 1.2.3.）的层级深度，非编号段落返回 0。"""
+    m = NUMBERED_RE.match(line)
+    return m.group(1).count('.') + 1 if m else 0
 
-    for j, sh in enumerate(sub_headers):
-        s = sh['line']
-        e = sub_headers[j + 1]['line'] if j + 1 < len(sub_headers) else end
-        sub_chapters.append({
-            'title': sh['title'],
-            'level': 3,
-            'start': s,
-            'end': e,
-            'lines': e - s,
-            'shared': False,
-            'parent_title': chapter['title'],
-        })
 
-    return sub_chapters
+def breadcrumb_text(chapter: dict) -> str:
+    """拆分片段开头的所属章节路径（片段不含这些祖先标题时补充上下文）。"""
+    crumbs = chapter.get('breadcrumb')
+    return f'> 所属章节：{" > ".join(crumbs)}\n\n' if crumbs else ''
+
 
+def split_large_chapter(chapter: dict, lines: ConcatLines, doc: dict, hard_max: int,
+                        tok_prefix: array, key: str = 'lines') -> list[dict]:
+    """
+    将超过 hard_max 的章节递归拆分，直到每个片段（含所属章节路径）不超过 hard_max。
 
-def group_chapters(chapters: list[dict], target: int) -> list[list[dict]]:
-    """将功能章节按目标行数贪心分组。"""
+    依次尝试更细的边界：H3–H6 子标题 → 编号段落（1. → 1.2 → 1.2.3.）→ 空行 →
+    不落在表格行之间的行边界 → 代码块外的任意行边界；代码块内部始终不切分。子标题片段各自成段，
+    编号段落及更细的边界按顺序尽量装满 hard_max。不以自身标题开头或位于子标题下的片段
+    记录 breadcrumb（祖先标题路径），写入模块时置于片段开头。单行或单个代码块即超过 hard_max 时
+    整段成片，是唯一可能超限的情况。子标题、代码块与表格范围取自 md_structure 扫描结果 doc。
+    """
+    start, end = chapter['start'], chapter['end']
+    sub_heads = [h for h in doc['headings'] if start < h['line'] < end]
+    # 代码块内部的行（含结束围栏）与表格第二行起，这些行之前不允许切分
+    fenced = {i for fs, fe in doc['fences'] if fs < end and fe > start for i in range(fs + 1, fe)}
+    table_inner = {i for ts, te in doc['tables'] if ts < end and te > start for i in range(ts + 1, te)}
+    pieces: list[dict] = []
+
+    def size(s: int, e: int, crumbs: list[str]) -> float:
+        extra = breadcrumb_text({'breadcrumb': crumbs})
+        if key == 'lines':
+            return e - s + extra.count('\n')
+        return tok_prefix[e] - tok_prefix[s] + estimate_tokens(extra)
+
+    def emit(s: int, e: int, path: list[str], level: int, headed: bool, how: str) -> None:
+        crumbs = path[:-1] if headed else path
+        if headed:
+            title = path[-1]
+        elif _numbered_depth(lines[s]):
+            title = lines[s].strip()[:30]
+        else:
+            title = f'{path[-1]}（续）'
+        extra = breadcrumb_text({'breadcrumb': crumbs})
+        pieces.append({
+            'title':        title,
+            'level':        level,
+            'start':        s,
+            'end':          e,
+            'lines':        e - s + extra.count('\n'),
+            'tokens':       round(tok_prefix[e] - tok_prefix[s] + estimate_tokens(extra)),
+            'shared':       False,
+            'parent_title': chapter['title'],
+            'breadcrumb':   crumbs,
+            'split_by':     how,
+        })
+
+    def pack(s: int, e: int, bounds: list[int], path: list[str], headed: bool) -> list[tuple[int, int]]:
+        """按候选边界顺序装箱：在加入下一段会超过 hard_max 前切分。"""
+        frags: list[tuple[int, int]] = []
+        fs = prev = s
+        for b in bounds + [e]:
+            crumbs = path[:-1] if headed and fs == s else path
+            if prev > fs and size(fs, b, crumbs) > hard_max:
+                frags.append((fs, prev))
+                fs = prev
+            prev = b
+        frags.append((fs, e))
+        return frags
+
+    def split(s: int, e: int, path: list[str], level: int, depth: int,
+              headed: bool, how: str, stage: int = 0) -> None:
+        if e - s <= 1 or size(s, e, path[:-1] if headed else path) <= hard_max:
+            emit(s, e, path, level, headed, how)
+            return
+
+        if stage == 0:
+            for lv in range(level + 1, 7):
+                heads = [h for h in sub_heads if s < h['line'] < e and h['level'] == lv]
+                if heads:
+                    split(s, heads[0]['line'], path, level, depth, headed, f'H{lv}')
+                    for j, h in enumerate(heads):
+                        he = heads[j + 1]['line'] if j + 1 < len(heads) else e
+                        split(h['line'], he, path + [h['title']], lv, 0, True, f'H{lv}')
+                    return
+            for d in range(depth + 1, 7):
+                nums = [i for i in range(s + 1, e) if i not in fenced and _numbered_depth(lines[i]) == d]
+                if nums:
+                    for fs, fe in pack(s, e, nums, path, headed):
+                        split(fs, fe, path, level, d, headed and fs == s, '编号段落')
+                    return
+
+        # 结构边界用尽：空行 → 非表格内部行 → 代码块外任意行
+        fallbacks = [
+            ('空行', lambda i: i not in fenced and not lines[i - 1].strip()),
+            ('表格安全行', lambda i: i not in fenced and i not in table_inner),
+            ('行', lambda i: i not in fenced),
+        ]
+        for st in range(max(stage, 1), len(fallbacks) + 1):
+            name, ok = fallbacks[st - 1]
+            bounds = [i for i in range(s + 1, e) if ok(i)]
+            if bounds:
+                for fs, fe in pack(s, e, bounds, path, headed):
+                    split(fs, fe, path, level, depth, headed and fs == s, name, st + 1)
+                return
+        emit(s, e, path, level, headed, how)   # 剩余部分整体在一个代码块内，保留完整（可能超过 hard_max）
+
+    split(start, end, [chapter['title']], chapter['level'], 0, True, f'H{chapter["level"]}')
+    return pieces if len(pieces) > 1 else [chapter]
+
+
+def oversize_fences(group: list[dict], doc: dict, lines: ConcatLines, md_files: list[Path]) -> list[dict]:
+    """
+    超限模块的成因排查：与模块章节重叠的代码块，按块内被遮住的 # 标题行数、块长度降序取前 3 个。
+    多出的一行 ``` 会与后面的围栏配对，把其间的标题（章节边界）一并吞进代码块，是最常见的原因。
+    """
+    found = []
+    for fs, fe in doc['fences']:
+        if not any(fs < c['end'] and fe > c['start'] for c in group):
+            continue
+        hidden = 0
+        for i in range(fs + 1, fe):
+            m = LINE_TOKEN_RE.match(lines[i])
+            hidden += bool(m and m.group('hashes'))
+        k, local = lines.locate(fs)
+        _, local_end = lines.locate(fe - 1)
+        found.append({'file': md_files[k].name, 'lines': [local + 1, local_end + 1],
+                      'length': fe - fs, 'hidden_headings': hidden})
+    found.sort(key=lambda f: (-f['hidden_headings'], -f['length']))
+    return found[:3]
+
+
+def describe_oversize(entry: dict, unit: str, hard: int) -> str:
+    """超限模块的一行提示（拆分时与跳过时的摘要共用）。"""
+    text = f'模块 {entry["index"]:02d} 功能章节 {entry["size"]} {unit}，超过上限 {hard} {unit}'
+    fences = entry.get('fences') or []
+    if fences:
+        f = fences[0]
+        text += (f'；疑因 {f["file"]} 第 {f["lines"][0]}–{f["lines"][1]} 行的代码块（{f["length"]} 行'
+                 + (f'，遮住 {f["hidden_headings"]} 个 # 标题行' if f['hidden_headings'] else '')
+                 + '）不可切分，请检查该处是否有多余或未闭合的 ``` / ~~~')
+    return text
+
+
+def group_chapters(chapters: list[dict], target: int, key: str = 'lines') -> list[list[dict]]:
+    """将功能章节按目标大小贪心分组（现仅作为清单中均衡度对比的基线）。"""
     groups: list[list[dict]] = []
     current: list[dict] = []
     current_size = 0
 
     for ch in chapters:
-        if current and current_size + ch['lines'] > target:
+        if current and current_size + ch[key] > target:
             groups.append(current)
             current = [ch]
-            current_size = ch['lines']
+            current_size = ch[key]
         else:
             current.append(ch)
-            current_size += ch['lines']
+            current_size += ch[key]
 
     if current:
         groups.append(current)
     return groups
 
 
-def merge_small_groups(groups: list[list[dict]], min_lines: int) -> list[list[dict]]:
-    """将行数过少的模块合并到相邻模块。"""
+def merge_small_groups(groups: list[list[dict]], min_lines: int,
+                       key: str = 'lines') -> list[list[dict]]:
+    """将过小的模块合并到相邻模块。"""
     if len(groups) <= 1:
         return groups
 
@@ -158,7 +469,7 @@ def merge_small_groups(groups: list[list[dict]], min_lines: int) -> list[list[di
     i = 0
     while i < len(groups):
         g = groups[i]
-        g_size = sum(c['lines'] for c in g)
+        g_size = sum(c[key] for c in g)
 
         if g_size < min_lines and merged:
             merged[-1].extend(g)
@@ -171,6 +482,297 @@ def merge_small_groups(groups: list[list[dict]], min_lines: int) -> list[list[di
     return merged
 
 
+def _group_cost(size: int, target: int, min_lines: int) -> tuple[int, int]:
+    """分组代价：(低于 min_lines 的缺口, 与 target 的偏差平方)，按字典序比较。"""
+    return max(min_lines - size, 0), (size - target) ** 2
+
+
+def partition_chapters(chapters: list[dict], target: int, hard_max: int,
+                       min_lines: int, key: str = 'lines',
+                       links: dict[int, dict[int, float]] | None = None,
+                       ref_penalty: float = 0.0) -> list[list[dict]]:
+    """
+    按章节顺序做最优连续分组（动态规划）。
+
+    约束与目标：
+    - 多章节分组不超过 hard_max（单个章节本身超限时只能独占一组）
+    - 优先使各组不低于 min_lines，其次使各组与 target 的偏差平方和
+      加上被切断引用的惩罚（links 为章节 seq → {seq: 权重}，每单位权重计 ref_penalty）最小
+    best[i] 为前 i 个章节的最小代价，只回看总大小不超过 hard_max 的窗口，
+    复杂度 O(n·k)，k 为单组最多容纳的章节数。key 为大小字段（'lines' 或 'tokens'）。
+    """
+    n = len(chapters)
+    prefix = [0]
+    for ch in chapters:
+        prefix.append(prefix[-1] + ch[key])
+
+    # 只统计本次参与分组的章节之间的引用（区间外的引用与分法无关）
+    links = links if ref_penalty else {}
+    loc = {ch['seq']: k for k, ch in enumerate(chapters) if 'seq' in ch}
+    adj = [[(loc[nb], w) for nb, w in links.get(ch.get('seq'), {}).items() if nb in loc] for ch in chapters]
+    deg = [sum(w for _, w in a) for a in adj]
+
+    best: list[tuple[int, float] | None] = [None] * (n + 1)
+    best[0] = (0, 0)
+    cut = [0] * (n + 1)
+    for i in range(1, n + 1):
+        deg_sum = internal = 0.0
+        for j in range(i - 1, -1, -1):
+            size = prefix[i] - prefix[j]
+            if size > hard_max and j < i - 1:
+                break
+            deg_sum += deg[j]
+            internal += sum(w for b, w in adj[j] if j < b < i)
+            short, dev = _group_cost(size, target, min_lines)
+            # 组外引用 = 度数和 − 2×组内引用；每条被切断的引用在两侧各计一半
+            penalty = ref_penalty * (deg_sum - 2 * internal) / 2
+            cost = (best[j][0] + short, best[j][1] + dev + penalty)
+            if best[i] is None or cost < best[i]:
+                best[i] = cost
+                cut[i] = j
+
+    groups: list[list[dict]] = []
+    i = n
+    while i > 0:
+        groups.append(chapters[cut[i]:i])
+        i = cut[i]
+    groups.reverse()
+    return groups
+
+
+def balance_stats(groups: list[list[dict]], target: int, key: str = 'lines') -> dict:
+    """分组均衡度统计（功能章节大小，单位由 key 决定）。"""
+    sizes = [sum(c[key] for c in g) for g in groups]
+    if not sizes:
+        return {'modules': 0}
+    mean = sum(sizes) / len(sizes)
+    return {
+        'modules':       len(sizes),
+        'min':           min(sizes),
+        'max':           max(sizes),
+        'mean':          round(mean, 1),
+        'stdev':         round((sum((s - mean) ** 2 for s in sizes) / len(sizes)) ** 0.5, 1),
+        'max_deviation': max(abs(s - target) for s in sizes),
+    }
+
+
+def build_term_regex(terms: list[str]) -> re.Pattern | None:
+    """
+    将多个字面量术语编译为一个按公共前缀组织的正则（trie 正则），单次 finditer 即可
+    同时匹配全部术语，且同一位置优先匹配最长术语。
+    """
+    trie: dict = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def emit(node: dict) -> str:
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ''
+        body = alts[0] if len(alts) == 1 else '(?:' + '|'.join(alts) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return re.compile(emit(trie)) if trie else None
+
+
+def _anchor(title: str) -> str:
+    return ANCHOR_PREFIX_RE.sub('', title.replace('（续）', '')).strip()
+
+
+def reference_graph(func_chs: list[dict], lines: ConcatLines, doc: dict) -> dict[tuple[int, int], int]:
+    """
+    构建章节引用图：章节标题及其内部子标题作为锚点，统计每个章节正文中提及其他章节锚点的次数。
+    返回 {(提及方 seq, 被提及方 seq): 次数}。多个章节共有的锚点（如「业务规则」）和被过多章节
+    提及的锚点视为通用词，不计入。
+    """
+    owners: dict[str, set[int]] = {}
+    for ch in func_chs:
+        names = [ch['title']] + [h['title'] for h in doc['headings']
+                                 if ch['start'] < h['line'] < ch['end']]
+        for name in names:
+            anchor = _anchor(name)
+            if len(anchor) >= MIN_ANCHOR_LEN:
+                owners.setdefault(anchor, set()).add(ch['seq'])
+    anchors = {a: next(iter(o)) for a, o in owners.items() if len(o) == 1}
+    term_re = build_term_regex(list(anchors))
+    if term_re is None:
+        return {}
+
+    hits: dict[str, dict[int, int]] = {}
+    for ch in func_chs:
+        text = lines.text(ch['start'], ch['end'])
+        for m in term_re.finditer(text):
+            if anchors[m.group()] != ch['seq']:
+                counts = hits.setdefault(m.group(), {})
+                counts[ch['seq']] = counts.get(ch['seq'], 0) + 1
+
+    max_df = max(3, len(func_chs) // 3)
+    mentions: dict[tuple[int, int], int] = {}
+    for anchor, counts in hits.items():
+        if len(counts) > max_df:
+            continue
+        for src, n in counts.items():
+            pair = (src, anchors[anchor])
+            mentions[pair] = mentions.get(pair, 0) + n
+    return mentions
+
+
+def reference_links(mentions: dict[tuple[int, int], int]) -> dict[int, dict[int, float]]:
+    """无向引用权重：每个有提及的方向计 1（避免长章节的大量重复提及淹没大小目标）。"""
+    links: dict[int, dict[int, float]] = {}
+    for a, b in mentions:
+        links.setdefault(a, {})[b] = links.get(a, {}).get(b, 0) + 1
+        links.setdefault(b, {})[a] = links.get(b, {}).get(a, 0) + 1
+    return links
+
+
+def cross_module_mentions(groups: list[list[dict]], mentions: dict[tuple[int, int], int]) -> int:
+    """分组后被切到不同模块的引用提及总数。"""
+    module_of = {c['seq']: k for k, g in enumerate(groups) for c in g}
+    return sum(n for (a, b), n in mentions.items() if module_of[a] != module_of[b])
+
+
+def _term_aliases(raw: str) -> list[str]:
+    """术语及其括号内的全称 / 别名，如「SKU（库存单位）」→ ['SKU', '库存单位']。"""
+    raw = raw.replace('**', '').replace('`', '')
+    return [t.strip() for t in TERM_SPLIT_RE.split(raw) if len(t.strip()) >= 2]
+
+
+def build_glossary(shared_chs: list[dict], lines: ConcatLines, doc: dict) -> dict | None:
+    """
+    解析术语表类共享章节的条目，返回
+    {'order': 共享前置全部行号, 'fixed': 始终保留的行号, 'entries': [(别名, 行号), ...],
+     'owners': {别名: [条目序号]}, 'regex': 全部别名的 trie 正则}；没有可过滤条目时返回 None。
+    列表项（含缩进续行）与表格数据行各为一个条目；标题、表头、说明文字等结构行始终保留，
+    非术语表章节整段保留。
+    """
+    order: list[int] = []
+    fixed: set[int] = set()
+    entries: list[tuple[list[str], list[int]]] = []
+    for ch in shared_chs:
+        rng = range(ch['start'], ch['end'])
+        order.extend(rng)
+        if not any(kw in ch['title'] for kw in GLOSSARY_KEYWORDS):
+            fixed.update(rng)
+            continue
+        table_rows = {i: ts for ts, te in doc['tables'] if ts < ch['end'] and te > ch['start']
+                      for i in range(ts, te)}
+        current: list[int] | None = None
+        for i in rng:
+            line = lines[i]
+            if i in table_rows:
+                current = None
+                cells = [c.strip() for c in line.strip().strip('|').split('|')]
+                aliases = _term_aliases(cells[0]) if i - table_rows[i] >= 2 and cells else []
+                if aliases:
+                    entries.append((aliases, [i]))
+                else:
+                    fixed.add(i)          # 表头 / 分隔行
+                continue
+            m = LIST_TERM_RE.match(line)
+            if m:
+                current = [i]
+                entries.append((_term_aliases(m.group(1) or m.group(2)), current))
+            elif current is not None and line.strip() and line[:1] in ' \t' and not LIST_ITEM_RE.match(line):
+                current.append(i)         # 条目的缩进续行
+            else:
+                current = None
+                fixed.add(i)
+
+    entries = [(a, idx) for a, idx in entries if a]
+    if not entries:
+        return None
+    owners: dict[str, list[int]] = {}
+    for k, (aliases, _) in enumerate(entries):
+        for alias in aliases:
+            owners.setdefault(alias, []).append(k)
+    return {'order': order, 'fixed': fixed, 'entries': entries,
+            'owners': owners, 'regex': build_term_regex(list(owners))}
+
+
+def _matched_entries(glossary: dict, text: str) -> set[int]:
+    """多模式匹配文本中提及的术语条目；纯字母数字的别名要求前后不是字母数字（避免 ID 命中 IDLE）。"""
+    hit: set[int] = set()
+    for m in glossary['regex'].finditer(text):
+        alias, (s, e) = m.group(), m.span()
+        if alias.isascii() and alias.isalnum() and (
+                (s > 0 and text[s - 1].isascii() and text[s - 1].isalnum())
+                or (e < len(text) and text[e].isascii() and text[e].isalnum())):
+            continue
+        hit.update(glossary['owners'][alias])
+    return hit
+
+
+def select_prefix_lines(glossary: dict, lines: ConcatLines, text: str) -> tuple[list[int], int]:
+    """
+    按模块正文裁剪共享前置，返回 (保留的行号（原顺序）, 引用的条目数)。
+    已选条目的释义中提及的其他术语一并保留，直到不再新增。
+    """
+    selected = _matched_entries(glossary, text)
+    frontier = selected
+    while frontier:
+        defs = ''.join(lines[i] for k in frontier for i in glossary['entries'][k][1])
+        frontier = _matched_entries(glossary, defs) - selected
+        selected |= frontier
+    keep = set(glossary['fixed'])
+    for k in selected:
+        keep.update(glossary['entries'][k][1])
+    return [i for i in glossary['order'] if i in keep], len(selected)
+
+
+def plan_incremental(old_modules: list[dict], func_chs: list[dict], target: int, hard_max: int,
+                     min_size: int, key: str = 'lines',
+                     links: dict[int, dict[int, float]] | None = None,
+                     ref_penalty: float = 0.0) -> tuple[list[tuple[int, list[dict], bool]], list[dict]]:
+    """
+    增量重拆：按章节内容 hash 将新章节序列与旧模块对齐。
+
+    旧模块的章节在新文档中原样、连续出现 → 保留原序号（clean）；
+    相邻 clean 模块之间剩余的新章节重新最优分组，优先复用该区间内失配旧模块的序号，
+    不够时分配新序号，多余的旧模块视为已移除。
+    返回 ([(序号, 章节列表, 是否 clean), ...]（文档顺序）, 被移除的旧模块)。
+    """
+    positions: dict[str, list[int]] = {}
+    for i, ch in enumerate(func_chs):
+        positions.setdefault(ch['hash'], []).append(i)
+
+    plan: list[tuple[int, list[dict], bool]] = []
+    removed: list[dict] = []
+    pending: list[dict] = []
+    next_index = max(m['index'] for m in old_modules) + 1
+    pos = 0
+
+    def flush_gap(end: int) -> None:
+        nonlocal next_index
+        gap = func_chs[pos:end]
+        groups = partition_chapters(gap, target, hard_max, min_size, key, links, ref_penalty) if gap else []
+        reuse = [m['index'] for m in pending]
+        for k, group in enumerate(groups):
+            if k < len(reuse):
+                idx = reuse[k]
+            else:
+                idx = next_index
+                next_index += 1
+            plan.append((idx, group, False))
+        removed.extend(pending[len(groups):])
+        pending.clear()
+
+    for m in old_modules:
+        hashes = m['chapter_hashes']
+        start = next((i for i in positions.get(hashes[0], []) if i >= pos), None) if hashes else None
+        if start is not None and [c['hash'] for c in func_chs[start:start + len(hashes)]] == hashes:
+            flush_gap(start)
+            plan.append((m['index'], func_chs[start:start + len(hashes)], True))
+            pos = start + len(hashes)
+        else:
+            pending.append(m)
+    flush_gap(len(func_chs))
+    return plan, removed
+
+
 def main() -> int:
     setup_encoding()
 
@@ -179,7 +781,7 @@ def main() -> int:
     args = ap.parse_args()
 
     cfg = load_config(args.config)
-    md_file    = Path(cfg['md_file'])
+    md_files   = resolve_sources(cfg['md_file'])
     output_dir = Path(cfg['output_dir'])
     target     = int(cfg.get('target_lines', 600))
     hard_max   = int(cfg.get('hard_max', 800))
@@ -187,157 +789,404 @@ def main() -> int:
     extra_kw   = cfg.get('shared_keywords', [])
     all_kw     = DEFAULT_SHARED_KEYWORDS + [kw for kw in extra_kw if kw not in DEFAULT_SHARED_KEYWORDS]
 
+    # token 模式：分组 / 超大章节拆分 / 小模块合并均以估算 token 数为准
+    token_mode = bool(cfg.get('target_tokens'))
+    if token_mode:
+        size_key    = 'tokens'
+        unit        = 'tokens'
+        size_target = int(cfg['target_tokens'])
+        size_hard   = int(cfg.get('hard_max_tokens') or size_target * 4 // 3)
+        size_min    = int(cfg.get('min_tokens') or size_target * min_lines // target)
+    else:
+        size_key, unit = 'lines', '行'
+        size_target, size_hard, size_min = target, hard_max, min_lines
+
+    incremental = cfg.get('incremental', True)
+
+    if not md_files:
+        print(f'错误：{cfg["md_file"]} 下没有 md 文件', file=sys.stderr)
+        return 1
+    missing = [f for f in md_files if not f.exists()]
+    source_hash, source_digests = hash_sources(md_files) if not missing else ('', [])
+
     manifest_path = output_dir / '_manifest.json'
+    previous: dict | None = None
     if manifest_path.exists():
         with open(manifest_path, 'r', encoding='utf-8') as f:
             mf = json.load(f)
 
-        if md_file.exists() and 'source_hash' in mf:
-            current_hash = file_md5(md_file)
-            if current_hash != mf['source_hash']:
+        changed = False
+        if not missing and 'source_hash' in mf:
+            current_hash = source_hash
+            changed = current_hash != mf['source_hash']
+            can_diff = all('chapter_hashes' in m for m in mf['modules'])
+            if changed and incremental and can_diff:
+                print(f'源文件已变更（{mf["source_hash"][:12]}... → {current_hash[:12]}...），执行增量重拆。')
+                previous = mf
+            elif changed:
                 print(f'⚠️ 源文件已变更（hash 不匹配），拆分产物可能过期。')
                 print(f'  记录: {mf["source_hash"][:12]}...  当前: {current_hash[:12]}...')
+                if not can_diff:
+                    print('  旧清单缺少章节 hash，无法增量重拆。')
                 print(f'  若需重新拆分，请删除 {output_dir} 目录后重新执行。')
 
-        print(f'[跳过] 拆分清单已存在，共 {mf["module_count"]} 个模块：')
-        for m in mf['modules']:
-            ch_desc = ' + '.join(m['chapters'][:3])
-            print(f'  模块 {m["index"]:02d}: {ch_desc} ({m["total_lines"]} 行) → {m["filename"]}')
-        return 0
-
-    if not md_file.exists():
-        print(f'错误：源文件不存在: {md_file}', file=sys.stderr)
+        if previous is None:
+            dirty = set(mf.get('dirty_modules', []))
+            print(f'[跳过] 拆分清单已存在，共 {mf["module_count"]} 个模块：')
+            for m in mf['modules']:
+                ch_desc = ' + '.join(m['chapters'][:3])
+                mark = ' [dirty]' if m['index'] in dirty else ''
+                print(f'  模块 {m["index"]:02d}: {ch_desc} ({m["total_lines"]} 行) → {m["filename"]}{mark}')
+            if dirty:
+                print(f'[备注] 上次增量重拆后需重新生成的模块: {", ".join(f"{i:02d}" for i in sorted(dirty))}')
+            unit_of = 'tokens' if 'hard_max_tokens' in mf else '行'
+            hard_of = mf.get('hard_max_tokens', mf.get('hard_max'))
+            for entry in mf.get('oversize_modules', []):
+                print(f'[警告] {describe_oversize(entry, unit_of, hard_of)}')
+            return 0
+
+    if missing:
+        print(f'错误：源文件不存在: {", ".join(map(str, missing))}', file=sys.stderr)
         return 1
 
-    with open(md_file, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+    lines, doc = load_documents(md_files)
     total = len(lines)
-
-    if total <= hard_max:
-        print(f'[跳过] 文档共 {total} 行，未超过阈值（{hard_max} 行），无需拆分。')
+    multi = len(md_files) > 1
+    if multi:
+        print(f'源文档 {len(md_files)} 个，共 {total} 行：')
+        for k, f in enumerate(md_files):
+            print(f'  [{k}] {f.name}（{lines.offsets[k + 1] - lines.offsets[k]} 行）')
+
+    tok_prefix, token_counter = line_token_prefix(lines, cfg.get('tokenizer_file', ''))
+    total_tokens = round(tok_prefix[-1])
+
+    doc_size = total_tokens if token_mode else total
+    if doc_size <= size_hard:
+        print(f'[跳过] 文档共 {doc_size} {unit}，未超过阈值（{size_hard} {unit}），无需拆分。')
         return 0
 
-    source_hash = file_md5(md_file)
+    # 插入的分隔线 / 章节路径沿用（首个）源文件的换行风格
+    first = next((p for p in lines.parts if len(p)), lines.parts[0])
+    newline = '\r\n' if total and first.buf[first.starts[1] - 2:first.starts[1]] == b'\r\n' else '\n'
+
+    def encode(text: str) -> bytes:
+        return text.replace('\n', newline).encode('utf-8')
 
-    headers = parse_headers(lines, min_level=1, max_level=2)
-    if not headers:
+    headers = parse_headers(doc, min_level=1, max_level=2)
+    if not headers and not multi:
         print(f'[警告] 文档共 {total} 行，未发现 H1/H2 标题，无法自动拆分。\n'
               f'       请手动将文档拆分后放入 {output_dir}，并创建 _manifest.json。')
         return 1
 
+    # 章节不跨文档：每个文档的最后一个章节止于文档末尾；多文档时无 H1/H2 的文档整篇作为一个章节
     chapters: list[dict] = []
-    for i, h in enumerate(headers):
-        start = h['line']
-        end   = headers[i + 1]['line'] if i + 1 < len(headers) else total
-        chapters.append({
-            'title':  h['title'],
-            'level':  h['level'],
-            'start':  start,
-            'end':    end,
-            'lines':  end - start,
-            'shared': is_shared(h['title'], all_kw),
-        })
-
-    shared_chs = [c for c in chapters if c['shared']]
+    for k, f in enumerate(md_files):
+        lo, hi = lines.offsets[k], lines.offsets[k + 1]
+        heads = [h for h in headers if lo <= h['line'] < hi]
+        if not heads and hi > lo:
+            heads = [{'title': f.stem, 'level': 1, 'line': lo}]
+        for i, h in enumerate(heads):
+            start = h['line']
+            end   = heads[i + 1]['line'] if i + 1 < len(heads) else hi
+            chapters.append({
+                'title':  h['title'],
+                'level':  h['level'],
+                'start':  start,
+                'end':    end,
+                'lines':  end - start,
+                'tokens': round(tok_prefix[end] - tok_prefix[start]),
+                'shared': is_shared(h['title'], all_kw),
+            })
+    for ch in chapters:
+        ch['hash'] = range_md5(lines, [(ch['start'], ch['end'])])
+
+    # 各文档重复的共享章节（如相同的术语表）只保留首次出现的一份
+    shared_chs: list[dict] = []
+    deduped: list[str] = []
+    seen_shared: set[str] = set()
+    for c in chapters:
+        if c['shared']:
+            key = shared_key(c, lines)
+            if key in seen_shared:
+                deduped.append(f'{c["title"]}（{md_files[lines.locate(c["start"])[0]].name}）')
+            else:
+                seen_shared.add(key)
+                shared_chs.append(c)
     func_chs   = [c for c in chapters if not c['shared']]
 
     expanded_func: list[dict] = []
-    h3_split_notes: list[str] = []
+    split_notes: list[str] = []
     for ch in func_chs:
-        if ch['lines'] > hard_max:
-            subs = split_large_chapter(ch, lines, target)
+        if ch[size_key] > size_hard:
+            subs = split_large_chapter(ch, lines, doc, size_hard, tok_prefix, size_key)
             if len(subs) > 1:
-                h3_split_notes.append(
-                    f'「{ch["title"]}」({ch["lines"]}行) 按 H3 拆为 {len(subs)} 段')
+                for sub in subs:
+                    sub['hash'] = range_md5(lines, [(sub['start'], sub['end'])], breadcrumb_text(sub))
+                how = '/'.join(dict.fromkeys(sub['split_by'] for sub in subs))
+                split_notes.append(
+                    f'「{ch["title"]}」({ch[size_key]}{unit}) 按 {how} 拆为 {len(subs)} 段')
                 expanded_func.extend(subs)
             else:
                 expanded_func.append(ch)
         else:
             expanded_func.append(ch)
     func_chs = expanded_func
+    for seq, ch in enumerate(func_chs):
+        ch['seq'] = seq
+
+    # 章节引用图：被切到不同模块的引用按 reference_weight 计入分组代价
+    mentions    = reference_graph(func_chs, lines, doc)
+    links       = reference_links(mentions)
+    ref_penalty = float(cfg.get('reference_weight', 1.0)) * (size_target / 10) ** 2
 
-    shared_lines: list[str] = []
-    for c in shared_chs:
-        shared_lines.extend(lines[c['start']:c['end']])
+    shared_ranges = [(c['start'], c['end']) for c in shared_chs]
+    shared_count  = sum(e - s for s, e in shared_ranges)
+    shared_tokens = sum(c['tokens'] for c in shared_chs)
+    shared_hash   = range_md5(lines, shared_ranges)
+    glossary = build_glossary(shared_chs, lines, doc) if cfg.get('filter_shared_prefix') and shared_chs else None
 
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    if shared_lines:
+    if shared_ranges:
         shared_path = output_dir / '_shared_prefix.md'
-        with open(shared_path, 'w', encoding='utf-8') as f:
-            f.writelines(shared_lines)
-        print(f'共享前置: {len(shared_chs)} 个章节，{len(shared_lines)} 行 → _shared_prefix.md')
+        with atomic_write(shared_path, 'wb') as f:
+            for chunk in iter_ranges(lines, shared_ranges):
+                f.write(chunk)
+        print(f'共享前置: {len(shared_chs)} 个章节，{shared_count} 行 / ~{shared_tokens} tokens → _shared_prefix.md')
         shared_titles = '、'.join(c['title'] for c in shared_chs)
         print(f'  章节：{shared_titles}')
+        if deduped:
+            print(f'  跨文档去重（与已收录章节内容相同）：{"、".join(deduped)}')
+        if glossary:
+            print(f'  按引用裁剪：术语表共 {len(glossary["entries"])} 个条目，各模块只保留正文中提及的条目')
+        elif cfg.get('filter_shared_prefix'):
+            print('  [提示] 共享前置中未识别到术语表条目，仍整段追加到每个模块')
     else:
+        (output_dir / '_shared_prefix.md').unlink(missing_ok=True)
+        remove_marker(output_dir / '_shared_prefix.md')
         print('未识别到共享前置章节（如有需要可在 shared_keywords 中追加关键词）')
 
     if not func_chs:
         print('[警告] 所有章节均被识别为共享前置，没有功能章节可拆分。')
         return 1
 
-    groups = group_chapters(func_chs, target)
-    groups = merge_small_groups(groups, min_lines)
+    greedy_groups = merge_small_groups(
+        group_chapters(func_chs, size_target, size_key), size_min, size_key)
+    removed: list[dict] = []
+    if previous is not None:
+        plan, removed = plan_incremental(previous['modules'], func_chs, size_target, size_hard,
+                                         size_min, size_key, links, ref_penalty)
+    else:
+        plan = [(idx, g, False) for idx, g in enumerate(
+            partition_chapters(func_chs, size_target, size_hard, size_min, size_key, links, ref_penalty), 1)]
+    groups = [g for _, g, _ in plan]
+    partition_stats = {
+        'unit':    size_key,
+        'greedy':  balance_stats(greedy_groups, size_target, size_key),
+        'optimal': balance_stats(groups, size_target, size_key),
+        'cross_module_mentions': {
+            'size_only': cross_module_mentions(
+                partition_chapters(func_chs, size_target, size_hard, size_min, size_key), mentions),
+            'chosen':    cross_module_mentions(groups, mentions),
+        },
+    }
+    module_of = {c['seq']: idx for idx, g, _ in plan for c in g}
+    title_of  = {c['seq']: c['title'] for c in func_chs}
 
+    old_by_index = {m['index']: m for m in previous['modules']} if previous else {}
+    now = datetime.now().strftime('%Y-%m-%d %H:%M')
+    now_ns = time.time_ns()                 # 精确时间戳，供进度判断比较产出 mtime
     modules: list[dict] = []
+    dirty_modules: list[int] = []
+    oversize: list[dict] = []
     print(f'\n拆分方案（{len(groups)} 个模块）：')
 
-    for idx, group in enumerate(groups, 1):
+    for idx, group, clean in plan:
         ch_names  = [c['title'] for c in group]
-        safe_name = sanitize('_'.join(ch_names[:2]))
-        filename  = f'{idx:02d}_{safe_name}.md'
+        old       = old_by_index.get(idx)
+        if clean:
+            filename = old['filename']
+        else:
+            filename = f'{idx:02d}_{sanitize("_".join(ch_names[:2]))}.md'
         filepath  = output_dir / filename
 
-        module_content: list[str] = []
-        if shared_lines:
-            module_content.extend(shared_lines)
-            module_content.append('\n\n---\n\n')
-        for c in group:
-            module_content.extend(lines[c['start']:c['end']])
-
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.writelines(module_content)
+        if glossary:
+            module_text = ''.join(lines.text(c['start'], c['end']) for c in group)
+            prefix_idx, prefix_terms = select_prefix_lines(glossary, lines, module_text)
+            prefix_ranges = line_runs(prefix_idx)
+            prefix_tokens = round(sum(tok_prefix[e] - tok_prefix[s] for s, e in prefix_ranges))
+        else:
+            prefix_ranges, prefix_tokens = shared_ranges, shared_tokens
+        prefix_count = sum(e - s for s, e in prefix_ranges)
+        prefix_hash  = range_md5(lines, prefix_ranges)
+        # 模块内容由章节与（裁剪后的）共享前置共同决定，任一变化即需重写
+        dirty = not clean or prefix_hash != (old.get('prefix_hash') or previous.get('shared_hash'))
+
+        def module_chunks():
+            if prefix_ranges:
+                yield from iter_ranges(lines, prefix_ranges)
+                yield encode('\n\n---\n\n')
+            for j, c in enumerate(group):
+                if j and not lines[group[j - 1]['end'] - 1].endswith('\n'):
+                    yield encode('\n')   # 上一章节位于另一文档末尾且缺少换行
+                yield encode(breadcrumb_text(c))
+                yield from iter_ranges(lines, [(c['start'], c['end'])])
+
+        # 未变化的模块不重写，但同样按内容流式计算文件 hash / 大小，供下游校验新鲜度
+        rewrite = dirty or not filepath.exists()
+        file_hash = hashlib.md5()
+        file_bytes = file_chars = 0
+        with (atomic_write(filepath, 'wb') if rewrite else nullcontext()) as f:
+            for chunk in module_chunks():
+                file_hash.update(chunk)
+                file_bytes += len(chunk)
+                file_chars += utf8_chars(chunk)
+                if f:
+                    f.write(chunk)
+        if rewrite and old and old['filename'] != filename:
+            (output_dir / old['filename']).unlink(missing_ok=True)
+            remove_marker(output_dir / old['filename'])
+        if previous is not None and dirty:
+            dirty_modules.append(idx)
 
         func_line_count    = sum(c['lines'] for c in group)
-        total_module_lines = len(shared_lines) + func_line_count
+        total_module_lines = prefix_count + func_line_count
+        func_tokens        = sum(c['tokens'] for c in group)
+        total_tokens_mod   = prefix_tokens + func_tokens
         desc = ' + '.join(ch_names)
+        if previous is not None:
+            desc += ' [dirty]' if dirty else ' [未变化]'
         print(f'  模块 {idx:02d}: {desc}')
-        print(f'          功能章节 {func_line_count} 行，含共享前置共 {total_module_lines} 行 → {filename}')
+        print(f'          功能章节 {func_line_count} 行 / ~{func_tokens} tokens，'
+              f'含共享前置共 {total_module_lines} 行 / ~{total_tokens_mod} tokens → {filename}')
+        if glossary:
+            print(f'          共享前置按引用裁剪 {shared_count} → {prefix_count} 行'
+                  f'（引用术语 {prefix_terms} 条）')
+        func_size = func_tokens if token_mode else func_line_count
+        if func_size > size_hard:
+            # 只有不可切分的内容（超长代码块、单行）会让模块超限，记录成因供修正源文档
+            oversize.append({'index': idx, 'size': func_size, 'chapters': ch_names,
+                             'fences': oversize_fences(group, doc, lines, md_files)})
+            print(f'          [警告] {describe_oversize(oversize[-1], unit, size_hard)}')
+
+        seqs = {c['seq'] for c in group}
+        cross_refs = [
+            {'chapter': title_of[a], 'to_module': module_of[b], 'to_chapter': title_of[b], 'mentions': n}
+            for (a, b), n in sorted(mentions.items()) if a in seqs and module_of[b] != idx
+        ]
+        referenced_by = sorted({module_of[a] for a, b in mentions if b in seqs and module_of[a] != idx})
+        if cross_refs:
+            targets = dict.fromkeys(f'模块 {r["to_module"]:02d}「{r["to_chapter"]}」' for r in cross_refs)
+            print(f'          跨模块引用 → {"、".join(targets)}')
 
         modules.append({
-            'index':      idx,
-            'filename':   filename,
-            'chapters':   ch_names,
-            'func_lines': func_line_count,
-            'total_lines': total_module_lines,
+            'index':        idx,
+            'filename':     filename,
+            'chapters':     ch_names,
+            'func_lines':   func_line_count,
+            'total_lines':  total_module_lines,
+            'func_tokens':  func_tokens,
+            'total_tokens': total_tokens_mod,
+            'prefix_lines':  prefix_count,
+            'prefix_tokens': prefix_tokens,
+            'prefix_hash':   prefix_hash,
+            'file_hash':     file_hash.hexdigest(),
+            'file_bytes':    file_bytes,
+            'chars':         file_chars,
+            'chapter_hashes': [c['hash'] for c in group],
+            'sections':       [section_entry(c, lines) for c in group],
+            'cross_refs':     cross_refs,
+            'referenced_by':  referenced_by,
+            'content_updated': now if dirty or not old else old.get('content_updated', now),
+            'content_updated_ns': now_ns if dirty or not old else old.get('content_updated_ns'),
         })
+        if glossary:
+            modules[-1].update({
+                'prefix_terms':        prefix_terms,
+                'prefix_saved_lines':  shared_count - prefix_count,
+                'prefix_saved_tokens': shared_tokens - prefix_tokens,
+            })
+
+    for m in removed:
+        (output_dir / m['filename']).unlink(missing_ok=True)
+        remove_marker(output_dir / m['filename'])
 
     notes_parts = []
-    if h3_split_notes:
-        notes_parts.append('H3 二次拆分: ' + '; '.join(h3_split_notes))
+    if split_notes:
+        notes_parts.append('超大章节拆分: ' + '; '.join(split_notes))
+    if oversize:
+        over_ids = ', '.join(f'{o["index"]:02d}' for o in oversize)
+        notes_parts.append(f'超过上限的模块: {over_ids}（见 oversize_modules）')
 
     manifest = {
-        'source_file':             str(md_file),
+        # 多文档时 source_file 为各源文档的公共目录，逐个文档的信息见 source_files
+        'source_file':             str(md_files[0]) if not multi else os.path.commonpath(md_files),
         'source_hash':             source_hash,
+        'source_files':            [
+            {'path': str(f), 'hash': h, 'bytes': len(p.buf), 'lines': len(p)}
+            for f, h, p in zip(md_files, source_digests, lines.parts)
+        ],
+        'source_bytes':            doc['total_bytes'],
         'total_lines':             total,
-        'split_time':              datetime.now().strftime('%Y-%m-%d %H:%M'),
+        'total_tokens':            total_tokens,
+        'token_counter':           token_counter,
+        'split_time':              previous['split_time'] if previous else now,
         'target_lines_per_module': target,
         'hard_max':                hard_max,
         'min_lines_merge':         min_lines,
-        'has_shared_prefix':       bool(shared_lines),
-        'shared_line_count':       len(shared_lines),
+        'size_unit':               size_key,
+        'has_shared_prefix':       bool(shared_ranges),
+        'shared_line_count':       shared_count,
+        'shared_hash':             shared_hash,
+        'shared_prefix_mode':      'filtered' if glossary else 'full',
         'module_count':            len(modules),
+        'partition_stats':         partition_stats,
         'modules':                 modules,
     }
+    if deduped:
+        manifest['shared_deduped'] = deduped
+    if oversize:
+        manifest['oversize_modules'] = oversize
+    if glossary:
+        manifest['prefix_saved'] = {
+            'lines':  sum(m['prefix_saved_lines'] for m in modules),
+            'tokens': sum(m['prefix_saved_tokens'] for m in modules),
+        }
+    if previous is not None:
+        manifest['resplit_time']    = now
+        manifest['dirty_modules']   = dirty_modules
+        manifest['removed_modules'] = [m['index'] for m in removed]
+    if token_mode:
+        manifest['target_tokens']   = size_target
+        manifest['hard_max_tokens'] = size_hard
+        manifest['min_tokens']      = size_min
     if notes_parts:
         manifest['split_note'] = '；'.join(notes_parts)
 
-    with open(manifest_path, 'w', encoding='utf-8') as f:
+    # 清单最后写出：它的完成标记代表本次拆分（含全部模块文件）已完整结束
+    with atomic_write(manifest_path, 'w') as f:
         json.dump(manifest, f, ensure_ascii=False, indent=2)
 
+    g, o = partition_stats['greedy'], partition_stats['optimal']
+    print(f'\n分组均衡度（功能章节 {unit}）：贪心 {g["modules"]} 个模块 {g["min"]}–{g["max"]}（标准差 {g["stdev"]}）'
+          f' → 最优 {o["modules"]} 个模块 {o["min"]}–{o["max"]}（标准差 {o["stdev"]}）')
+    x = partition_stats['cross_module_mentions']
+    print(f'跨模块引用提及：仅按大小分组 {x["size_only"]} 处 → 考虑引用关联后 {x["chosen"]} 处'
+          f'（引用图共 {len(mentions)} 条有向边）')
+    if glossary:
+        saved = manifest['prefix_saved']
+        print(f'共享前置裁剪：{len(modules)} 个模块合计节省 {saved["lines"]} 行 / ~{saved["tokens"]} tokens')
     print(f'\n[完成] 拆分完毕，清单已写入: {manifest_path}')
-    if h3_split_notes:
-        print(f'[备注] {"; ".join(h3_split_notes)}')
+    if split_notes:
+        print(f'[备注] {"; ".join(split_notes)}')
+    for entry in oversize:
+        print(f'[警告] {describe_oversize(entry, unit, size_hard)}')
+    if previous is not None:
+        dirty_desc = ', '.join(f'{i:02d}' for i in dirty_modules) or '无'
+        print(f'[增量] 需重新生成的模块: {dirty_desc}')
+        if removed:
+            removed_desc = ', '.join(f'{idx:02d}' for idx in (m['index'] for m in removed))
+            print(f'[增量] 已移除的模块: {removed_desc}')
     return 0
 
 
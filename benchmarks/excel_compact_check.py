@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+excel_compact_check.py - 校验 excel_to_markdown.py 紧凑模式在不同字符串列类型下结果一致。
+
+功能：
+- 构造同一份含半角/全角空白、制表符、多余空行、纯空白单元格与 `Unnamed: N` 列的表格
+- 分别以 object 列与 string 列（pandas 3 默认的 pyarrow 字符串类型，正则走 RE2）执行 compact_dataframe
+- 两种列类型的结果须与期望值一致；任一失败（含抛出异常）退出码为 1，可直接挂到 CI
+
+用法：
+  python benchmarks/excel_compact_check.py
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / '.cursor' / 'skills' / 'testcasegen-excel2md' / 'scripts'
+sys.path.insert(0, str(SCRIPTS_DIR))
+import excel_to_markdown  # noqa: E402
+
+CELLS = {
+    '模块':      ['登录  模块', '　注册\t页面', None, '  '],
+    '说明':      ['第一行 \n\n  第二行', '', None, None],
+    'Unnamed: 2': [None, 'a　　b', None, None],
+}
+EXPECTED = {
+    '模块': ['登录 模块', '注册 页面'],
+    '说明': ['第一行\n第二行', None],
+    '':     [None, 'a b'],
+}
+
+
+def setup_encoding() -> None:
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(encoding='utf-8')
+    if hasattr(sys.stderr, 'reconfigure'):
+        sys.stderr.reconfigure(encoding='utf-8')
+
+
+def run_case(pd, dtype) -> str | None:
+    """返回失败原因；通过时返回 None。"""
+    df = pd.DataFrame({col: pd.Series(values, dtype=dtype) for col, values in CELLS.items()})
+    try:
+        result = excel_to_markdown.compact_dataframe(df)
+    except Exception as e:  # noqa: BLE001
+        return f'{type(e).__name__}: {e}'
+    actual = {col: [None if pd.isna(v) else v for v in result[col]] for col in result.columns}
+    if actual != EXPECTED:
+        return f'结果不符：{actual}'
+    return None
+
+
+def main() -> int:
+    setup_encoding()
+    try:
+        import pandas as pd
+    except ImportError:
+        print('[跳过] 未安装 pandas')
+        return 0
+
+    print(f'pandas {pd.__version__}')
+    failed = 0
+    for dtype in ('object', 'str'):
+        reason = run_case(pd, dtype)
+        print(f'  dtype={dtype:<7} ' + ('通过' if reason is None else f'失败 - {reason}'))
+        failed += reason is not None
+    if failed:
+        print(f'[失败] {failed} 种列类型下紧凑化结果异常')
+        return 1
+    print('[完成] 紧凑化结果一致')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
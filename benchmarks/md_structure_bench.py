@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+md_structure_bench.py - 对比共享 Markdown 结构扫描器与各脚本原先逐行 startswith 扫描的耗时。
+
+功能：
+- 生成一份 10 万行（可调）的合成需求文档：多级标题、编号段落、大表格、含 # 行的代码块
+- 基线：split_prd / build_knowledge_index / markdown_to_xmind 原先各自读文件、逐行判断标题的三遍扫描
+- 新实现：md_structure.read_markdown_structure 读一次、单个正则单遍扫描（同时给出代码块 / 表格 / 字节偏移）
+- 各跑若干次取最小值，输出耗时表；新实现超过预算时退出码为 1
+
+用法：
+  python benchmarks/md_structure_bench.py [--lines 100000] [--repeat 5] [--budget-ms 100]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / '.cursor' / 'skills' / 'testcasegen-split-prd' / 'scripts'
+sys.path.insert(0, str(SCRIPTS_DIR))
+from md_structure import read_markdown_structure  # noqa: E402
+
+
+def setup_encoding() -> None:
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(encoding='utf-8')
+    if hasattr(sys.stderr, 'reconfigure'):
+        sys.stderr.reconfigure(encoding='utf-8')
+
+
+def generate_doc(path: Path, total_lines: int) -> None:
+    """写入合成文档（代码块内含 # 注释行，基线会误判为标题）。"""
+    out: list[str] = ['# 需求规格说明书', '## 术语定义', '术语：说明', '']
+    chapter = 0
+    while len(out) < total_lines:
+        chapter += 1
+        out.append(f'## 功能{chapter} 页面')
+        for sec in range(1, 4):
+            out.append(f'### {chapter}.{sec} 业务规则')
+            out.extend(f'{chapter}.{sec}.{k} 规则说明：字段校验、状态流转与异常提示 {k}' for k in range(1, 15))
+            out.append('')
+            out.append(f'#### {chapter}.{sec} 字段定义')
+            out.append('| 字段 | 类型 | 必填 | 说明 |')
+            out.append('| --- | --- | --- | --- |')
+            out.extend(f'| field_{k} | string | 是 | 字段 {k} 的取值说明 |' for k in range(30))
+            out.append('')
+            out.extend(['```bash', '# 初始化脚本（代码块内的注释，不是标题）', 'echo init', '```', ''])
+    text = '\n'.join(out[:total_lines]) + '\n'
+    path.write_text(text, encoding='utf-8')
+
+
+def legacy_scans(path: Path) -> int:
+    """复现三个脚本原先的标题扫描：各读一遍文件、逐行 startswith。"""
+    found = 0
+    # split_prd.parse_headers：H1/H2
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f.readlines():
+            line = line.rstrip('\n')
+            for level in (1, 2):
+                if line.startswith('#' * level + ' ') and not line.startswith('#' * (level + 1) + ' '):
+                    found += 1
+                    break
+    # build_knowledge_index.extract_headings：H1/H2
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f.readlines():
+            s = line.strip()
+            if s.startswith('#') and len(s) - len(s.lstrip('#')) <= 2 and s.lstrip('#').strip():
+                found += 1
+    # markdown_to_xmind._is_heading：H2–H5
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f.read().split('\n'):
+            s = line.strip()
+            for level in (2, 3, 4, 5):
+                if s.startswith('#' * level + ' ') and not s.startswith('#' * (level + 1) + ' '):
+                    found += 1
+                    break
+    return found
+
+
+def best_ms(fn, repeat: int) -> tuple[float, object]:
+    best, result = float('inf'), None
+    for _ in range(max(repeat, 1)):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, (time.perf_counter() - t0) * 1000)
+    return best, result
+
+
+def main() -> int:
+    setup_encoding()
+
+    ap = argparse.ArgumentParser(description='Markdown 结构扫描器基准测试')
+    ap.add_argument('--lines', type=int, default=100_000, help='合成文档行数（默认 100000）')
+    ap.add_argument('--repeat', type=int, default=5, help='重复次数，取最小值（默认 5）')
+    ap.add_argument('--budget-ms', type=float, default=100, help='新实现单次扫描预算（毫秒，默认 100）')
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'bench.md'
+        generate_doc(path, args.lines)
+        size_mb = path.stat().st_size / 1024 / 1024
+
+        legacy_ms, legacy_found = best_ms(lambda: legacy_scans(path), args.repeat)
+        new_ms, doc = best_ms(lambda: read_markdown_structure(path), args.repeat)
+
+    print(f'合成文档：{doc["total_lines"]} 行，{size_mb:.1f} MB，{len(doc["headings"])} 个标题，'
+          f'{len(doc["fences"])} 个代码块，{len(doc["tables"])} 个表格')
+    print(f'基线三遍扫描共命中 {legacy_found} 个标题（含代码块内 # 行的误判）\n')
+    print(f'{"实现":<36} {"耗时(ms)":>9} {"行/秒":>12}')
+    for name, ms in (('基线：三脚本各自逐行扫描（3 遍读文件）', legacy_ms),
+                     ('md_structure：单正则单遍扫描', new_ms)):
+        print(f'{name:<36} {ms:>9.1f} {doc["total_lines"] / ms * 1000:>12,.0f}')
+    print(f'\n加速比 {legacy_ms / new_ms:.1f}x')
+
+    if new_ms > args.budget_ms:
+        print(f'[失败] 单遍扫描耗时 {new_ms:.1f}ms 超出预算 {args.budget_ms:.0f}ms')
+        return 1
+    print('[完成] 单遍扫描满足预算')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+startup_budget.py - 校验各 testcasegen 脚本的启动开销（基于 python -X importtime）。
+
+功能：
+- 对每个脚本的帮助 / 列表 / 参数校验等快速路径各跑若干次，统计模块导入总耗时（取最小值）
+- 导入总耗时超过预算，或快速路径上导入了重量级依赖（pandas、python-docx 等）即判定失败
+- 输出耗时表，失败时退出码为 1，可直接挂到 CI
+
+用法：
+  python benchmarks/startup_budget.py [--budget-ms 150] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SKILLS_DIR = Path(__file__).resolve().parent.parent / '.cursor' / 'skills'
+
+# 快速路径上不允许出现的重量级依赖（顶层包名）
+HEAVY_MODULES = {'pandas', 'numpy', 'docx', 'lxml', 'openpyxl', 'python_calamine', 'pyarrow', 'xmind'}
+
+
+def setup_encoding() -> None:
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(encoding='utf-8')
+    if hasattr(sys.stderr, 'reconfigure'):
+        sys.stderr.reconfigure(encoding='utf-8')
+
+
+def build_cases(work_dir: Path) -> list[tuple[str, str, list[str]]]:
+    """返回 [(用例名, 脚本相对路径, 参数), ...]，覆盖各脚本的帮助与快速路径。"""
+    docx_dir = work_dir / 'docx'
+    docx_dir.mkdir(exist_ok=True)
+    (docx_dir / 'sample.docx').write_bytes(b'')
+    missing_xlsx = str(work_dir / 'missing.xlsx')
+
+    return [
+        ('list_dir_utf8 用法',        'testcasegen-all2md/scripts/list_dir_utf8.py', []),
+        ('docx2md --help',            'testcasegen-docx2md/scripts/docx2md.py', ['--help']),
+        ('docx2md --list',            'testcasegen-docx2md/scripts/docx2md.py', ['--docx-dir', str(docx_dir), '--list']),
+        ('excel2md --help',           'testcasegen-excel2md/scripts/excel_to_markdown.py', ['--help']),
+        ('excel2md 文件不存在',        'testcasegen-excel2md/scripts/excel_to_markdown.py', ['--excel', missing_xlsx]),
+        ('query_excel_sidecar --help', 'testcasegen-excel2md/scripts/query_excel_sidecar.py', ['--help']),
+        ('init_testgen --help',       'testcasegen-init/scripts/init_testgen.py', ['--help']),
+        ('build_knowledge_index --help', 'testcasegen-knowledge-index/scripts/build_knowledge_index.py', ['--help']),
+        ('markdown_to_xmind 用法',    'testcasegen-md2xmind/scripts/markdown_to_xmind.py', []),
+        ('split_prd --help',          'testcasegen-split-prd/scripts/split_prd.py', ['--help']),
+        ('merge_modules --help',      'testcasegen-split-prd/scripts/merge_modules.py', ['--help']),
+        ('progress_snapshot 空项目',  'testcasegen-pipeline/scripts/progress_snapshot.py', [str(work_dir), 'V1', '--no-cache']),
+        ('run_phase1 --dry-run',      'testcasegen-pipeline/scripts/run_phase1.py', [str(work_dir), 'V1', '--dry-run']),
+        ('watch_inputs --help',       'testcasegen-pipeline/scripts/watch_inputs.py', ['--help']),
+        ('module_queue --help',       'testcasegen-pipeline/scripts/module_queue.py', ['--help']),
+    ]
+
+
+def measure(script: Path, args: list[str], cwd: Path) -> tuple[float, float, set[str]]:
+    """运行一次脚本，返回 (导入总耗时 ms, 墙钟耗时 ms, 命中的重量级模块)。"""
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-X', 'utf8', str(script), *args],
+        cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        text=True, encoding='utf-8', errors='replace',
+    )
+    wall_ms = (time.perf_counter() - t0) * 1000
+
+    import_us = 0
+    heavy: set[str] = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # 表头行
+        import_us += int(fields[0])
+        top = fields[2].strip().split('.')[0]
+        if top in HEAVY_MODULES:
+            heavy.add(top)
+    return import_us / 1000, wall_ms, heavy
+
+
+def main() -> int:
+    setup_encoding()
+
+    ap = argparse.ArgumentParser(description='校验 testcasegen 脚本的启动导入耗时预算')
+    ap.add_argument('--budget-ms', type=float, default=150, help='单个脚本导入总耗时预算（毫秒，默认 150）')
+    ap.add_argument('--repeat', type=int, default=5, help='每个用例重复次数，取最小值（默认 5）')
+    args = ap.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        print(f'{"用例":<32} {"导入(ms)":>9} {"墙钟(ms)":>9}  结果')
+        for name, rel, script_args in build_cases(work_dir):
+            script = SKILLS_DIR / rel
+            runs = [measure(script, script_args, work_dir) for _ in range(max(args.repeat, 1))]
+            import_ms = min(r[0] for r in runs)
+            wall_ms = min(r[1] for r in runs)
+            heavy = set().union(*(r[2] for r in runs))
+
+            problems = []
+            if import_ms > args.budget_ms:
+                problems.append(f'超出预算 {args.budget_ms:.0f}ms')
+            if heavy:
+                problems.append('导入了重量级依赖: ' + ', '.join(sorted(heavy)))
+            failures += bool(problems)
+            verdict = '；'.join(problems) if problems else 'OK'
+            print(f'{name:<32} {import_ms:>9.1f} {wall_ms:>9.1f}  {verdict}')
+
+    if failures:
+        print(f'\n[失败] {failures} 个用例未满足启动预算')
+        return 1
+    print('\n[完成] 全部用例满足启动预算')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())